@@ -14,14 +14,12 @@ from src.bot.keyboards import (
 )
 from src.bot.states import MindfulnessQuestionnaire
 from src.bot.utils import send_llm_advice
-from src.db.connection import get_db_connection
 from src.db.patient_repository import save_patient_record
 
 router = Router()
 
 
 async def finish_questionnaire(message: Message, state: FSMContext, data: dict):
-    conn = await get_db_connection()
     q_type = "mindfulness"
 
     answers = {
@@ -35,7 +33,6 @@ async def finish_questionnaire(message: Message, state: FSMContext, data: dict):
     }
 
     await save_patient_record(
-        conn=conn,
         telegram_id=message.from_user.id,
         answers=json.dumps(answers, ensure_ascii=False),
         gpt_response="",
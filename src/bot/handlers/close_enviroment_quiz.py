@@ -13,14 +13,12 @@ from src.bot.keyboards import (
 )
 from src.bot.states import CloseCircleQuestionnaire
 from src.bot.utils import send_llm_advice
-from src.db.connection import get_db_connection
 from src.db.patient_repository import save_patient_record
 
 router = Router()
 
 
 async def save_close_circle_data(telegram_id: int, data: dict):
-    conn = await get_db_connection()
     answers = {
         "questionnaire_type": "close_circle",
         "prompt_type": "subjective_health",
@@ -30,7 +28,6 @@ async def save_close_circle_data(telegram_id: int, data: dict):
     }
 
     await save_patient_record(
-        conn=conn,
         telegram_id=telegram_id,
         answers=json.dumps(answers, ensure_ascii=False),
         gpt_response="",
@@ -38,7 +35,6 @@ async def save_close_circle_data(telegram_id: int, data: dict):
         summary="Анкета о близком окружении",
         is_daily=False,
     )
-    await conn.close()
 
 
 @router.message(Command("close_environment"))
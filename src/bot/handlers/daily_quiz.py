@@ -22,7 +22,6 @@ from src.bot.keyboards import (
 )
 from src.bot.states import DailyQuestionnaire
 from src.bot.utils import send_llm_advice
-from src.db.connection import get_db_connection
 from src.db.patient_repository import save_patient_record
 
 router = Router()
@@ -382,9 +381,7 @@ async def ask_water(message: Message, state: FSMContext):
     data["prompt_type"] = ("subjective_health",)
 
     # Сохранение в БД
-    conn = await get_db_connection()
     await save_patient_record(
-        conn=conn,
         telegram_id=message.from_user.id,
         answers=json.dumps(data, ensure_ascii=False),
         gpt_response="",
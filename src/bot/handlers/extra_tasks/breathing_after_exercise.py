@@ -10,7 +10,6 @@ from src.bot.handlers.utils import handle_video_exception
 from src.bot.is_test_allowed import is_task_day_allowed
 from src.bot.states import BreathingTestStates
 from src.bot.utils import send_llm_advice
-from src.db.connection import get_db_connection
 from src.db.patient_repository import save_patient_record
 from src.media.s3_client import S3Client
 from src.media.video_processor import extract_contact_sheet_and_upload
@@ -77,13 +76,11 @@ async def handle_breathing_video(message: Message, state: FSMContext):
             video_path, video_name, username
         )
 
-        conn = await get_db_connection()
         answers = {
             "questionnaire_type": "breathing",
             "prompt_type": "video_analysis",
         }
         await save_patient_record(
-            conn=conn,
             telegram_id=user_id,
             answers=json.dumps(answers, ensure_ascii=False),
             gpt_response="",
@@ -6,7 +6,6 @@ from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
 from src.bot.states import ExaminationStates
 from src.bot.utils import send_llm_advice
-from src.db.connection import get_db_connection
 from src.db.patient_repository import save_patient_record
 from src.media.s3_client import S3Client
 
@@ -78,11 +77,9 @@ async def handle_examination_files(message: Message, state: FSMContext):
             filename=f"checkup/{original_filename}",
         )
 
-        conn = await get_db_connection()
         answers = {"questionnaire_type": "checkup", "prompt_type": "blood_tests"}
 
         await save_patient_record(
-            conn=conn,
             telegram_id=user_id,
             answers=json.dumps(answers, ensure_ascii=False),
             gpt_response="",
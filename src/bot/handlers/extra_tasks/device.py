@@ -9,7 +9,6 @@ from aiogram.types import ReplyKeyboardRemove
 
 from src.bot.states import DeviceData
 from src.bot.utils import send_llm_advice
-from src.db.connection import get_db_connection
 from src.db.patient_repository import save_patient_record
 
 router = Router()
@@ -33,7 +32,6 @@ async def start_device_data(message: Message, state: FSMContext):
 
 @router.message(DeviceData.PROCESSING)
 async def process_device_data(message: Message, state: FSMContext):
-    conn = await get_db_connection()
     q_type = "device"
 
     answers = {
@@ -43,7 +41,6 @@ async def process_device_data(message: Message, state: FSMContext):
     }
 
     await save_patient_record(
-        conn=conn,
         telegram_id=message.from_user.id,
         answers=json.dumps(answers, ensure_ascii=False),
         gpt_response="",
@@ -7,7 +7,6 @@ from aiogram.types import Message
 from aiogram.types import ReplyKeyboardRemove
 
 from src.bot.states import FeedbackStates
-from src.db.connection import get_db_connection
 from src.db.patient_repository import save_patient_record
 
 router = Router()
@@ -26,7 +25,6 @@ async def start_feedback(message: Message, state: FSMContext):
 
 @router.message(FeedbackStates.PROCESSING)
 async def process_feedback(message: Message, state: FSMContext):
-    conn = await get_db_connection()
     q_type = "feedback"
 
     answers = {
@@ -35,7 +33,6 @@ async def process_feedback(message: Message, state: FSMContext):
     }
 
     await save_patient_record(
-        conn=conn,
         telegram_id=message.from_user.id,
         answers=json.dumps(answers, ensure_ascii=False),
         gpt_response="",
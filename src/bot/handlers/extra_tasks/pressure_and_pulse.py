@@ -6,7 +6,6 @@ from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
 from src.bot.states import PressurePulseStates
 from src.bot.utils import send_llm_advice
-from src.db.connection import get_db_connection
 from src.db.patient_repository import save_patient_record
 
 router = Router()
@@ -40,7 +39,6 @@ async def handle_pressure_pulse(message: Message, state: FSMContext):
             diastolic = int(numbers[1])
             pulse = int(numbers[2])
 
-            conn = await get_db_connection()
             answers = {
                 "questionnaire_type": "pressure_pulse",
                 "prompt_type": "physiology",
@@ -53,7 +51,6 @@ async def handle_pressure_pulse(message: Message, state: FSMContext):
             }
 
             await save_patient_record(
-                conn=conn,
                 telegram_id=message.from_user.id,
                 answers=json.dumps(answers, ensure_ascii=False),
                 gpt_response="",
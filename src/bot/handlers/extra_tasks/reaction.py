@@ -8,7 +8,6 @@ from aiogram.types import ReplyKeyboardRemove
 
 from src.bot.states import ReactionStates
 from src.bot.utils import send_llm_advice
-from src.db.connection import get_db_connection
 from src.db.patient_repository import save_patient_record
 
 router = Router()
@@ -28,7 +27,6 @@ async def start_reaction(message: Message, state: FSMContext):
 
 @router.message(ReactionStates.PROCESSING)
 async def process_reaction(message: Message, state: FSMContext):
-    conn = await get_db_connection()
     q_type = "reaction"
 
     answers = {
@@ -38,7 +36,6 @@ async def process_reaction(message: Message, state: FSMContext):
     }
 
     await save_patient_record(
-        conn=conn,
         telegram_id=message.from_user.id,
         answers=json.dumps(answers, ensure_ascii=False),
         gpt_response="",
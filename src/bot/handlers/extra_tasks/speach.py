@@ -9,7 +9,6 @@ from aiogram.filters import Command
 from src.bot.handlers.utils import handle_video_exception
 from src.bot.states import SpeechVideoStates
 from src.bot.utils import send_llm_advice
-from src.db.connection import get_db_connection
 from src.db.patient_repository import save_patient_record
 from src.media.s3_client import S3Client
 from src.media.video_processor import extract_contact_sheet_and_upload
@@ -57,13 +56,11 @@ async def handle_speech_video(message: Message, state: FSMContext):
             video_path, video_name, username
         )
 
-        conn = await get_db_connection()
         answers = {
             "questionnaire_type": "speech",
             "prompt_type": "video_analysis",
         }
         await save_patient_record(
-            conn=conn,
             telegram_id=user_id,
             answers=json.dumps(answers, ensure_ascii=False),
             gpt_response="",
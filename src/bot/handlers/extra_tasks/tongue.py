@@ -8,7 +8,6 @@ from aiogram.fsm.context import FSMContext
 from src.bot.is_test_allowed import is_task_day_allowed
 from src.bot.states import TonguePhotoStates
 from src.bot.utils import send_llm_advice
-from src.db.connection import get_db_connection
 from src.db.patient_repository import save_patient_record
 from src.media.s3_client import S3Client
 
@@ -73,13 +72,11 @@ async def handle_tongue_photo(message: Message, state: FSMContext):
             filename="tongue.jpg",
         )
 
-        conn = await get_db_connection()
         answers = {
             "questionnaire_type": "tongue",
             "prompt_type": "photo_analysis",
         }
         await save_patient_record(
-            conn=conn,
             telegram_id=user_id,
             answers=json.dumps(answers, ensure_ascii=False),
             gpt_response="",
@@ -9,14 +9,12 @@ from aiogram.types import ReplyKeyboardRemove
 from src.bot.is_test_allowed import is_test_day_allowed
 from src.bot.keyboards import get_gender_keyboard
 from src.bot.states import GreetingQuestionnaire
-from src.db.connection import get_db_connection
 from src.db.patient_repository import save_patient_record, create_patient
 
 router = Router()
 
 
 async def save_greeting_data(telegram_id: int, data: dict):
-    conn = await get_db_connection()
     answers = {
         "questionnaire_type": "greeting",
         "prompt_type": "subjective_health",
@@ -30,7 +28,6 @@ async def save_greeting_data(telegram_id: int, data: dict):
     }
 
     await save_patient_record(
-        conn=conn,
         telegram_id=telegram_id,
         answers=json.dumps(answers, ensure_ascii=False),
         gpt_response="",
@@ -43,17 +40,13 @@ async def save_greeting_data(telegram_id: int, data: dict):
 @router.message(Command("start"))
 async def handle_start(msg: Message, bot: Bot, state: FSMContext):
     await state.clear()
-    conn = await get_db_connection()
-
     await create_patient(
-        conn,
         telegram_id=msg.from_user.id,
         username=msg.from_user.username,
         full_name=msg.from_user.full_name,
     )
 
     await msg.answer("👋 Вы зарегистрированы!")
-    await conn.close()
 
 
 @router.message(Command("greeting"))
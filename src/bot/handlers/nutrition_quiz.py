@@ -10,14 +10,12 @@ from aiogram.types import ReplyKeyboardRemove
 from src.bot.is_test_allowed import is_test_day_allowed
 from src.bot.states import NutritionQuestionnaire
 from src.bot.utils import send_llm_advice
-from src.db.connection import get_db_connection
 from src.db.patient_repository import save_patient_record
 
 router = Router()
 
 
 async def save_nutrition_data(telegram_id: int, data: dict):
-    conn = await get_db_connection()
     answers = {
         "questionnaire_type": "nutrition",
         "prompt_type": "subjective_health",
@@ -29,7 +27,6 @@ async def save_nutrition_data(telegram_id: int, data: dict):
     }
 
     await save_patient_record(
-        conn=conn,
         telegram_id=telegram_id,
         answers=json.dumps(answers, ensure_ascii=False),  # Fixed: proper JSON encoding
         gpt_response="",
@@ -10,14 +10,12 @@ from src.bot.is_test_allowed import is_test_day_allowed
 from src.bot.keyboards import get_yes_no_kb, get_support_count_kb
 from src.bot.states import SafetyQuestionnaire
 from src.bot.utils import send_llm_advice
-from src.db.connection import get_db_connection
 from src.db.patient_repository import save_patient_record
 
 router = Router()
 
 
 async def save_safety_data(telegram_id: int, data: dict):
-    conn = await get_db_connection()
     answers = {
         "questionnaire_type": "safety_support",
         "prompt_type": "subjective_health",
@@ -27,7 +25,6 @@ async def save_safety_data(telegram_id: int, data: dict):
     }
 
     await save_patient_record(
-        conn=conn,
         telegram_id=telegram_id,
         answers=json.dumps(answers, ensure_ascii=False),
         gpt_response="",
@@ -35,7 +32,6 @@ async def save_safety_data(telegram_id: int, data: dict):
         summary="Анкета чувства безопасности и поддержки",
         is_daily=False,
     )
-    await conn.close()
 
 
 @router.message(Command("safety"))
@@ -98,19 +94,14 @@ async def process_feels_safe(message: Message, state: FSMContext):
     data["questionnaire_type"] = q_type
 
     # Сохраняем результаты
-    conn = await get_db_connection()
-    try:
-        await save_patient_record(
-            conn=conn,
-            telegram_id=message.from_user.id,
-            answers=json.dumps(data, ensure_ascii=False),
-            gpt_response="",
-            s3_links=[],
-            summary="Анкета безопасности и поддержки",
-            is_daily=False,
-        )
-    finally:
-        await conn.close()
+    await save_patient_record(
+        telegram_id=message.from_user.id,
+        answers=json.dumps(data, ensure_ascii=False),
+        gpt_response="",
+        s3_links=[],
+        summary="Анкета безопасности и поддержки",
+        is_daily=False,
+    )
 
     # Формируем отчет
     report = "✅ Анкета сохранена"
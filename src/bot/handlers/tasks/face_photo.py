@@ -12,7 +12,6 @@ from aiogram.filters import Command
 from src.bot.is_test_allowed import is_task_day_allowed
 from src.bot.states import FacePhotoStates
 from src.bot.utils import send_llm_advice
-from src.db.connection import get_db_connection
 from src.db.patient_repository import save_patient_record
 from src.media.s3_client import S3Client
 
@@ -106,7 +105,6 @@ async def process_face_group(message: Message, group_id: str, state: FSMContext)
     user_id = messages[0].from_user.id
     username = messages[0].from_user.username or f"user_{user_id}"
     s3_urls = []
-    conn = None
 
     try:
         # Определяем типы фото
@@ -130,14 +128,12 @@ async def process_face_group(message: Message, group_id: str, state: FSMContext)
                 photo_path.unlink()
 
         # Сохраняем в базу
-        conn = await get_db_connection()
         answers = {
             "questionnaire_type": "face",
             "prompt_type": "photo_analysis",
             "photos_received": 2,
         }
         await save_patient_record(
-            conn=conn,
             telegram_id=user_id,
             answers=json.dumps(answers, ensure_ascii=False),
             gpt_response="",
@@ -153,6 +149,3 @@ async def process_face_group(message: Message, group_id: str, state: FSMContext)
     except Exception as e:
         await messages[0].answer("❌ Ошибка при сохранении фото")
         print(f"Error processing face group: {e}")
-    finally:
-        if conn:
-            await conn.close()
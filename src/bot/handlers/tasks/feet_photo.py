@@ -10,7 +10,6 @@ from aiogram.filters import Command
 from src.bot.is_test_allowed import is_task_day_allowed
 from src.bot.states import FeetPhotoStates
 from src.bot.utils import send_llm_advice
-from src.db.connection import get_db_connection
 from src.db.patient_repository import save_patient_record
 from src.media.s3_client import S3Client
 
@@ -88,13 +87,11 @@ async def process_single_feet_photo(message: Message, state: FSMContext):
             filename=f"feet_{file.file_id}.jpg",
         )
 
-        conn = await get_db_connection()
         answers = {
             "questionnaire_type": "feet",
             "prompt_type": "photo_analysis",
         }
         await save_patient_record(
-            conn=conn,
             telegram_id=user_id,
             answers=json.dumps(answers, ensure_ascii=False),
             gpt_response="",
@@ -126,7 +123,6 @@ async def process_feet_group(message: Message, group_id: str, state: FSMContext)
     user_id = messages[0].from_user.id
     username = messages[0].from_user.username or f"user_{user_id}"
     s3_urls = []
-    conn = None
 
     try:
         for i, msg in enumerate(messages, 1):
@@ -147,14 +143,12 @@ async def process_feet_group(message: Message, group_id: str, state: FSMContext)
                 photo_path.unlink()
 
         # Сохраняем все ссылки в базу
-        conn = await get_db_connection()
         answers = {
             "questionnaire_type": "feet",
             "prompt_type": "photo_analysis",
             "photo_count": len(s3_urls),
         }
         await save_patient_record(
-            conn=conn,
             telegram_id=user_id,
             answers=json.dumps(answers, ensure_ascii=False),
             gpt_response="",
@@ -170,6 +164,3 @@ async def process_feet_group(message: Message, group_id: str, state: FSMContext)
     except Exception as e:
         await messages[0].answer("❌ Ошибка при сохранении группы фото")
         print(f"Error processing feet photo group: {e}")
-    finally:
-        if conn:
-            await conn.close()
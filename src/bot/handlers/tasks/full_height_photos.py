@@ -12,7 +12,6 @@ from aiogram.filters import Command
 from src.bot.is_test_allowed import is_task_day_allowed
 from src.bot.states import FullbodyPhotoStates
 from src.bot.utils import send_llm_advice
-from src.db.connection import get_db_connection
 from src.db.patient_repository import save_patient_record
 from src.media.s3_client import S3Client
 
@@ -133,7 +132,6 @@ async def process_fullbody_group(message: Message, group_id: str):
     # Обрабатываем 4 фото
     username = messages[0].from_user.username or f"user_{user_id}"
     s3_urls = []
-    conn = None
 
     try:
         # Определяем порядковые названия для файлов
@@ -157,14 +155,12 @@ async def process_fullbody_group(message: Message, group_id: str):
                 photo_path.unlink()
 
         # Сохраняем в базу
-        conn = await get_db_connection()
         answers = {
             "questionnaire_type": "fullbody",
             "prompt_type": "photo_analysis",
             "photo_count": 4,
         }
         await save_patient_record(
-            conn=conn,
             telegram_id=user_id,
             answers=json.dumps(answers, ensure_ascii=False),
             gpt_response="",
@@ -180,9 +176,6 @@ async def process_fullbody_group(message: Message, group_id: str):
     except Exception as e:
         await messages[0].answer("❌ Ошибка при сохранении фото")
         print(f"Error processing fullbody group: {e}")
-    finally:
-        if conn:
-            await conn.close()
 
 
 async def process_single_fullbody_photo(message: Message, state: FSMContext):
@@ -11,7 +11,6 @@ from aiogram.fsm.context import FSMContext
 from src.bot.is_test_allowed import is_task_day_allowed
 from src.bot.states import HandsPhotoStates
 from src.bot.utils import send_llm_advice
-from src.db.connection import get_db_connection
 from src.db.patient_repository import save_patient_record
 from src.media.s3_client import S3Client
 
@@ -118,7 +117,6 @@ async def process_hands_group(message, group_id: str):
 
     username = messages[0].from_user.username or f"user_{user_id}"
     s3_urls = []
-    conn = None
 
     try:
         photo_types = ["palms", "backs"]  # Типы фото
@@ -141,14 +139,12 @@ async def process_hands_group(message, group_id: str):
                 photo_path.unlink()
 
         # Сохраняем в базу
-        conn = await get_db_connection()
         answers = {
             "questionnaire_type": "hands",
             "prompt_type": "photo_analysis",
             "photos_count": 2,
         }
         await save_patient_record(
-            conn=conn,
             telegram_id=user_id,
             answers=json.dumps(answers, ensure_ascii=False),
             gpt_response="",
@@ -164,6 +160,3 @@ async def process_hands_group(message, group_id: str):
     except Exception as e:
         await messages[0].answer("❌ Ошибка при сохранении фото")
         print(f"Error processing hands group: {e}")
-    finally:
-        if conn:
-            await conn.close()
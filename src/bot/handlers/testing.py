@@ -4,36 +4,28 @@ from aiogram.types import Message
 from aiogram.filters import Command
 
 from src.bot.is_admin import IsAdmin
-from src.db.connection import get_db_connection
+from src.db.patient_repository import repository
 
 router = Router()
 
 
 async def get_global_testing_start_date():
-    conn = await get_db_connection()
-    try:
-        date = await conn.fetchval(
-            "SELECT MIN(testing_start_date) FROM patients WHERE testing_start_date IS NOT NULL"
-        )
-        return date
-    finally:
-        await conn.close()
+    return await repository.get_global_testing_start_date()
 
 
-async def update_all_users_testing_date(start_date: datetime):
-    """Обновляет дату тестирования для всех пользователей"""
-    conn = await get_db_connection()
-    try:
-        await conn.execute("UPDATE patients SET testing_start_date = $1", start_date)
-    finally:
-        await conn.close()
+async def update_all_users_testing_date(start_date: datetime | None):
+    """
+    Обновляет дату тестирования для всех пользователей и сбрасывает её кэш
+    (другие экземпляры узнают об этом по NOTIFY)
+    """
+    await repository.set_testing_start_date(start_date)
 
 
 @router.message(Command("start_testing"), IsAdmin())
 async def start_testing(message: Message):
     """Команда для начала тестирования (только для админа)"""
-    if await get_global_testing_start_date() is not None:
-        start_date = await get_global_testing_start_date()
+    start_date = await get_global_testing_start_date()
+    if start_date is not None:
         await message.answer(
             f"⚠️ Тестирование уже начато {start_date.strftime('%d.%m.%Y')}\n"
             "Используйте /reset_testing_date для сброса"
@@ -80,10 +72,6 @@ async def manual_set_testing_date(message: Message):
 @router.message(Command("reset_testing_date"), IsAdmin())
 async def reset_testing_date(message: Message):
     """Сбрасывает дату тестирования для всех пользователей (только для админа)"""
-    conn = await get_db_connection()
-    try:
-        await conn.execute("UPDATE patients SET testing_start_date = NULL")
-    finally:
-        await conn.close()
+    await update_all_users_testing_date(None)
 
     await message.answer("✅ Дата тестирования сброшена для всех пользователей")
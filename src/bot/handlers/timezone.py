@@ -9,7 +9,7 @@ from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
 
 from src.bot.states import TimezoneStates
-from src.db.connection import get_db_connection
+from src.db.patient_repository import repository
 
 router = Router()
 
@@ -41,6 +41,34 @@ TIMEZONE_OPTIONS = [
 ]
 
 
+# Маппинг для преобразования в формат IANA (Europe/Moscow)
+IANA_TIMEZONES = {
+    "UTC+0": "Europe/London",
+    "UTC+1": "Europe/Paris",
+    "UTC+2": "Europe/Kiev",
+    "UTC+3": "Europe/Moscow",
+    "UTC+4": "Asia/Dubai",
+    "UTC+5": "Asia/Yekaterinburg",
+    "UTC+6": "Asia/Almaty",
+    "UTC+7": "Asia/Bangkok",
+    "UTC+8": "Asia/Shanghai",
+    "UTC+9": "Asia/Tokyo",
+    "UTC+10": "Asia/Vladivostok",
+    "UTC+11": "Asia/Magadan",
+    "UTC+12": "Pacific/Auckland",
+    "UTC-1": "Atlantic/Azores",
+    "UTC-2": "Atlantic/South_Georgia",
+    "UTC-3": "America/Sao_Paulo",
+    "UTC-4": "America/New_York",
+    "UTC-5": "America/Chicago",
+    "UTC-6": "America/Denver",
+    "UTC-7": "America/Los_Angeles",
+    "UTC-8": "America/Anchorage",
+    "UTC-9": "Pacific/Honolulu",
+    "UTC-10": "Pacific/Honolulu",
+}
+
+
 @router.message(Command("set_timezone"))
 async def ask_timezone(message: Message, state: FSMContext):
     # Создаем клавиатуру с кнопками (по 3 в ряду)
@@ -100,32 +128,6 @@ async def handle_wrong_timezone_format(message: Message):
 
 
 async def save_timezone(message: Message, timezone_str: str):
-    # Маппинг для преобразования в формат IANA (Europe/Moscow)
-    iana_timezones = {
-        "UTC+0": "Europe/London",
-        "UTC+1": "Europe/Paris",
-        "UTC+2": "Europe/Kiev",
-        "UTC+3": "Europe/Moscow",
-        "UTC+4": "Asia/Dubai",
-        "UTC+5": "Asia/Yekaterinburg",
-        "UTC+6": "Asia/Almaty",
-        "UTC+7": "Asia/Bangkok",
-        "UTC+8": "Asia/Shanghai",
-        "UTC+9": "Asia/Tokyo",
-        "UTC+10": "Asia/Vladivostok",
-        "UTC+11": "Asia/Magadan",
-        "UTC+12": "Pacific/Auckland",
-        "UTC-1": "Atlantic/Azores",
-        "UTC-2": "Atlantic/South_Georgia",
-        "UTC-3": "America/Sao_Paulo",
-        "UTC-4": "America/New_York",
-        "UTC-5": "America/Chicago",
-        "UTC-6": "America/Denver",
-        "UTC-7": "America/Los_Angeles",
-        "UTC-8": "America/Anchorage",
-        "UTC-9": "Pacific/Honolulu",
-        "UTC-10": "Pacific/Honolulu",
-    }
 
     # Получаем красивое название из кнопки ("UTC+10 (Владивосток...)" -> "UTC+10")
     selected_tz = next(
@@ -137,15 +139,10 @@ async def save_timezone(message: Message, timezone_str: str):
         timezone_str,
     )
 
-    timezone_db = iana_timezones.get(selected_tz, selected_tz)
+    timezone_db = IANA_TIMEZONES.get(selected_tz, selected_tz)
 
     try:
-        conn = await get_db_connection()
-        await conn.execute(
-            "UPDATE patients SET timezone = $1 WHERE telegram_id = $2",
-            timezone_db,
-            message.from_user.id,
-        )
+        await repository.set_timezone(message.from_user.id, timezone_db)
 
         # Находим полное название для подтверждения
         display_tz = next(
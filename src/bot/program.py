@@ -0,0 +1,278 @@
+from collections import defaultdict
+from typing import Iterable, NamedTuple
+
+
+class ProgramRule(NamedTuple):
+    """Напоминание программы: день (None — каждый день), местное время, команда"""
+
+    day: int | None
+    time: str
+    command: str
+    text: str
+    # Отправлять, только если за локальный день ещё нет записей в patient_history
+    unless_filled: bool = False
+
+    @property
+    def key(self) -> str:
+        """Ключ правила в reminder_deliveries (вместе с днём программы)"""
+        return f"{self.command}@{self.time}"
+
+
+PROGRAM_DAYS = 28
+
+DAILY_QUESTIONNAIRE = ProgramRule(
+    None,
+    "10:00",
+    "/daily",
+    "⏰ Время заполнить ежедневную анкету!\nВведите /daily чтобы начать",
+    unless_filled=True,
+)
+
+PROGRAM: list[ProgramRule] = [
+    DAILY_QUESTIONNAIRE,
+    # ----------------- ДЕНЬ 1 -----------------
+    ProgramRule(
+        1,
+        "09:00",
+        "/greeting",
+        "⏰ Пожалуйста, заполните анкету приветствия: /greeting",
+    ),
+    ProgramRule(
+        1,
+        "20:00",
+        "/wearable_data",
+        "⌚ Пожалуйста, выполните задание 'Данные с носимого устройства': /wearable_data",
+    ),
+    # ----------------- ДЕНЬ 2 -----------------
+    ProgramRule(
+        2, "11:00", "/face", "👨‍🦱 Пожалуйста, выполните задание 'Фото лица': /face"
+    ),
+    ProgramRule(
+        2,
+        "18:30",
+        "/mindfulness",
+        "🧘 Пожалуйста, заполните анкету осознанности (медитации): /mindfulness",
+    ),
+    # ----------------- ДЕНЬ 3 -----------------
+    ProgramRule(
+        3,
+        "19:00",
+        "/rest_breathing",
+        "🫁 Пожалуйста, выполните задание 'Дыхание в покое': /rest_breathing",
+    ),
+    # ProgramRule(3, "18:30", "/full_body", "🧍 Пожалуйста, выполните задание 'Фото в полный рост': /full_body"),
+    # ProgramRule(3, "19:00", "/checkups", "🧑‍⚕️ Пожалуйста, выполните задание 'Обследования за 3 месяца': /checkups"),
+    # ----------------- ДЕНЬ 4 -----------------
+    ProgramRule(
+        4, "19:00", "/plank", "⚡️ Пожалуйста, выполните задание 'Планка': /plank"
+    ),
+    # ProgramRule(4, "19:00", "/subjective_health", "🏥 Пожалуйста, заполните анкету состояния здоровья: /subjective_health"),
+    # ProgramRule(4, "12:00", "/blood", "🩸️ Пожалуйста, выполните задание 'Сдача анализов крови': /blood"),
+    # ----------------- ДЕНЬ 5 -----------------
+    ProgramRule(
+        5, "19:00", "/balance", "⚖️ Пожалуйста, выполните задание 'Баланс': /balance"
+    ),
+    # ProgramRule(5, "19:00", "/walking", "🚶 Пожалуйста, выполните задание 'Ходьба': /walking"),
+    # ----------------- ДЕНЬ 6 -----------------
+    ProgramRule(
+        6,
+        "11:00",
+        "/pressure",
+        "️❤️ Пожалуйста, выполните задание 'Измерения давления и пульса': /pressure",
+    ),
+    # ----------------- ДЕНЬ 7 -----------------
+    ProgramRule(
+        7,
+        "19:00",
+        "/subjective_health",
+        "🏥 Пожалуйста, заполните анкету состояния здоровья: /subjective_health",
+    ),
+    ProgramRule(
+        7,
+        "20:00",
+        "/checkups",
+        "🧑‍⚕️ Пожалуйста, выполните задание 'Обследования за 3 месяца': /checkups",
+    ),
+    # ProgramRule(7, "19:00", "/feedback", "Пожалуйста, заполните обратную связь: /feedback"),
+    # ----------------- ДЕНЬ 8 -----------------
+    ProgramRule(
+        8, "18:30", "/running", "🏃 Пожалуйста, выполните задание 'Бег': /running"
+    ),
+    # ProgramRule(8, "19:00", "/nutrition", "🍎 Пожалуйста, заполните анкету питания: /nutrition"),
+    # ----------------- ДЕНЬ 9 -----------------
+    ProgramRule(
+        9,
+        "19:00",
+        "/speech",
+        "📱 Пожалуйста, выполните задание 'Рассказ о себе': /speech",
+    ),
+    # ProgramRule(9, "10:30", "/feet", "🦶 Пожалуйста, выполните задание 'Фото стоп': /feet"),
+    # ProgramRule(9, "10:30", "/reaction", "Пожалуйста, выполните задание 'Тест на реакцию': /reaction"),
+    # ----------------- ДЕНЬ 10 -----------------
+    # ProgramRule(10, "18:30", "/body_measurements", "📏 Пожалуйста, заполните анкету телосложения: /body_measurements"),
+    ProgramRule(
+        10, "19:00", "/squats", "⚡️ Пожалуйста, выполните задание 'Приседания': /squats"
+    ),
+    ProgramRule(
+        10,
+        "20:00",
+        "/checkups",
+        "🧑‍⚕️ Пожалуйста, выполните задание 'Обследования за 3 месяца': /checkups",
+    ),
+    # ----------------- ДЕНЬ 11 -----------------
+    ProgramRule(
+        11,
+        "18:30",
+        "/picking_up",
+        "🫳 Пожалуйста, выполните задание 'Поднятие объекта': /picking_up",
+    ),
+    # ----------------- ДЕНЬ 12 -----------------
+    ProgramRule(
+        12,
+        "09:00",
+        "/rest_breathing",
+        "🫁 Пожалуйста, выполните задание 'Дыхание в покое': /rest_breathing",
+    ),
+    # ----------------- ДЕНЬ 13 -----------------
+    ProgramRule(
+        13,
+        "19:00",
+        "/breathing",
+        "🫁 Пожалуйста, выполните задание 'Дыхание после нагрузки': /breathing",
+    ),
+    # ----------------- ДЕНЬ 14 -----------------
+    ProgramRule(
+        14,
+        "11:00",
+        "/tongue",
+        "👅 Пожалуйста, выполните задание 'Фото языка утром': /tongue",
+    ),
+    ProgramRule(
+        14, "11:30", "/eye", "👁️ Пожалуйста, выполните задание 'Микрофото глаза': /eye"
+    ),
+    ProgramRule(
+        14, "12:00", "/face", "👨‍🦱 Пожалуйста, выполните задание 'Фото лица': /face"
+    ),
+    # ProgramRule(14, "18:30", "/mindfulness", "🧘 Пожалуйста, заполните анкету осознанности (медитации): /mindfulness"),
+    # ProgramRule(14, "09:00", "/pressure", "️❤️ Пожалуйста, выполните задание 'Измерения давления и пульса': /pressure"),
+    # ProgramRule(14, "19:00", "/feedback", "Пожалуйста, заполните обратную связь: /feedback"),
+    # ----------------- ДЕНЬ 15 -----------------
+    ProgramRule(
+        15,
+        "18:30",
+        "/body_measurements",
+        "📏 Пожалуйста, заполните анкету телосложения: /body_measurements",
+    ),
+    ProgramRule(
+        15,
+        "19:00",
+        "/supplements",
+        "💊 Пожалуйста, заполните анкету приема БАДов/витаминов: /supplements",
+    ),
+    # ----------------- ДЕНЬ 16 -----------------
+    ProgramRule(
+        16,
+        "19:00",
+        "/full_body",
+        "🧍 Пожалуйста, выполните задание 'Фото в полный рост': /full_body",
+    ),
+    # ----------------- ДЕНЬ 17 -----------------
+    ProgramRule(
+        17, "18:30", "/hands", "🖐️ Пожалуйста, выполните задание 'Фото рук': /hands"
+    ),
+    ProgramRule(
+        17, "19:00", "/feet", "🦶 Пожалуйста, выполните задание 'Фото стоп': /feet"
+    ),
+    # ----------------- ДЕНЬ 18 -----------------
+    ProgramRule(
+        18, "19:00", "/walking", "🚶 Пожалуйста, выполните задание 'Ходьба': /walking"
+    ),
+    # ----------------- ДЕНЬ 19 -----------------
+    ProgramRule(
+        19,
+        "19:00",
+        "/neck",
+        "‍👦 Пожалуйста, выполните задание 'Вращения головой': /neck",
+    ),
+    # ----------------- ДЕНЬ 20 -----------------
+    ProgramRule(
+        20, "19:00", "/nutrition", "🍎 Пожалуйста, заполните анкету питания: /nutrition"
+    ),
+    # ----------------- ДЕНЬ 21 -----------------
+    # ProgramRule(21, "09:00", "/pressure", "️❤️ Пожалуйста, выполните задание 'Измерения давления и пульса': /pressure"),
+    # ProgramRule(21, "19:00", "/feedback", "Пожалуйста, заполните обратную связь: /feedback"),
+    # ----------------- ДЕНЬ 22 -----------------
+    ProgramRule(
+        22,
+        "19:00",
+        "/safety",
+        "🛡️ Пожалуйста, заполните анкету безопасности и поддержки: /safety",
+    ),
+    # ----------------- ДЕНЬ 23 -----------------
+    ProgramRule(
+        23,
+        "19:00",
+        "/close_environment",
+        "👨‍👩‍👧‍👦 Пожалуйста, заполните анкету близкого окружения: /close_environment",
+    ),
+    # ----------------- ДЕНЬ 24 -----------------
+    ProgramRule(
+        24,
+        "19:00",
+        "/laughter",
+        "😁 Пожалуйста, выполните задание 'Запись смеха/улыбки': /laughter",
+    ),
+    # ----------------- ДЕНЬ 25 -----------------
+    ProgramRule(
+        25,
+        "10:30",
+        "/reaction",
+        "Пожалуйста, выполните задание 'Тест на реакцию': /reaction",
+    ),
+    # ----------------- ДЕНЬ 27 -----------------
+    ProgramRule(
+        27,
+        "19:00",
+        "/subjective_health",
+        "🏥 Пожалуйста, заполните анкету состояния здоровья: /subjective_health",
+    ),
+    # ----------------- ДЕНЬ 28 -----------------
+    ProgramRule(
+        28,
+        "20:15",
+        "/feedback",
+        "Пожалуйста, заполните финальную обратную связь: /feedback",
+    ),
+]
+
+
+class ProgramIndex:
+    """
+    Программа, разложенная по ключу (день программы, "HH:MM").
+    Тик планировщика получает только правила, которые срабатывают в эту минуту.
+    """
+
+    def __init__(self, rules: Iterable[ProgramRule]):
+        self._by_slot: dict[tuple[int | None, str], list[ProgramRule]] = defaultdict(
+            list
+        )
+        for rule in rules:
+            if rule.day is not None and not 1 <= rule.day <= PROGRAM_DAYS:
+                raise ValueError(f"День программы вне диапазона: {rule}")
+            self._by_slot[(rule.day, rule.time)].append(rule)
+        self._by_slot = dict(self._by_slot)
+        # Минуты суток, в которые срабатывает хоть одно правило
+        self.times = frozenset(time for _, time in self._by_slot)
+
+    def times_between(self, start: str, end: str) -> list[str]:
+        """Минуты с правилами в интервале (start, end] одного дня ("HH:MM")"""
+        return sorted(time for time in self.times if start < time <= end)
+
+    def due(self, day: int, time: str) -> list[ProgramRule]:
+        """Правила на день программы day в местное время time ("HH:MM")"""
+        if time not in self.times:
+            return []
+        return self._by_slot.get((None, time), []) + self._by_slot.get((day, time), [])
+
+
+program_index = ProgramIndex(PROGRAM)
@@ -3,13 +3,21 @@ from aiogram import Bot
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
-from datetime import datetime
+from datetime import datetime, time, timedelta
 import logging
 import pytz
 
-from src.db.connection import get_db_connection
-from src.db.patient_repository import get_all_patients
+from src import config
+from src.db.patient_repository import (
+    SchedulerPatient,
+    iter_scheduler_patients,
+    repository,
+)
 from src.bot.handlers.testing import get_global_testing_start_date
+from src.bot.program import ProgramRule, program_index
+from src.bot.sender import PERMANENT_ERRORS, PRIORITY_REMINDER, message_dispatcher
+from src.db.partitions import maintain_partitions
+from src.fanout import fan_out
 
 logger = logging.getLogger(__name__)
 scheduler = AsyncIOScheduler()
@@ -18,22 +26,35 @@ scheduler = AsyncIOScheduler()
 async def get_user_timezone(user_id: int) -> str:
     """Получает часовой пояс пользователя из базы данных"""
     try:
-        conn = await get_db_connection()
-        tz = await conn.fetchval(
-            "SELECT timezone FROM patients WHERE telegram_id = $1", user_id
-        )
-        return tz if tz else "Europe/Moscow"
+        tz = await repository.get_user_timezone(user_id)
+        return tz if tz else config.SCHEDULER_DEFAULT_TIMEZONE
     except Exception as e:
         logger.error(f"Ошибка получения часового пояса: {e}")
-        return "Europe/Moscow"
+        return config.SCHEDULER_DEFAULT_TIMEZONE
+
+
+def local_day_bounds_utc(
+    day: datetime.date, timezone: str
+) -> tuple[datetime, datetime]:
+    """Границы локального дня пользователя в UTC (created_at хранится в UTC)"""
+    tz = pytz.timezone(timezone)
+    start = tz.localize(datetime.combine(day, time.min))
+    end = tz.localize(datetime.combine(day + timedelta(days=1), time.min))
+    return (
+        start.astimezone(pytz.utc).replace(tzinfo=None),
+        end.astimezone(pytz.utc).replace(tzinfo=None),
+    )
 
 
-async def send_questionnaire_to_user(bot: Bot, user_id: int, text: str, command: str):
-    """Отправляет анкету пользователю с кнопкой"""
+async def send_questionnaire_to_user(
+    bot: Bot, user_id: int, text: str, command: str
+) -> asyncio.Future | None:
+    """Ставит анкету с кнопкой в очередь отправки"""
     try:
-        await bot.send_message(
-            chat_id=user_id,
-            text=text,
+        return message_dispatcher.submit(
+            user_id,
+            text,
+            PRIORITY_REMINDER,
             reply_markup=ReplyKeyboardMarkup(
                 keyboard=[[KeyboardButton(text=command)]],
                 resize_keyboard=True,
@@ -41,6 +62,138 @@ async def send_questionnaire_to_user(bot: Bot, user_id: int, text: str, command:
         )
     except Exception as e:
         logger.error(f"Ошибка отправки пользователю {user_id}: {e}")
+        return None
+
+
+async def _test_batches(patients: list[SchedulerPatient]):
+    yield patients
+
+
+# Время (UTC) последнего успешного тика: следующий тик досылает всё после него
+_last_tick_utc: datetime | None = None
+# Начало самого раннего окна тика, где напоминание не ушло и отметка снята:
+# следующий тик проходит окно заново (в пределах REMINDER_CATCHUP_MINUTES)
+_retry_from_utc: datetime | None = None
+# Задачи снятия отметок, чтобы их не собрал сборщик мусора
+_release_tasks: set[asyncio.Task] = set()
+
+
+def _retry_from(since_utc: datetime):
+    global _retry_from_utc
+    if _retry_from_utc is None or since_utc < _retry_from_utc:
+        _retry_from_utc = since_utc
+
+
+async def release_reminder(
+    telegram_id: int, rule: ProgramRule, day_of_program: int, since_utc: datetime
+):
+    """Снимает отметку о неотправленном напоминании, чтобы тик дослал его"""
+    try:
+        await repository.release_reminder(telegram_id, rule.key, day_of_program)
+    except Exception as e:
+        # Отметка осталась — напоминание потеряно, но без дубля
+        logger.error(f"Error releasing reminder {rule.key} for {telegram_id}: {e}")
+        return
+    _retry_from(since_utc)
+
+
+def release_if_failed(
+    future: asyncio.Future | None,
+    telegram_id: int,
+    rule: ProgramRule,
+    day_of_program: int,
+    since_utc: datetime,
+):
+    """
+    Снимает отметку, если отправка не удалась: future с ошибкой, отменён
+    или его нет вовсе. После постоянной ошибки (бот заблокирован) отметка
+    остаётся — иначе тик пытался бы отправить заново каждую минуту окна.
+    """
+
+    def release(done: asyncio.Future = None):
+        if done is not None and not done.cancelled():
+            error = done.exception()
+            if error is None or isinstance(error, PERMANENT_ERRORS):
+                return
+        task = asyncio.create_task(
+            release_reminder(telegram_id, rule, day_of_program, since_utc)
+        )
+        _release_tasks.add(task)
+        task.add_done_callback(_release_tasks.discard)
+
+    if future is None:
+        release()
+    else:
+        future.add_done_callback(release)
+
+
+async def wait_for_releases():
+    """Дожидается снятия отметок (при остановке — до закрытия пула БД)"""
+    # Колбэки futures, завершённых остановкой очереди, ещё не выполнены
+    await asyncio.sleep(0)
+    if _release_tasks:
+        await asyncio.gather(*_release_tasks, return_exceptions=True)
+
+
+class TimezoneBucket:
+    """Местное время одного часового пояса на текущем тике"""
+
+    def __init__(self, timezone: str, now: datetime, slots: list[tuple]):
+        self.timezone = timezone
+        self.now = now
+        # (локальная дата, "HH:MM") с правилами программы, попавшие в окно тика
+        self.slots = slots
+        self._program_days: dict = {}
+
+    def program_day(self, start_date: datetime, day: datetime.date) -> int:
+        """День программы для даты старта (у большинства пациентов она общая)"""
+        key = (start_date.date(), day)
+        program_day = self._program_days.get(key)
+        if program_day is None:
+            program_day = (day - start_date.date()).days + 1
+            self._program_days[key] = program_day
+        return program_day
+
+
+def due_buckets(
+    timezones,
+    now_utc: datetime,
+    since_utc: datetime,
+    force_time: tuple = None,
+) -> dict[str, TimezoneBucket]:
+    """
+    Считает местное время один раз на часовой пояс и оставляет только пояса,
+    в которых на минуты из окна (since_utc, now_utc] есть правила программы.
+    """
+    buckets = {}
+    for timezone in timezones:
+        try:
+            tz = pytz.timezone(timezone)
+        except pytz.UnknownTimeZoneError:
+            logger.error(f"Неизвестный часовой пояс: {timezone}")
+            continue
+        now = now_utc.astimezone(tz)
+        if force_time:
+            now = now.replace(
+                hour=force_time[0],
+                minute=force_time[1],
+                second=0,
+                microsecond=0,
+            )
+            time_str = now.strftime("%H:%M")
+            slots = [(now.date(), time_str)] if time_str in program_index.times else []
+        else:
+            since = since_utc.astimezone(tz)
+            slots = []
+            day = since.date()
+            while day <= now.date():
+                start = since.strftime("%H:%M") if day == since.date() else ""
+                end = now.strftime("%H:%M") if day == now.date() else "24:00"
+                slots += [(day, t) for t in program_index.times_between(start, end)]
+                day += timedelta(days=1)
+        if slots:
+            buckets[timezone] = TimezoneBucket(timezone, now, slots)
+    return buckets
 
 
 async def check_and_send_questionnaires(
@@ -49,542 +202,228 @@ async def check_and_send_questionnaires(
     test_now: datetime = None,
     force_day: int = None,
     force_time: tuple = None,
+    shard: tuple[int, int] = (0, 1),
 ):
-    logger.info("Starting questionnaire check...")
+    global _last_tick_utc, _retry_from_utc
+    logger.info(f"Starting questionnaire check (shard {shard[0]}/{shard[1]})...")
 
     try:
-        if test_users is not None:
-            patients = test_users
-            conn = None
-            use_test_data = True
+        use_test_data = test_users is not None
+        # Ручной прогон проверяет ровно одну минуту и не пишет в reminder_deliveries
+        manual_run = use_test_data or test_now is not None
+        now_utc = test_now if test_now is not None else datetime.now(pytz.utc)
+        retry_from = None
+        if manual_run:
+            since_utc = now_utc - timedelta(minutes=1)
         else:
-            conn = await get_db_connection()
-            patients = await get_all_patients(conn)
-            use_test_data = False
-            logger.info(f"Patients count: {len(patients)}")
+            catchup_from = now_utc - timedelta(minutes=config.REMINDER_CATCHUP_MINUTES)
+            retry_from, _retry_from_utc = _retry_from_utc, None
+            since_utc = min(
+                filter(None, (_last_tick_utc, retry_from)), default=catchup_from
+            )
+            since_utc = max(since_utc, catchup_from)
+
+        if use_test_data:
+            test_patients = [SchedulerPatient.from_mapping(user) for user in test_users]
+            timezones = {
+                p.timezone or config.SCHEDULER_DEFAULT_TIMEZONE for p in test_patients
+            }
+        else:
+            timezones = await repository.get_active_timezones()
+
+        buckets = due_buckets(timezones, now_utc, since_utc, force_time)
+        if not buckets:
+            if not manual_run:
+                _last_tick_utc = now_utc
+            return
+
+        if use_test_data:
+            batches = _test_batches(test_patients)
+        else:
+            batches = iter_scheduler_patients(
+                config.SCHEDULER_BATCH_SIZE, timezones=list(buckets), shard=shard
+            )
 
         global_start_date = (
             None if use_test_data else await get_global_testing_start_date()
         )
 
-        async def process_patient(patient):
+        def patient_rules(
+            patient: SchedulerPatient,
+        ) -> tuple[TimezoneBucket | None, list[tuple]]:
+            """Правила, которые пора отправить пациенту: (правило, день, дата)"""
             try:
-                conn = await get_db_connection()
-
-                telegram_id = patient["telegram_id"]
-                if not patient.get("is_active", False):
-                    return
-
-                tz = pytz.timezone(patient.get("timezone", "Europe/Moscow"))
-                now = test_now.astimezone(tz) if test_now else datetime.now(tz)
-
-                if force_time:
-                    now = now.replace(
-                        hour=force_time[0],
-                        minute=force_time[1],
-                        second=0,
-                        microsecond=0,
-                    )
+                telegram_id = patient.telegram_id
+                if not patient.is_active:
+                    return None, []
 
-                days_passed = (now.date() - global_start_date.date()).days
-
-                logger.info(
-                    f"User {telegram_id}: start_date={global_start_date.date()}, now={now.date()}, days_passed={days_passed}"
-                )
-
-                day_of_program = (
-                    force_day if force_day is not None else (days_passed + 1)
+                bucket = buckets.get(
+                    patient.timezone or config.SCHEDULER_DEFAULT_TIMEZONE
                 )
-
-                current_hour = now.hour
-                current_minute = now.minute
-                # 1. Ежедневная анкета (10:00)
-                if (current_hour == 10 and current_minute == 0) or (
-                        force_time and force_time == (10, 0)
-                ):
-                    await check_and_send_daily_questionnaire(
-                        bot, conn, telegram_id, now.date()
-                    )
-
-                # ----------------- ДЕНЬ 1 -----------------
-                # 2. Анкета приветствия (день 1, 9:00)
-                if day_of_program == 1 and (current_hour == 9 and current_minute == 0):
-                    await send_questionnaire_to_user(
-                        bot,
-                        telegram_id,
-                        "⏰ Пожалуйста, заполните анкету приветствия: /greeting",
-                        "/greeting",
-                    )
-
-                # Данные с носимого устройства (день 1, 20:00)
-                if day_of_program == 1 and (current_hour == 20 and current_minute == 0):
-                    await send_questionnaire_to_user(
-                        bot,
-                        telegram_id,
-                        "⌚ Пожалуйста, выполните задание 'Данные с носимого устройства': /wearable_data",
-                        "/wearable_data",
-                    )
-
-                # ----------------- ДЕНЬ 2 -----------------
-                if day_of_program == 2 and (current_hour == 11 and current_minute == 0):
-                    await send_questionnaire_to_user(
-                        bot,
-                        telegram_id,
-                        "👨‍🦱 Пожалуйста, выполните задание 'Фото лица': /face",
-                        "/face",
-                    )
-                if day_of_program == 2 and (current_hour == 18 and current_minute == 30):
-                    await send_questionnaire_to_user(
-                        bot,
-                        telegram_id,
-                        "🧘 Пожалуйста, заполните анкету осознанности (медитации): /mindfulness",
-                        "/mindfulness",
-                    )
-
-                # ----------------- ДЕНЬ 3 -----------------
-                if day_of_program == 3 and (current_hour == 19 and current_minute == 0):
-                    await send_questionnaire_to_user(
-                        bot,
-                        telegram_id,
-                        "🫁 Пожалуйста, выполните задание 'Дыхание в покое': /rest_breathing",
-                        "/rest_breathing",
-                    )
-
-                # if day_of_program == 3 and (current_hour == 18 and current_minute == 30):
-                #     await send_questionnaire_to_user(
-                #         bot,
-                #         telegram_id,
-                #         "🧍 Пожалуйста, выполните задание 'Фото в полный рост': /full_body",
-                #         "/full_body",
-                #     )
-                #
-                # if day_of_program == 3 and (current_hour == 19 and current_minute == 0):
-                #     await send_questionnaire_to_user(
-                #         bot,
-                #         telegram_id,
-                #         "🧑‍⚕️ Пожалуйста, выполните задание 'Обследования за 3 месяца': /checkups",
-                #         "/checkups",
-                #     )
-
-                # ----------------- ДЕНЬ 4 -----------------
-
-                if day_of_program == 4 and (current_hour == 19 and current_minute == 0):
-                    await send_questionnaire_to_user(
-                        bot,
-                        telegram_id,
-                        "⚡️ Пожалуйста, выполните задание 'Планка': /plank",
-                        "/plank",
-                    )
-
-                # 3. Анкета здоровья (день 4, 19:00)
-                # if day_of_program == 4 and (current_hour == 19 and current_minute == 0):
-                #     await send_questionnaire_to_user(
-                #         bot,
-                #         telegram_id,
-                #         "🏥 Пожалуйста, заполните анкету состояния здоровья: /subjective_health",
-                #         "/subjective_health",
-                #     )
-                #
-                # if day_of_program == 4 and (current_hour == 12 and current_minute == 0):
-                #     await send_questionnaire_to_user(
-                #         bot,
-                #         telegram_id,
-                #         "🩸️ Пожалуйста, выполните задание 'Сдача анализов крови': /blood",
-                #         "/blood",
-                #     )
-
-                # ----------------- ДЕНЬ 5 -----------------
-                if day_of_program == 5 and (current_hour == 19 and current_minute == 0):
-                    await send_questionnaire_to_user(
-                        bot,
-                        telegram_id,
-                        "⚖️ Пожалуйста, выполните задание 'Баланс': /balance",
-                        "/balance",
-                    )
-
-                # if day_of_program == 5 and (current_hour == 19 and current_minute == 0):
-                #     await send_questionnaire_to_user(
-                #         bot,
-                #         telegram_id,
-                #         "🚶 Пожалуйста, выполните задание 'Ходьба': /walking",
-                #         "/walking",
-                #     )
-
-                # ----------------- ДЕНЬ 6 -----------------
-                if day_of_program == 6 and (current_hour == 11 and current_minute == 0):
-                    await send_questionnaire_to_user(
-                        bot,
-                        telegram_id,
-                        "️❤️ Пожалуйста, выполните задание 'Измерения давления и пульса': /pressure",
-                        "/pressure",
-                    )
-
-                # ----------------- ДЕНЬ 7 -----------------
-                if day_of_program == 7 and (current_hour == 19 and current_minute == 0):
-                    await send_questionnaire_to_user(
-                            bot,
-                            telegram_id,
-                            "🏥 Пожалуйста, заполните анкету состояния здоровья: /subjective_health",
-                            "/subjective_health",
-                        )
-
-                if day_of_program == 7 and (current_hour == 20 and current_minute == 0):
-                    await send_questionnaire_to_user(
-                            bot,
-                            telegram_id,
-                            "🧑‍⚕️ Пожалуйста, выполните задание 'Обследования за 3 месяца': /checkups",
-                            "/checkups",
-                        )
-
-                # if day_of_program == 7 and (current_hour == 19 and current_minute == 0):
-                #     await send_questionnaire_to_user(
-                #         bot,
-                #         telegram_id,
-                #         "Пожалуйста, заполните обратную связь: /feedback",
-                #         "/feedback",
-                #     )
-
-                # ----------------- ДЕНЬ 8 -----------------
-                if day_of_program == 8 and (current_hour == 18 and current_minute == 30):
-                    await send_questionnaire_to_user(
-                        bot,
-                        telegram_id,
-                        "🏃 Пожалуйста, выполните задание 'Бег': /running",
-                        "/running",
-                    )
-                #
-                # if day_of_program == 8 and (current_hour == 19 and current_minute == 0):
-                #     await send_questionnaire_to_user(
-                #         bot,
-                #         telegram_id,
-                #         "🍎 Пожалуйста, заполните анкету питания: /nutrition",
-                #         "/nutrition",
-                #     )
-
-                # ----------------- ДЕНЬ 9 -----------------
-
-                if day_of_program == 9 and (current_hour == 19 and current_minute == 0):
-                    await send_questionnaire_to_user(
-                        bot,
-                        telegram_id,
-                        "📱 Пожалуйста, выполните задание 'Рассказ о себе': /speech",
-                        "/speech",
-                    )
-
-                # if day_of_program == 9 and (current_hour == 10 and current_minute == 30):
-                #     await send_questionnaire_to_user(
-                #         bot,
-                #         telegram_id,
-                #         "🦶 Пожалуйста, выполните задание 'Фото стоп': /feet",
-                #         "/feet",
-                #     )
-                #     await send_questionnaire_to_user(
-                #         bot,
-                #         telegram_id,
-                #         "Пожалуйста, выполните задание 'Тест на реакцию': /reaction",
-                #         "/reaction",
-                #     )
-                #
-
-
-                # ----------------- ДЕНЬ 10 -----------------
-                # 5. Анкета телосложения (день 10, 18:30)
-                # if day_of_program == 10 and (current_hour == 18 and current_minute == 30):
-                #     await send_questionnaire_to_user(
-                #         bot,
-                #         telegram_id,
-                #         "📏 Пожалуйста, заполните анкету телосложения: /body_measurements",
-                #         "/body_measurements",
-                #     )
-
-                if day_of_program == 10 and (current_hour == 19 and current_minute == 0):
-                    await send_questionnaire_to_user(
-                        bot,
-                        telegram_id,
-                        "⚡️ Пожалуйста, выполните задание 'Приседания': /squats",
-                        "/squats",
-                    )
-
-                if day_of_program == 10 and (current_hour == 20 and current_minute == 0):
-                    await send_questionnaire_to_user(
-                        bot,
-                        telegram_id,
-                        "🧑‍⚕️ Пожалуйста, выполните задание 'Обследования за 3 месяца': /checkups",
-                        "/checkups",
-                    )
-
-                # ----------------- ДЕНЬ 11 -----------------
-
-                if day_of_program == 11 and (current_hour == 18 and current_minute == 30):
-                    await send_questionnaire_to_user(
-                        bot,
-                        telegram_id,
-                        "🫳 Пожалуйста, выполните задание 'Поднятие объекта': /picking_up",
-                        "/picking_up",
-                    )
-
-
-                # ----------------- ДЕНЬ 12 -----------------
-                if day_of_program == 12 and (current_hour == 9 and current_minute == 0):
-                    await send_questionnaire_to_user(
-                        bot,
-                        telegram_id,
-                        "🫁 Пожалуйста, выполните задание 'Дыхание в покое': /rest_breathing",
-                        "/rest_breathing",
-                    )
-
-                # ----------------- ДЕНЬ 13 -----------------
-                if day_of_program == 13 and (current_hour == 19 and current_minute == 0):
-                    await send_questionnaire_to_user(
-                        bot,
-                        telegram_id,
-                        "🫁 Пожалуйста, выполните задание 'Дыхание после нагрузки': /breathing",
-                        "/breathing",
-                    )
-
-                # ----------------- ДЕНЬ 14 -----------------
-                if day_of_program == 14 and (current_hour == 11 and current_minute == 0):
-                    await send_questionnaire_to_user(
-                        bot,
-                        telegram_id,
-                        "👅 Пожалуйста, выполните задание 'Фото языка утром': /tongue",
-                        "/tongue",
-                    )
-                if day_of_program == 14 and (current_hour == 11 and current_minute == 30):
-                    await send_questionnaire_to_user(
-                        bot,
-                        telegram_id,
-                        "👁️ Пожалуйста, выполните задание 'Микрофото глаза': /eye",
-                        "/eye",
-                    )
-                if day_of_program == 14 and (current_hour == 12 and current_minute == 0):
-                    await send_questionnaire_to_user(
-                        bot,
-                        telegram_id,
-                        "👨‍🦱 Пожалуйста, выполните задание 'Фото лица': /face",
-                        "/face",
-                    )
-
-                # 7. Анкета осознанности (день 14, 18:30)
-                # if day_of_program == 14 and (current_hour == 18 and current_minute == 30):
-                #     await send_questionnaire_to_user(
-                #         bot,
-                #         telegram_id,
-                #         "🧘 Пожалуйста, заполните анкету осознанности (медитации): /mindfulness",
-                #         "/mindfulness",
-                #     )
-                #
-                # if day_of_program == 14 and (current_hour == 9 and current_minute == 0):
-                #     await send_questionnaire_to_user(
-                #         bot,
-                #         telegram_id,
-                #         "️❤️ Пожалуйста, выполните задание 'Измерения давления и пульса': /pressure",
-                #         "/pressure",
-                #     )
-                #
-                # if day_of_program == 14 and (current_hour == 19 and current_minute == 0):
-                #     await send_questionnaire_to_user(
-                #         bot,
-                #         telegram_id,
-                #         "Пожалуйста, заполните обратную связь: /feedback",
-                #         "/feedback",
-                #     )
-
-                # ----------------- ДЕНЬ 15 -----------------
-                if day_of_program == 15 and (current_hour == 18 and current_minute == 30):
-                    await send_questionnaire_to_user(
-                        bot,
-                        telegram_id,
-                        "📏 Пожалуйста, заполните анкету телосложения: /body_measurements",
-                        "/body_measurements",
-                    )
-                if day_of_program == 15 and (current_hour == 19 and current_minute == 0):
-                    await send_questionnaire_to_user(
-                        bot,
-                        telegram_id,
-                        "💊 Пожалуйста, заполните анкету приема БАДов/витаминов: /supplements",
-                        "/supplements",
-                    )
-
-                # ----------------- ДЕНЬ 16 -----------------
-                if day_of_program == 16 and (current_hour == 19 and current_minute == 0):
-                    await send_questionnaire_to_user(
-                        bot,
-                        telegram_id,
-                        "🧍 Пожалуйста, выполните задание 'Фото в полный рост': /full_body",
-                        "/full_body",
-                    )
-
-                # ----------------- ДЕНЬ 17 -----------------
-                if day_of_program == 17 and (current_hour == 18 and current_minute == 30):
-                    await send_questionnaire_to_user(
-                        bot,
-                        telegram_id,
-                        "🖐️ Пожалуйста, выполните задание 'Фото рук': /hands",
-                        "/hands",
-                    )
-                if day_of_program == 17 and (current_hour == 19 and current_minute == 0):
-                    await send_questionnaire_to_user(
-                        bot,
-                        telegram_id,
-                        "🦶 Пожалуйста, выполните задание 'Фото стоп': /feet",
-                        "/feet",
-                    )
-
-                # ----------------- ДЕНЬ 18 -----------------
-                if day_of_program == 18 and (current_hour == 19 and current_minute == 0):
-                    await send_questionnaire_to_user(
-                        bot,
-                        telegram_id,
-                        "🚶 Пожалуйста, выполните задание 'Ходьба': /walking",
-                        "/walking",
-                    )
-
-                # ----------------- ДЕНЬ 19 -----------------
-
-                if day_of_program == 19 and (current_hour == 19 and current_minute == 0):
-                    await send_questionnaire_to_user(
-                        bot,
-                        telegram_id,
-                        "‍👦 Пожалуйста, выполните задание 'Вращения головой': /neck",
-                        "/neck",
-                    )
-                # ----------------- ДЕНЬ 20 -----------------
-                if day_of_program == 20 and (current_hour == 19 and current_minute == 0):
-                    await send_questionnaire_to_user(
-                        bot,
-                        telegram_id,
-                        "🍎 Пожалуйста, заполните анкету питания: /nutrition",
-                        "/nutrition",
-                    )
-
-                # ----------------- ДЕНЬ 21 -----------------
-                # if day_of_program == 21 and (current_hour == 9 and current_minute == 0):
-                #     await send_questionnaire_to_user(
-                #         bot,
-                #         telegram_id,
-                #         "️❤️ Пожалуйста, выполните задание 'Измерения давления и пульса': /pressure",
-                #         "/pressure",
-                #     )
-                #
-                # if day_of_program == 21 and (current_hour == 19 and current_minute == 0):
-                #     await send_questionnaire_to_user(
-                #         bot,
-                #         telegram_id,
-                #         "Пожалуйста, заполните обратную связь: /feedback",
-                #         "/feedback",
-                #     )
-
-                # ----------------- ДЕНЬ 22 -----------------
-                if day_of_program == 22 and (current_hour == 19 and current_minute == 0):
-                    await send_questionnaire_to_user(
-                        bot,
-                        telegram_id,
-                        "🛡️ Пожалуйста, заполните анкету безопасности и поддержки: /safety",
-                        "/safety",
-                    )
-
-                # ----------------- ДЕНЬ 23 -----------------
-                if day_of_program == 23 and (current_hour == 19 and current_minute == 0):
-                    await send_questionnaire_to_user(
-                        bot,
-                        telegram_id,
-                        "👨‍👩‍👧‍👦 Пожалуйста, заполните анкету близкого окружения: /close_environment",
-                        "/close_environment",
-                    )
-
-                # ----------------- ДЕНЬ 24 -----------------
-                if day_of_program == 24 and (current_hour == 19 and current_minute == 0):
-                    await send_questionnaire_to_user(
-                        bot,
-                        telegram_id,
-                        "😁 Пожалуйста, выполните задание 'Запись смеха/улыбки': /laughter",
-                        "/laughter",
-                    )
-
-                # ----------------- ДЕНЬ 25 -----------------
-                if day_of_program == 25 and (current_hour == 10 and current_minute == 30):
-                    await send_questionnaire_to_user(
-                        bot,
-                        telegram_id,
-                        "Пожалуйста, выполните задание 'Тест на реакцию': /reaction",
-                        "/reaction",
-                    )
-
-
-                # ----------------- ДЕНЬ 26 -----------------
-
-
-                # ----------------- ДЕНЬ 27 -----------------
-                if day_of_program == 27 and (current_hour == 19 and current_minute == 0):
-                    await send_questionnaire_to_user(
-                        bot,
-                        telegram_id,
-                        "🏥 Пожалуйста, заполните анкету состояния здоровья: /subjective_health",
-                        "/subjective_health",
-                    )
-
-                # ----------------- ДЕНЬ 28 -----------------
-
-                if day_of_program == 28 and (current_hour == 20 and current_minute == 15):
-                    await send_questionnaire_to_user(
-                        bot,
-                        telegram_id,
-                        "Пожалуйста, заполните финальную обратную связь: /feedback",
-                        "/feedback",
-                    )
+                if bucket is None:
+                    return None, []
+
+                start_date = patient.testing_start_date or global_start_date
+                due = []
+                for local_date, time_str in bucket.slots:
+                    day_of_program = (
+                        force_day
+                        if force_day is not None
+                        else bucket.program_day(start_date, local_date)
+                    )
+                    logger.info(
+                        f"User {telegram_id}: start_date={start_date.date()}, now={local_date} {time_str}, day_of_program={day_of_program}"
+                    )
+                    due += [
+                        (rule, day_of_program, local_date)
+                        for rule in program_index.due(day_of_program, time_str)
+                    ]
+                return bucket, due
 
             except Exception as e:
-                logger.error(
-                    f"Error processing patient {patient.get('telegram_id')}: {e}"
-                )
+                logger.error(f"Error processing patient {patient.telegram_id}: {e}")
                 if use_test_data:
                     raise
+                return None, []
+
+        patients_count = 0
+        # Ошибку запроса к БД ручной прогон не досылает — у него нет окна
+        window = None if manual_run else since_utc
+
+        async def process_batch(batch: list[SchedulerPatient]):
+            nonlocal patients_count
+            patients_count += len(batch)
+            # (правило, день программы) -> пациенты
+            to_send: dict[tuple[ProgramRule, int], list[int]] = {}
+            # (часовой пояс, правило, день программы, дата) -> пациенты,
+            # которых надо сначала сверить с историей
+            unless_filled: dict[tuple, list[int]] = {}
+            for patient in batch:
+                bucket, due = patient_rules(patient)
+                for rule, day_of_program, local_date in due:
+                    if rule.unless_filled:
+                        key = (bucket.timezone, rule, day_of_program, local_date)
+                        unless_filled.setdefault(key, []).append(patient.telegram_id)
+                    else:
+                        to_send.setdefault((rule, day_of_program), []).append(
+                            patient.telegram_id
+                        )
+
+            for (
+                timezone,
+                rule,
+                day_of_program,
+                local_date,
+            ), ids in unless_filled.items():
+                unfilled = await get_daily_unfilled(ids, local_date, timezone, window)
+                if unfilled:
+                    to_send.setdefault((rule, day_of_program), []).extend(unfilled)
+
+            for (rule, day_of_program), telegram_ids in to_send.items():
+                if not manual_run:
+                    telegram_ids = await claim_reminders(
+                        telegram_ids, rule, day_of_program, window
+                    )
+                for telegram_id in telegram_ids:
+                    future = await send_questionnaire_to_user(
+                        bot, telegram_id, rule.text, rule.command
+                    )
+                    if not manual_run:
+                        release_if_failed(
+                            future, telegram_id, rule, day_of_program, since_utc
+                        )
 
-        await asyncio.gather(*(process_patient(p) for p in patients))
+        stats = await fan_out(
+            process_batch,
+            batches,
+            concurrency=config.SCHEDULER_CONCURRENCY,
+            timeout=config.SCHEDULER_ITEM_TIMEOUT,
+            name="questionnaire batches",
+        )
+        if use_test_data and stats.failed:
+            raise RuntimeError(
+                f"Ошибки при обработке тестовых пациентов: {stats.failed}"
+            )
+        if not manual_run:
+            if stats.failed or stats.timed_out:
+                # Часть пачек не дошла до отправки — следующий тик пройдёт окно заново
+                _retry_from(since_utc)
+            _last_tick_utc = now_utc
+        logger.info(
+            f"Shard {shard[0]}/{shard[1]} tick: {stats.elapsed:.2f}s, "
+            f"patients count: {patients_count}, timezones due: {sorted(buckets)}, "
+            f"{stats.summary()}, send queue: {message_dispatcher.stats()}"
+        )
 
     except Exception as e:
         logger.error(f"Critical error in questionnaire scheduler: {e}")
+        if retry_from is not None:
+            _retry_from(retry_from)
         raise
-    finally:
-        if not use_test_data and conn:
-            await conn.close()
 
 
-async def check_and_send_daily_questionnaire(
-    bot: Bot, conn, user_id: int, today: datetime.date
-):
-    """Проверяет и отправляет ежедневную анкету, если она еще не заполнена"""
+async def claim_reminders(
+    telegram_ids: list[int],
+    rule: ProgramRule,
+    day_of_program: int,
+    since_utc: datetime = None,
+) -> list[int]:
+    """
+    Пациенты, которым напоминание ещё не отправлялось (и теперь занято за ними).
+    При ошибке окно тика с since_utc проходится заново на следующем тике.
+    """
     try:
-        filled = await conn.fetchval(
-            """
-            SELECT 1 FROM patient_history ph
-            JOIN patients p ON ph.patient_id = p.id
-            WHERE p.telegram_id = $1
-            AND DATE(ph.created_at AT TIME ZONE p.timezone) = $2
-            LIMIT 1
-        """,
-            user_id,
-            today,
+        return await repository.claim_reminders(telegram_ids, rule.key, day_of_program)
+    except Exception as e:
+        # Без отметки не отправляем: иначе возможен дубль с другим экземпляром
+        logger.error(f"Error claiming reminder {rule.key} day {day_of_program}: {e}")
+        if since_utc is not None:
+            _retry_from(since_utc)
+        return []
+
+
+async def get_daily_unfilled(
+    telegram_ids: list[int],
+    today: datetime.date,
+    timezone: str,
+    since_utc: datetime = None,
+) -> list[int]:
+    """
+    Пациенты часового пояса, ещё не заполнившие ежедневную анкету за today.
+    При ошибке окно тика с since_utc проходится заново на следующем тике.
+    """
+    try:
+        day_start, day_end = local_day_bounds_utc(today, timezone)
+        return await repository.get_daily_unfilled(
+            telegram_ids, day_start, day_end, today
         )
-        if not filled:
-            await send_questionnaire_to_user(
-                bot,
-                user_id,
-                "⏰ Время заполнить ежедневную анкету!\nВведите /daily чтобы начать",
-                "/daily",
-            )
     except Exception as e:
-        logger.error(f"Error checking daily questionnaire for {user_id}: {e}")
+        logger.error(f"Error checking daily questionnaire for {timezone}: {e}")
+        if since_utc is not None:
+            _retry_from(since_utc)
+        return []
 
 
 def setup_scheduler(bot: Bot):
     """Настройка планировщика"""
+    if config.SCHEDULER_SHARDS > 1:
+        logger.info(
+            f"Тик напоминаний выполняют {config.SCHEDULER_SHARDS} процессов "
+            "src.bot.scheduler_worker"
+        )
+    else:
+        scheduler.add_job(
+            check_and_send_questionnaires,
+            CronTrigger(minute="*", hour="*"),
+            args=[bot],
+            id="hourly_questionnaire_check",
+            replace_existing=True,
+        )
     scheduler.add_job(
-        check_and_send_questionnaires,
-        CronTrigger(minute="*", hour="*"),
-        args=[bot],
-        id="hourly_questionnaire_check",
+        maintain_partitions,
+        CronTrigger(minute="0", hour="3"),
+        id="partition_maintenance",
         replace_existing=True,
     )
-    scheduler.start()
+    # При выборе лидера задачи включаются, только пока экземпляр ведущий
+    scheduler.start(paused=config.SCHEDULER_LEADER_ELECTION)
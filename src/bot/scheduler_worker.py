@@ -0,0 +1,138 @@
+"""
+Процессы минутного тика напоминаний, по одному на шард пациентов
+(telegram_id % SCHEDULER_SHARDS). Процесс бота при SCHEDULER_SHARDS > 1 тик
+не выполняет.
+
+    python -m src.bot.scheduler_worker             # все шарды, по процессу на шард
+    python -m src.bot.scheduler_worker --shard 2   # один шард (например, в своём контейнере)
+
+Несколько копий одного шарда безопасны: тик выполняет только держатель
+advisory lock этого шарда, повторы отсекает reminder_deliveries.
+
+Лимит отправки Telegram общий на токен бота: процесс бота берёт долю
+TELEGRAM_BOT_RATE_SHARE, шарды делят остаток (sender.split_rate_limit).
+--shards должен совпадать с SCHEDULER_SHARDS процесса бота.
+SIGTERM/SIGINT останавливают шард после отправки очереди сообщений.
+"""
+
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import signal
+
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.triggers.cron import CronTrigger
+
+from src import config
+from src.bot.scheduler import check_and_send_questionnaires, wait_for_releases
+from src.bot.sender import message_dispatcher, split_rate_limit
+from src.bot_instance import bot
+from src.db.connection import close_db_pool, init_db_pool
+from src.db.leader import LeaderElection
+from src.db.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+async def run_shard(shard: int, shards: int):
+    await init_db_pool()
+    settings.start_listener()
+    # Лимит Telegram общий на бота — делим его между процессами
+    message_dispatcher.set_rate(split_rate_limit(shards)[1])
+    message_dispatcher.start(bot)
+
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, stopping.set)
+
+    scheduler = AsyncIOScheduler()
+    scheduler.add_job(
+        check_and_send_questionnaires,
+        CronTrigger(minute="*", hour="*"),
+        args=[bot],
+        kwargs={"shard": (shard, shards)},
+        id=f"questionnaire_check_shard_{shard}",
+        replace_existing=True,
+    )
+    scheduler.start(paused=config.SCHEDULER_LEADER_ELECTION)
+
+    def set_active(active: bool):
+        if active:
+            scheduler.resume()
+        else:
+            scheduler.pause()
+
+    # Свой замок на каждый шард, ключ бота — SCHEDULER_LOCK_KEY
+    leader = LeaderElection(
+        config.SCHEDULER_LOCK_KEY + 1 + shard,
+        config.SCHEDULER_LEADER_HEARTBEAT,
+        on_change=set_active,
+    )
+    if config.SCHEDULER_LEADER_ELECTION:
+        leader.start()
+
+    logger.info(f"Шард {shard}/{shards} запущен")
+    try:
+        await stopping.wait()
+        logger.info(f"Шард {shard}/{shards} останавливается")
+    finally:
+        await leader.stop()
+        scheduler.shutdown(wait=False)
+        await message_dispatcher.stop()
+        await wait_for_releases()
+        await settings.stop_listener()
+        await close_db_pool()
+
+
+def run_shard_process(shard: int, shards: int):
+    logging.basicConfig(
+        level=logging.INFO,
+        format=f"%(asctime)s - shard {shard} - %(name)s - %(levelname)s - %(message)s",
+    )
+    try:
+        asyncio.run(run_shard(shard, shards))
+    except KeyboardInterrupt:
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Шардированный тик напоминаний")
+    parser.add_argument("--shards", type=int, default=config.SCHEDULER_SHARDS)
+    parser.add_argument(
+        "--shard", type=int, default=None, help="запустить только этот шард"
+    )
+    args = parser.parse_args()
+
+    if args.shard is not None:
+        if not 0 <= args.shard < args.shards:
+            parser.error(f"--shard должен быть в диапазоне 0..{args.shards - 1}")
+        run_shard_process(args.shard, args.shards)
+        return
+
+    processes = [
+        multiprocessing.Process(
+            target=run_shard_process, args=(shard, args.shards), name=f"shard-{shard}"
+        )
+        for shard in range(args.shards)
+    ]
+    for process in processes:
+        process.start()
+
+    def stop_processes(signum, frame):
+        # Каждый шард сам дожидается отправки своей очереди
+        for process in processes:
+            process.terminate()
+
+    signal.signal(signal.SIGTERM, stop_processes)
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.join()
+
+
+if __name__ == "__main__":
+    main()
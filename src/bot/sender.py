@@ -0,0 +1,267 @@
+import asyncio
+import itertools
+import logging
+import time
+from typing import Any, NamedTuple
+
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramBadRequest,
+    TelegramForbiddenError,
+    TelegramRetryAfter,
+)
+
+from src import config
+from src.rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Меньше — раньше: ответы пользователю идут впереди рассылок
+PRIORITY_INTERACTIVE = 0
+PRIORITY_DIGEST = 1
+PRIORITY_REMINDER = 2
+
+# Пользователь заблокировал бота / неверный запрос — повтор не поможет
+PERMANENT_ERRORS = (TelegramForbiddenError, TelegramBadRequest)
+
+
+class DispatcherStopped(Exception):
+    """Сообщение не отправлено: очередь остановили раньше"""
+
+
+class OutboundMessage(NamedTuple):
+    chat_id: int
+    text: str
+    kwargs: dict
+    future: asyncio.Future
+    attempt: int = 0
+
+
+class MessageDispatcher:
+    """
+    Очередь исходящих сообщений бота.
+    Общий token bucket держит лимит Telegram на бота, между сообщениями в один
+    чат выдерживается chat_interval, TelegramRetryAfter приостанавливает всю
+    отправку на указанное время, после чего сообщение уходит повторно
+    (такие повторы не считаются в max_retries).
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        chat_interval: float,
+        workers: int,
+        max_retries: int,
+    ):
+        self.chat_interval = chat_interval
+        self.workers = workers
+        self.max_retries = max_retries
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+        self._bucket = TokenBucket(rate)
+        self._queue: asyncio.PriorityQueue | None = None
+        self._seq = itertools.count()
+        self._chat_ready: dict[int, float] = {}
+        self._delayed = 0
+        self._pending = 0
+        self._idle: asyncio.Event | None = None
+        # Futures неотправленных сообщений: в очереди, отложенных и в отправке
+        self._futures: set[asyncio.Future] = set()
+        self._tasks: list[asyncio.Task] = []
+        self._bot: Bot | None = None
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    def start(self, bot: Bot):
+        if self.running:
+            return
+        self._bot = bot
+        self._queue = asyncio.PriorityQueue()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"telegram-sender-{i}")
+            for i in range(self.workers)
+        ]
+
+    async def stop(self, timeout: float = None):
+        """
+        Дожидается отправки очереди (не дольше timeout) и останавливает воркеры.
+        Futures того, что не успело уйти (в том числе прерванной отправки),
+        завершаются ошибкой DispatcherStopped — по ним можно дослать позже.
+        """
+        if not self.running:
+            return
+        timeout = config.TELEGRAM_SEND_DRAIN_TIMEOUT if timeout is None else timeout
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Не отправлено при остановке: {self._pending} сообщений")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        for future in list(self._futures):
+            if not future.done():
+                future.set_exception(DispatcherStopped("Очередь отправки остановлена"))
+        self._futures.clear()
+        self._pending = 0
+        self._idle.set()
+
+    def set_rate(self, rate: float):
+        """Меняет общий лимит (например, когда бот делят несколько процессов)"""
+        self._bucket.set_rate(rate)
+
+    def submit(
+        self, chat_id: int, text: str, priority: int = PRIORITY_REMINDER, **kwargs: Any
+    ) -> asyncio.Future:
+        """
+        Ставит сообщение в очередь и сразу возвращает future с результатом
+        bot.send_message. Ошибки отправки логируются здесь же.
+        """
+        if not self.running:
+            raise RuntimeError("Очередь отправки не запущена: вызовите start()")
+        future = asyncio.get_running_loop().create_future()
+        future.add_done_callback(_consume_exception)
+        self._futures.add(future)
+        future.add_done_callback(self._futures.discard)
+        self._pending += 1
+        self._idle.clear()
+        self._put(priority, OutboundMessage(chat_id, text, kwargs, future))
+        return future
+
+    async def send(
+        self, chat_id: int, text: str, priority: int = PRIORITY_REMINDER, **kwargs: Any
+    ):
+        """Как submit(), но дожидается отправки"""
+        return await self.submit(chat_id, text, priority, **kwargs)
+
+    async def drain(self):
+        """Ждёт, пока все поставленные сообщения будут отправлены или отброшены"""
+        if self.running:
+            await self._idle.wait()
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize() if self._queue else 0,
+            "delayed": self._delayed,
+            "pending": self._pending,
+            "sent": self.sent,
+            "retried": self.retried,
+            "failed": self.failed,
+        }
+
+    def _put(self, priority: int, message: OutboundMessage, seq: int = None):
+        seq = next(self._seq) if seq is None else seq
+        self._queue.put_nowait((priority, seq, message))
+
+    def _put_later(
+        self, delay: float, priority: int, message: OutboundMessage, seq: int = None
+    ):
+        """Возвращает сообщение в очередь через delay секунд (с прежним местом)"""
+        self._delayed += 1
+
+        def requeue():
+            self._delayed -= 1
+            if self.running:
+                self._put(priority, message, seq)
+
+        asyncio.get_running_loop().call_later(delay, requeue)
+
+    def _done(self, message: OutboundMessage, result=None, error: Exception = None):
+        if error is None:
+            self.sent += 1
+            if not message.future.done():
+                message.future.set_result(result)
+        else:
+            self.failed += 1
+            logger.error(f"Ошибка отправки пользователю {message.chat_id}: {error}")
+            if not message.future.done():
+                message.future.set_exception(error)
+        self._pending -= 1
+        if self._pending == 0:
+            self._idle.set()
+
+    def _reserve_chat(self, chat_id: int) -> float:
+        """Сколько ещё ждать до следующего сообщения в чат (0 — можно слать)"""
+        now = time.monotonic()
+        wait = self._chat_ready.get(chat_id, 0.0) - now
+        if wait > 0:
+            return wait
+        if len(self._chat_ready) > 10000:
+            self._chat_ready = {
+                chat: ready for chat, ready in self._chat_ready.items() if ready > now
+            }
+        self._chat_ready[chat_id] = now + self.chat_interval
+        return 0.0
+
+    async def _worker(self):
+        while True:
+            priority, seq, message = await self._queue.get()
+
+            wait = self._reserve_chat(message.chat_id)
+            if wait > 0:
+                self._put_later(wait, priority, message, seq)
+                continue
+
+            await self._bucket.acquire()
+            try:
+                result = await self._bot.send_message(
+                    chat_id=message.chat_id, text=message.text, **message.kwargs
+                )
+            except TelegramRetryAfter as e:
+                # Telegram просит подождать, а не отказывает — попытка не тратится
+                self._bucket.pause(e.retry_after)
+                self.retried += 1
+                logger.warning(
+                    f"Flood wait {e.retry_after} с, сообщение пользователю "
+                    f"{message.chat_id} вернётся в очередь"
+                )
+                self._put_later(e.retry_after, priority, message, seq)
+            except PERMANENT_ERRORS as e:
+                self._done(message, error=e)
+            except Exception as e:
+                self._retry(priority, message, e, 2**message.attempt)
+            else:
+                self._done(message, result)
+
+    def _retry(
+        self, priority: int, message: OutboundMessage, error: Exception, delay: float
+    ):
+        if message.attempt >= self.max_retries:
+            self._done(message, error=error)
+            return
+        self.retried += 1
+        logger.warning(
+            f"Повтор отправки пользователю {message.chat_id} через {delay} с: {error}"
+        )
+        self._put_later(delay, priority, message._replace(attempt=message.attempt + 1))
+
+
+def split_rate_limit(shards: int) -> tuple[float, float]:
+    """
+    Делит TELEGRAM_RATE_LIMIT (он на токен бота, а не на процесс) между
+    процессами: (процесс бота, каждый из shards процессов тика).
+    Без шардов тик идёт в процессе бота, и весь лимит у него.
+    """
+    if shards <= 1:
+        return config.TELEGRAM_RATE_LIMIT, 0.0
+    bot_rate = config.TELEGRAM_RATE_LIMIT * config.TELEGRAM_BOT_RATE_SHARE
+    return bot_rate, (config.TELEGRAM_RATE_LIMIT - bot_rate) / shards
+
+
+def _consume_exception(future: asyncio.Future):
+    # Ошибка уже залогирована; без этого asyncio ругается на неполученный exception
+    if not future.cancelled():
+        future.exception()
+
+
+message_dispatcher = MessageDispatcher(
+    rate=config.TELEGRAM_RATE_LIMIT,
+    chat_interval=config.TELEGRAM_CHAT_INTERVAL,
+    workers=config.TELEGRAM_SEND_WORKERS,
+    max_retries=config.TELEGRAM_SEND_MAX_RETRIES,
+)
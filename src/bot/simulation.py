@@ -0,0 +1,388 @@
+"""
+Симуляция минутного тика напоминаний без Telegram и базы данных.
+
+    python -m src.bot.simulation --patients 1000
+    python -m src.bot.simulation --patients 100000 --output reminders.jsonl
+
+Генерирует пациентов во всех часовых поясах из /set_timezone и их историю
+анкет, поминутно прогоняет check_and_send_questionnaires через всю программу
+с фейковым ботом и печатает отчёт: сколько напоминаний ушло, задержку тиков,
+пиковую память. digest — хэш всех отправленных напоминаний; baseline — тот же
+хэш по логике движка до переделки (baseline_reminders), parity — совпали ли они.
+"""
+
+import argparse
+import asyncio
+import bisect
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+import hashlib
+import json
+import logging
+import random
+import resource
+import time
+
+import pytz
+
+from src import config
+from src.bot.handlers.timezone import IANA_TIMEZONES
+from src.bot.program import PROGRAM_DAYS
+from src.bot.scheduler import check_and_send_questionnaires, due_buckets
+from src.bot.sender import message_dispatcher
+from src.db.patient_repository import repository
+
+logger = logging.getLogger(__name__)
+
+
+class FakeBot:
+    """Записывает отправленные сообщения вместо запросов к Telegram"""
+
+    def __init__(self):
+        self.now: datetime | None = None
+        self.sent: list[tuple[datetime, int, str]] = []
+
+    async def send_message(self, chat_id: int, text: str, reply_markup=None, **kwargs):
+        command = reply_markup.keyboard[0][0].text if reply_markup else text
+        self.sent.append((self.now, chat_id, command))
+
+
+def make_patients(
+    count: int, start_date: datetime, stagger_days: int = 0, seed: int = 0
+) -> list[dict]:
+    """
+    Синтетические пациенты, равномерно по часовым поясам (плюс пациенты без
+    пояса). stagger_days разносит даты старта программы на 0..stagger_days дней.
+    """
+    rng = random.Random(seed)
+    timezones = sorted(set(IANA_TIMEZONES.values())) + [None]
+    return [
+        {
+            "telegram_id": telegram_id,
+            "timezone": rng.choice(timezones),
+            "is_active": True,
+            "testing_start_date": start_date
+            + timedelta(days=rng.randint(0, stagger_days)),
+        }
+        for telegram_id in range(1, count + 1)
+    ]
+
+
+class SimulatedHistory:
+    """
+    История анкет в памяти вместо patient_history. Запись видна только после
+    своего created_at: ежедневная анкета сверяется с тем, что уже заполнено
+    к минуте тика.
+    """
+
+    def __init__(self):
+        # Текущая минута симуляции (UTC, без tzinfo — как created_at в базе)
+        self.now: datetime | None = None
+        self._records: dict[int, list[datetime]] = defaultdict(list)
+
+    def add(self, telegram_id: int, created_at: datetime):
+        bisect.insort(self._records[telegram_id], created_at)
+
+    def __len__(self) -> int:
+        return sum(len(records) for records in self._records.values())
+
+    def filled_between(self, telegram_id: int, start: datetime, end: datetime) -> bool:
+        records = self._records.get(telegram_id, [])
+        end = min(end, self.now)
+        index = bisect.bisect_left(records, start)
+        return index < len(records) and records[index] < end
+
+    def filled_on(self, telegram_id: int, day, tz) -> bool:
+        """Есть ли запись за локальный день day (проверка прежнего движка)"""
+        return any(
+            created_at.replace(tzinfo=pytz.utc).astimezone(tz).date() == day
+            for created_at in self._records.get(telegram_id, [])
+            if created_at < self.now
+        )
+
+    async def get_daily_unfilled(
+        self, telegram_ids: list[int], day_start: datetime, day_end: datetime, day
+    ) -> list[int]:
+        """Подменяет PatientRepository.get_daily_unfilled на время симуляции"""
+        return [
+            telegram_id
+            for telegram_id in telegram_ids
+            if not self.filled_between(telegram_id, day_start, day_end)
+        ]
+
+
+def make_history(
+    patients: list[dict], first: datetime, days: int, fill_rate: float, seed: int = 0
+) -> SimulatedHistory:
+    """В среднем fill_rate записей в сутки на пациента, в случайные минуты"""
+    rng = random.Random(seed)
+    history = SimulatedHistory()
+    first = first.astimezone(pytz.utc).replace(tzinfo=None)
+    for patient in patients:
+        for day in range(days + 1):
+            if rng.random() < fill_rate:
+                minute = rng.randrange(24 * 60)
+                history.add(
+                    patient["telegram_id"],
+                    first + timedelta(days=day, minutes=minute),
+                )
+    return history
+
+
+# Расписание check_and_send_questionnaires до переделки движка (коммит 16646a8),
+# переписанное из его цепочки if: (день программы, "HH:MM", команда).
+# Нарочно не берётся из src.bot.program — это эталон для сверки с ним.
+BASELINE_RULES = [
+    (1, "09:00", "/greeting"),
+    (1, "20:00", "/wearable_data"),
+    (2, "11:00", "/face"),
+    (2, "18:30", "/mindfulness"),
+    (3, "19:00", "/rest_breathing"),
+    (4, "19:00", "/plank"),
+    (5, "19:00", "/balance"),
+    (6, "11:00", "/pressure"),
+    (7, "19:00", "/subjective_health"),
+    (7, "20:00", "/checkups"),
+    (8, "18:30", "/running"),
+    (9, "19:00", "/speech"),
+    (10, "19:00", "/squats"),
+    (10, "20:00", "/checkups"),
+    (11, "18:30", "/picking_up"),
+    (12, "09:00", "/rest_breathing"),
+    (13, "19:00", "/breathing"),
+    (14, "11:00", "/tongue"),
+    (14, "11:30", "/eye"),
+    (14, "12:00", "/face"),
+    (15, "18:30", "/body_measurements"),
+    (15, "19:00", "/supplements"),
+    (16, "19:00", "/full_body"),
+    (17, "18:30", "/hands"),
+    (17, "19:00", "/feet"),
+    (18, "19:00", "/walking"),
+    (19, "19:00", "/neck"),
+    (20, "19:00", "/nutrition"),
+    (22, "19:00", "/safety"),
+    (23, "19:00", "/close_environment"),
+    (24, "19:00", "/laughter"),
+    (25, "10:30", "/reaction"),
+    (27, "19:00", "/subjective_health"),
+    (28, "20:15", "/feedback"),
+]
+# Ежедневная анкета — каждый день программы и вне её, если за день нет записей
+BASELINE_DAILY = ("10:00", "/daily")
+# Прежний движок брал patient.get("timezone", "Europe/Moscow")
+BASELINE_DEFAULT_TIMEZONE = "Europe/Moscow"
+
+
+def baseline_reminders(
+    patients: list[dict], history: SimulatedHistory, first: datetime, minutes: int
+) -> list[tuple[datetime, int, str]]:
+    """
+    Напоминания, которые отправил бы прежний check_and_send_questionnaires,
+    вызванный на каждой минуте окна: местное время пациента, день программы
+    от даты старта, совпадение часа и минуты с правилом.
+    """
+    by_slot = defaultdict(list)
+    for day, time_str, command in BASELINE_RULES:
+        by_slot[(day, time_str)].append(command)
+    times = {time_str for _, time_str, _ in BASELINE_RULES} | {BASELINE_DAILY[0]}
+
+    by_zone = defaultdict(list)
+    for patient in patients:
+        by_zone[patient["timezone"] or BASELINE_DEFAULT_TIMEZONE].append(patient)
+    zones = {zone: pytz.timezone(zone) for zone in by_zone}
+
+    sent = []
+    for minute in range(minutes):
+        now = first + timedelta(minutes=minute)
+        history.now = now.astimezone(pytz.utc).replace(tzinfo=None)
+        for zone, tz in zones.items():
+            local = now.astimezone(tz)
+            time_str = local.strftime("%H:%M")
+            if time_str not in times:
+                continue
+            for patient in by_zone[zone]:
+                telegram_id = patient["telegram_id"]
+                if time_str == BASELINE_DAILY[0] and not history.filled_on(
+                    telegram_id, local.date(), tz
+                ):
+                    sent.append((now, telegram_id, BASELINE_DAILY[1]))
+                day = (local.date() - patient["testing_start_date"].date()).days + 1
+                for command in by_slot.get((day, time_str), ()):
+                    sent.append((now, telegram_id, command))
+    return sorted(sent)
+
+
+def reminders_digest(sent: list[tuple[datetime, int, str]]) -> str:
+    digest = hashlib.sha256()
+    for sent_at, chat_id, command in sent:
+        digest.update(f"{sent_at.isoformat()} {chat_id} {command}\n".encode())
+    return digest.hexdigest()
+
+
+def _percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+
+async def simulate(
+    patients: list[dict],
+    start_date: datetime,
+    days: int,
+    output: str = None,
+    fill_rate: float = 0.5,
+    seed: int = 0,
+    baseline: bool = True,
+) -> dict:
+    bot = FakeBot()
+    # Лимиты Telegram в симуляции не нужны
+    message_dispatcher.set_rate(1e9)
+    message_dispatcher.chat_interval = 0
+    message_dispatcher.start(bot)
+
+    by_zone = defaultdict(list)
+    for patient in patients:
+        by_zone[patient["timezone"] or config.SCHEDULER_DEFAULT_TIMEZONE].append(
+            patient
+        )
+
+    # С запасом в полдня с обеих сторон, чтобы захватить все часовые пояса
+    first = start_date.replace(tzinfo=pytz.utc) - timedelta(hours=12)
+    minutes = (days + 1) * 24 * 60
+    history = make_history(patients, first, days, fill_rate, seed)
+    # Ежедневная анкета идёт через get_daily_unfilled тика, но по истории в памяти
+    repository.get_daily_unfilled = history.get_daily_unfilled
+    latencies = []
+    due_ticks = 0
+    started = time.perf_counter()
+    try:
+        for minute in range(minutes):
+            now = first + timedelta(minutes=minute)
+            bot.now = now
+            history.now = now.replace(tzinfo=None)
+            tick_started = time.perf_counter()
+            # Как в проде: пациентов грузим только из поясов, где есть правила
+            buckets = due_buckets(by_zone, now, now - timedelta(minutes=1))
+            if buckets:
+                due_ticks += 1
+                await check_and_send_questionnaires(
+                    bot,
+                    test_users=[p for zone in buckets for p in by_zone[zone]],
+                    test_now=now,
+                )
+                await message_dispatcher.drain()
+            latencies.append(time.perf_counter() - tick_started)
+    finally:
+        await message_dispatcher.stop()
+        del repository.get_daily_unfilled
+    elapsed = time.perf_counter() - started
+    bot.sent.sort()
+
+    if output:
+        with open(output, "w", encoding="utf-8") as file:
+            for sent_at, chat_id, command in bot.sent:
+                file.write(
+                    json.dumps(
+                        {
+                            "time": sent_at.isoformat(),
+                            "telegram_id": chat_id,
+                            "command": command,
+                        }
+                    )
+                    + "\n"
+                )
+
+    report = {
+        "patients": len(patients),
+        "timezones": len(by_zone),
+        "days": days,
+        "history_records": len(history),
+        "ticks": minutes,
+        "due_ticks": due_ticks,
+        "reminders": len(bot.sent),
+        "by_command": dict(
+            Counter(command for _, _, command in bot.sent).most_common()
+        ),
+        "elapsed_s": round(elapsed, 2),
+        "tick_ms": {
+            "p50": round(_percentile(latencies, 50) * 1000, 3),
+            "p95": round(_percentile(latencies, 95) * 1000, 3),
+            "p99": round(_percentile(latencies, 99) * 1000, 3),
+            "max": round(max(latencies) * 1000, 3),
+        },
+        # ru_maxrss в Linux — в килобайтах
+        "peak_rss_mb": round(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1
+        ),
+        "digest": reminders_digest(bot.sent),
+    }
+    if baseline:
+        expected = baseline_reminders(patients, history, first, minutes)
+        sent = Counter(bot.sent)
+        expected_counter = Counter(expected)
+        missing = sorted((expected_counter - sent).elements())
+        extra = sorted((sent - expected_counter).elements())
+        report["baseline"] = {
+            "reminders": len(expected),
+            "digest": reminders_digest(expected),
+            "parity": not missing and not extra,
+            "missing": len(missing),
+            "extra": len(extra),
+            # Первые расхождения: (время UTC, telegram_id, команда)
+            "examples": [
+                [kind, sent_at.isoformat(), chat_id, command]
+                for kind, items in (("missing", missing), ("extra", extra))
+                for sent_at, chat_id, command in items[:5]
+            ],
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Симуляция планировщика напоминаний")
+    parser.add_argument("--patients", type=int, default=1000)
+    parser.add_argument("--days", type=int, default=PROGRAM_DAYS)
+    parser.add_argument(
+        "--start", default="2026-01-05", help="дата старта программы, yyyy-mm-dd"
+    )
+    parser.add_argument("--stagger-days", type=int, default=0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--fill-rate",
+        type=float,
+        default=0.5,
+        help="записей истории в сутки на пациента (проверка ежедневной анкеты)",
+    )
+    parser.add_argument(
+        "--no-baseline",
+        action="store_true",
+        help="не сверять с прежним движком (для замеров на больших N)",
+    )
+    parser.add_argument("--output", help="JSONL со всеми отправленными напоминаниями")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO if args.verbose else logging.WARNING,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+    start_date = datetime.strptime(args.start, "%Y-%m-%d")
+    patients = make_patients(args.patients, start_date, args.stagger_days, args.seed)
+    report = asyncio.run(
+        simulate(
+            patients,
+            start_date,
+            args.days,
+            args.output,
+            fill_rate=args.fill_rate,
+            seed=args.seed,
+            baseline=not args.no_baseline,
+        )
+    )
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
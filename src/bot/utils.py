@@ -1,24 +1,116 @@
+import asyncio
+import html
 import logging
-from aiogram.types import ReplyKeyboardRemove
+import time
 
-from src.llm.service import dispatch_to_llm
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+from aiogram.types import Message, ReplyKeyboardRemove
+
+from src import config
+from src.llm.service import markdown_to_html, stream_to_llm
+
+# Лимит Telegram — 4096 символов; HTML после markdown_to_html длиннее исходника
+MESSAGE_PART_LIMIT = 3500
+
+
+def split_text(text: str, limit: int = MESSAGE_PART_LIMIT) -> list[str]:
+    """Делит текст на части не длиннее limit, по возможности по строкам"""
+    parts, current = [], ""
+    for line in text.split("\n"):
+        while len(line) > limit:
+            if current:
+                parts.append(current)
+                current = ""
+            parts.append(line[:limit])
+            line = line[limit:]
+        if current and len(current) + len(line) + 1 > limit:
+            parts.append(current)
+            current = line
+        else:
+            current = f"{current}\n{line}" if current else line
+    if current:
+        parts.append(current)
+    return parts or [""]
+
+
+class StreamedReply:
+    """
+    Ответ, который дописывается в одном сообщении по мере генерации.
+    Первое сообщение уходит с первым токеном, дальше правки не чаще
+    LLM_STREAM_EDIT_INTERVAL; TelegramRetryAfter откладывает следующую правку.
+    """
+
+    def __init__(self, source: Message):
+        self._source = source
+        self._reply: Message | None = None
+        self._next_edit = 0.0
+
+    async def update(self, text: str):
+        if time.monotonic() < self._next_edit:
+            return
+        # Промежуточный текст — без разметки: markdown может быть не закрыт
+        preview = text[:MESSAGE_PART_LIMIT]
+        if len(preview) < len(text):
+            preview += " …"
+        await self._show(html.escape(preview))
+
+    async def finish(self, text: str):
+        """Финальный текст через markdown_to_html; длинный — несколькими сообщениями"""
+        parts = [markdown_to_html(part) for part in split_text(text)]
+        for _ in range(3):
+            if await self._show(parts[0]):
+                break
+            await asyncio.sleep(max(0.0, self._next_edit - time.monotonic()))
+        for part in parts[1:]:
+            await self._source.answer(part)
+
+    async def _show(self, text: str) -> bool:
+        try:
+            if self._reply is None:
+                self._reply = await self._source.answer(
+                    text, reply_markup=ReplyKeyboardRemove()
+                )
+            else:
+                await self._reply.edit_text(text)
+        except TelegramRetryAfter as e:
+            self._next_edit = time.monotonic() + e.retry_after
+            return False
+        except TelegramBadRequest as e:
+            if "message is not modified" not in str(e):
+                raise
+        self._next_edit = time.monotonic() + config.LLM_STREAM_EDIT_INTERVAL
+        return True
 
 
 async def send_llm_advice(message: str, data: dict, media_urls: list[str] = None):
-    return
+    if not config.LLM_ADVICE_ENABLED:
+        return
     if not media_urls:
         media_urls = []
+    reply = StreamedReply(message)
+    started = time.monotonic()
+    first_token = None
+    text = ""
     try:
-        llm_resp = await dispatch_to_llm(
+        async for text in stream_to_llm(
             username=message.from_user.username,
             telegram_id=message.from_user.id,
             current_record=data,
             media_urls=media_urls,
-        )
+        ):
+            if first_token is None:
+                first_token = time.monotonic() - started
+            await reply.update(text)
 
-        await message.answer(
-            llm_resp,
-            reply_markup=ReplyKeyboardRemove(),
+        await reply.finish(text.strip() or "Не удалось получить ответ от AI.")
+        logging.info(
+            f"LLM advice for {message.from_user.id}: first token "
+            f"{first_token or 0:.2f}s, total {time.monotonic() - started:.2f}s"
         )
     except Exception as e:
         logging.error(f"LLM error: {e}")
+        if text:
+            try:
+                await reply.finish(f"{text}\n\n[❌ Ответ прерван]")
+            except Exception:
+                pass
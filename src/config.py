@@ -16,6 +16,108 @@ S3_URL = os.getenv("S3_URL")
 S3_BUCKET = os.getenv("S3_BUCKET")
 
 POSTGRES_DSN = os.getenv("POSTGRES_DSN")
+POSTGRES_POOL_MIN_SIZE = int(os.getenv("POSTGRES_POOL_MIN_SIZE", "2"))
+POSTGRES_POOL_MAX_SIZE = int(os.getenv("POSTGRES_POOL_MAX_SIZE", "20"))
+POSTGRES_POOL_MAX_IDLE = float(os.getenv("POSTGRES_POOL_MAX_IDLE", "300"))
+POSTGRES_CONNECT_TIMEOUT = float(os.getenv("POSTGRES_CONNECT_TIMEOUT", "10"))
+POSTGRES_ACQUIRE_TIMEOUT = float(os.getenv("POSTGRES_ACQUIRE_TIMEOUT", "10"))
+POSTGRES_COMMAND_TIMEOUT = float(os.getenv("POSTGRES_COMMAND_TIMEOUT", "30"))
+POSTGRES_STATEMENT_CACHE_SIZE = int(os.getenv("POSTGRES_STATEMENT_CACHE_SIZE", "100"))
+
+# Реплика для read-only запросов (пусто — всё читается с primary)
+POSTGRES_REPLICA_DSN = os.getenv("POSTGRES_REPLICA_DSN")
+POSTGRES_REPLICA_MAX_LAG = float(os.getenv("POSTGRES_REPLICA_MAX_LAG", "5"))
+POSTGRES_REPLICA_CHECK_INTERVAL = float(
+    os.getenv("POSTGRES_REPLICA_CHECK_INTERVAL", "10")
+)
+
+PATIENT_ID_CACHE_SIZE = int(os.getenv("PATIENT_ID_CACHE_SIZE", "50000"))
+PATIENT_ID_CACHE_TTL = float(os.getenv("PATIENT_ID_CACHE_TTL", "3600"))
+
+# Кэш app_settings: сбрасывается по NOTIFY, TTL — страховка без слушателя
+SETTINGS_CACHE_TTL = float(os.getenv("SETTINGS_CACHE_TTL", "300"))
+SETTINGS_NOTIFY_CHANNEL = os.getenv("SETTINGS_NOTIFY_CHANNEL", "app_settings")
+SETTINGS_LISTEN_HEARTBEAT = float(os.getenv("SETTINGS_LISTEN_HEARTBEAT", "30"))
+
+# Пачечная запись анкет и ответов LLM (write-behind)
+WRITE_BUFFER_ENABLED = os.getenv("WRITE_BUFFER_ENABLED", "false").lower() == "true"
+WRITE_BUFFER_MAX_BATCH = int(os.getenv("WRITE_BUFFER_MAX_BATCH", "500"))
+WRITE_BUFFER_MAX_DELAY = float(os.getenv("WRITE_BUFFER_MAX_DELAY", "0.2"))
+
+SCHEDULER_BATCH_SIZE = int(os.getenv("SCHEDULER_BATCH_SIZE", "1000"))
+# Часовой пояс пациентов, у которых он не указан
+SCHEDULER_DEFAULT_TIMEZONE = os.getenv("SCHEDULER_DEFAULT_TIMEZONE", "Europe/Moscow")
+# Кэш набора часовых поясов активных пациентов для тика; новый пояс
+# сбрасывает его сразу через NOTIFY, TTL — страховка без слушателя
+SCHEDULER_TIMEZONES_TTL = float(os.getenv("SCHEDULER_TIMEZONES_TTL", "300"))
+# Периодические задачи выполняет только экземпляр, держащий advisory lock
+SCHEDULER_LEADER_ELECTION = (
+    os.getenv("SCHEDULER_LEADER_ELECTION", "true").lower() == "true"
+)
+SCHEDULER_LOCK_KEY = int(os.getenv("SCHEDULER_LOCK_KEY", "720431"))
+SCHEDULER_LEADER_HEARTBEAT = float(os.getenv("SCHEDULER_LEADER_HEARTBEAT", "5"))
+# Число процессов-шардов минутного тика (telegram_id % N); при N > 1 тик
+# выполняют процессы python -m src.bot.scheduler_worker, а не процесс бота
+SCHEDULER_SHARDS = int(os.getenv("SCHEDULER_SHARDS", "1"))
+# Сколько пачек пациентов тик обрабатывает параллельно и таймаут на пачку
+SCHEDULER_CONCURRENCY = int(os.getenv("SCHEDULER_CONCURRENCY", "4"))
+SCHEDULER_ITEM_TIMEOUT = float(os.getenv("SCHEDULER_ITEM_TIMEOUT", "50"))
+# Сколько пациентов дайджесты обрабатывают параллельно (ограничивает запросы к LLM)
+DIGEST_CONCURRENCY = int(os.getenv("DIGEST_CONCURRENCY", "10"))
+DIGEST_ITEM_TIMEOUT = float(os.getenv("DIGEST_ITEM_TIMEOUT", "300"))
+# Кэш ответов LLM на одинаковые запросы (память + llm_responses)
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "1000"))
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "86400"))
+# Очередь запросов к LLM: лимиты OpenAI (уточняются по заголовкам ответа),
+# доля квоты, которую занимаем, число одновременных запросов и повторы
+LLM_RPM = float(os.getenv("LLM_RPM", "500"))
+LLM_TPM = float(os.getenv("LLM_TPM", "30000"))
+LLM_RATE_HEADROOM = float(os.getenv("LLM_RATE_HEADROOM", "0.9"))
+LLM_WORKERS = int(os.getenv("LLM_WORKERS", "8"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "6"))
+LLM_REQUEST_TIMEOUT = float(os.getenv("LLM_REQUEST_TIMEOUT", "120"))
+# Оценка токенов на одну картинку в запросе (для лимита TPM)
+LLM_IMAGE_TOKENS = int(os.getenv("LLM_IMAGE_TOKENS", "1000"))
+# Совет LLM после анкеты (выключен) и частота правок потокового ответа, с
+LLM_ADVICE_ENABLED = os.getenv("LLM_ADVICE_ENABLED", "false").lower() == "true"
+LLM_STREAM_EDIT_INTERVAL = float(os.getenv("LLM_STREAM_EDIT_INTERVAL", "1.5"))
+# Подготовка картинок для LLM: длинная сторона (по типу задания — см.
+# src/media/image_prep.py), формат jpeg | webp, качество и кэш готовых вариантов
+IMAGE_MAX_EDGE = int(os.getenv("IMAGE_MAX_EDGE", "1024"))
+IMAGE_MAX_EDGE_BY_TASK = json.loads(
+    os.getenv(
+        "IMAGE_MAX_EDGE_BY_TASK",
+        '{"eye": 1536, "contact_sheet": 2048, "checkup": 2048}',
+    )
+)
+IMAGE_FORMAT = os.getenv("IMAGE_FORMAT", "jpeg")
+IMAGE_QUALITY = int(os.getenv("IMAGE_QUALITY", "85"))
+IMAGE_CACHE_MAX_BYTES = int(os.getenv("IMAGE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# Ночной дайджест пакетом через Batch API (backend: openai | local — заглушка)
+DIGEST_BATCH_ENABLED = os.getenv("DIGEST_BATCH_ENABLED", "false").lower() == "true"
+LLM_BATCH_BACKEND = os.getenv("LLM_BATCH_BACKEND", "openai")
+LLM_BATCH_DIR = os.getenv("LLM_BATCH_DIR", "data/llm_batches")
+LLM_BATCH_POLL_INTERVAL = float(os.getenv("LLM_BATCH_POLL_INTERVAL", "60"))
+# Сколько минут назад планировщик досылает пропущенные напоминания после рестарта
+REMINDER_CATCHUP_MINUTES = int(os.getenv("REMINDER_CATCHUP_MINUTES", "60"))
+
+# Очередь исходящих сообщений (лимит Telegram ~30 сообщений/с на бота)
+TELEGRAM_RATE_LIMIT = float(os.getenv("TELEGRAM_RATE_LIMIT", "25"))
+# При SCHEDULER_SHARDS > 1 лимит делится: эта доля — процессу бота (ответы
+# пользователям, дайджесты), остаток поровну между процессами тика
+TELEGRAM_BOT_RATE_SHARE = float(os.getenv("TELEGRAM_BOT_RATE_SHARE", "0.4"))
+TELEGRAM_CHAT_INTERVAL = float(os.getenv("TELEGRAM_CHAT_INTERVAL", "1"))
+TELEGRAM_SEND_WORKERS = int(os.getenv("TELEGRAM_SEND_WORKERS", "8"))
+TELEGRAM_SEND_MAX_RETRIES = int(os.getenv("TELEGRAM_SEND_MAX_RETRIES", "3"))
+TELEGRAM_SEND_DRAIN_TIMEOUT = float(os.getenv("TELEGRAM_SEND_DRAIN_TIMEOUT", "10"))
+
+# Помесячные партиции patient_history / llm_responses (0 — хранить всё)
+PARTITION_MONTHS_AHEAD = int(os.getenv("PARTITION_MONTHS_AHEAD", "3"))
+PARTITION_RETENTION_MONTHS = int(os.getenv("PARTITION_RETENTION_MONTHS", "0"))
+PARTITION_DROP_DETACHED = (
+    os.getenv("PARTITION_DROP_DETACHED", "false").lower() == "true"
+)
 
 QUESTION_TEXT_MAP = json.loads(Path("question_map.json").read_text(encoding="utf-8"))
 
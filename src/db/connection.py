@@ -1,6 +1,172 @@
+import asyncio
+from contextlib import asynccontextmanager
+import logging
+import time
+from typing import Awaitable, Callable
+
 import asyncpg
 from src import config
 
+logger = logging.getLogger(__name__)
+
+
+class PreparedConnection(asyncpg.Connection):
+    """
+    Соединение пула с именованными запросами (queries заполняет хук init).
+    Запросы выполняются через кэш подготовленных выражений самого asyncpg
+    (statement_cache_size): он готовит запрос один раз на соединение,
+    переживает возврат соединения в пул и сам переготавливает выражение
+    после смены схемы. Соединение поднимается, даже если таблицы одного из
+    запросов ещё нет (миграция не применена), — ошибка будет только у него.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.queries: dict[str, str] = {}
+
+    async def fetch_prepared(self, name: str, *args) -> list[asyncpg.Record]:
+        return await self.fetch(self.queries[name], *args)
+
+    async def fetchrow_prepared(self, name: str, *args) -> asyncpg.Record | None:
+        return await self.fetchrow(self.queries[name], *args)
+
+    async def fetchval_prepared(self, name: str, *args):
+        return await self.fetchval(self.queries[name], *args)
+
+
+# Хук нового соединения: (соединение, только чтение) -> None
+_connection_init: Callable[[asyncpg.Connection, bool], Awaitable[None]] | None = None
+
+
+def set_connection_init(hook: Callable[[asyncpg.Connection, bool], Awaitable[None]]):
+    """Регистрирует хук, который вызывается для каждого нового соединения пула"""
+    global _connection_init
+    _connection_init = hook
+
+
+_pool: asyncpg.Pool | None = None
+_replica_pool: asyncpg.Pool | None = None
+
+# Результат последней проверки реплики: (можно ли читать, время проверки)
+_replica_state: tuple[bool, float] = (False, 0.0)
+_replica_check_lock = asyncio.Lock()
+
+
+async def _create_pool(dsn: str, readonly: bool = False) -> asyncpg.Pool:
+    async def init(conn: PreparedConnection):
+        if _connection_init is not None:
+            await _connection_init(conn, readonly)
+
+    return await asyncpg.create_pool(
+        dsn=dsn,
+        init=init,
+        connection_class=PreparedConnection,
+        min_size=config.POSTGRES_POOL_MIN_SIZE,
+        max_size=config.POSTGRES_POOL_MAX_SIZE,
+        timeout=config.POSTGRES_CONNECT_TIMEOUT,
+        command_timeout=config.POSTGRES_COMMAND_TIMEOUT,
+        statement_cache_size=config.POSTGRES_STATEMENT_CACHE_SIZE,
+        max_inactive_connection_lifetime=config.POSTGRES_POOL_MAX_IDLE,
+    )
+
+
+async def init_db_pool() -> asyncpg.Pool:
+    """Создаёт общий пул соединений приложения (вызывается при старте)"""
+    global _pool, _replica_pool
+    if _pool is None:
+        _pool = await _create_pool(config.POSTGRES_DSN)
+    if _replica_pool is None and config.POSTGRES_REPLICA_DSN:
+        try:
+            _replica_pool = await _create_pool(
+                config.POSTGRES_REPLICA_DSN, readonly=True
+            )
+        except Exception as e:
+            logger.error(f"Реплика недоступна, чтение идёт с primary: {e}")
+    return _pool
+
+
+async def close_db_pool():
+    """Закрывает пулы соединений (вызывается при остановке)"""
+    global _pool, _replica_pool, _replica_state
+    if _replica_pool is not None:
+        await _replica_pool.close()
+        _replica_pool = None
+        _replica_state = (False, 0.0)
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+
+
+def get_pool() -> asyncpg.Pool:
+    if _pool is None:
+        raise RuntimeError("Пул соединений не инициализирован: вызовите init_db_pool()")
+    return _pool
+
+
+def acquire():
+    """Берёт соединение из пула: `async with acquire() as conn: ...`"""
+    return get_pool().acquire(timeout=config.POSTGRES_ACQUIRE_TIMEOUT)
+
+
+async def _replica_is_fresh() -> bool:
+    """
+    Проверяет отставание реплики не чаще раза в POSTGRES_REPLICA_CHECK_INTERVAL.
+    Не в режиме recovery (тот же инстанс под вторым пулом) — отставание 0.
+    Если WAL receiver в состоянии streaming и реплика применила весь
+    полученный WAL — тоже 0: на простаивающем primary время последней
+    транзакции устаревает, хотя реплика догнала его. Без живого потока
+    (receiver остановлен — оба LSN замирают) отставание считается по времени
+    последней применённой транзакции. Статус receiver виден роли
+    с pg_read_all_stats; без неё он NULL, и тоже считается по времени.
+    """
+    global _replica_state
+    healthy, checked_at = _replica_state
+    if time.monotonic() - checked_at < config.POSTGRES_REPLICA_CHECK_INTERVAL:
+        return healthy
+
+    async with _replica_check_lock:
+        healthy, checked_at = _replica_state
+        if time.monotonic() - checked_at < config.POSTGRES_REPLICA_CHECK_INTERVAL:
+            return healthy
+        try:
+            async with _replica_pool.acquire(
+                timeout=config.POSTGRES_ACQUIRE_TIMEOUT
+            ) as conn:
+                lag = await conn.fetchval(
+                    """
+                    SELECT CASE
+                        WHEN NOT pg_is_in_recovery() THEN 0
+                        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn()
+                            AND EXISTS (
+                                SELECT 1 FROM pg_stat_wal_receiver
+                                WHERE status = 'streaming'
+                            )
+                        THEN 0
+                        ELSE COALESCE(
+                            EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()),
+                            'Infinity'
+                        )
+                    END
+                    """
+                )
+            healthy = float(lag) <= config.POSTGRES_REPLICA_MAX_LAG
+            if not healthy:
+                logger.warning(f"Реплика отстаёт на {lag} с, чтение идёт с primary")
+        except Exception as e:
+            logger.error(f"Ошибка проверки реплики, чтение идёт с primary: {e}")
+            healthy = False
+        _replica_state = (healthy, time.monotonic())
+        return healthy
+
 
-async def get_db_connection():
-    return await asyncpg.connect(dsn=config.POSTGRES_DSN)
+@asynccontextmanager
+async def acquire_read():
+    """
+    Соединение для read-only запросов: с реплики, если она настроена и
+    отстаёт не больше POSTGRES_REPLICA_MAX_LAG секунд, иначе с primary.
+    """
+    pool = get_pool()
+    if _replica_pool is not None and await _replica_is_fresh():
+        pool = _replica_pool
+    async with pool.acquire(timeout=config.POSTGRES_ACQUIRE_TIMEOUT) as conn:
+        yield conn
@@ -0,0 +1,104 @@
+import asyncio
+import logging
+from typing import Callable
+
+import asyncpg
+
+from src import config
+
+logger = logging.getLogger(__name__)
+
+
+class LeaderElection:
+    """
+    Выбор ведущего экземпляра через session-level advisory lock Postgres.
+    Замок держит отдельное соединение вне пула: пока сессия жива, экземпляр
+    ведущий. Heartbeat проверяет соединение; при его потере Postgres сам
+    отпускает замок, и его забирает следующий экземпляр (failover).
+    on_change(True/False) вызывается при получении и потере лидерства.
+    """
+
+    def __init__(
+        self,
+        key: int,
+        heartbeat_interval: float,
+        on_change: Callable[[bool], None],
+    ):
+        self.key = key
+        self.heartbeat_interval = heartbeat_interval
+        self._on_change = on_change
+        self._is_leader = False
+        self._conn: asyncpg.Connection | None = None
+        self._task: asyncio.Task | None = None
+
+    @property
+    def is_leader(self) -> bool:
+        return self._is_leader
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="leader-election")
+
+    async def stop(self):
+        """Останавливает heartbeat и отпускает замок (вызывается при остановке)"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._conn is not None and not self._conn.is_closed() and self._is_leader:
+            try:
+                await self._conn.fetchval("SELECT pg_advisory_unlock($1)", self.key)
+            except Exception as e:
+                logger.error(f"Ошибка снятия advisory lock: {e}")
+        self._set_leader(False)
+        await self._close()
+
+    def _set_leader(self, is_leader: bool):
+        if is_leader == self._is_leader:
+            return
+        self._is_leader = is_leader
+        logger.info(
+            "Экземпляр стал ведущим: периодические задачи запущены"
+            if is_leader
+            else "Экземпляр больше не ведущий: периодические задачи остановлены"
+        )
+        try:
+            self._on_change(is_leader)
+        except Exception as e:
+            logger.error(f"Ошибка переключения лидерства: {e}")
+
+    async def _close(self):
+        if self._conn is not None:
+            try:
+                await self._conn.close(timeout=self.heartbeat_interval)
+            except Exception:
+                self._conn.terminate()
+            self._conn = None
+
+    async def _run(self):
+        while True:
+            try:
+                if self._conn is None or self._conn.is_closed():
+                    self._conn = await asyncpg.connect(
+                        dsn=config.POSTGRES_DSN,
+                        timeout=config.POSTGRES_CONNECT_TIMEOUT,
+                    )
+                if self._is_leader:
+                    await self._conn.fetchval(
+                        "SELECT 1", timeout=self.heartbeat_interval
+                    )
+                elif await self._conn.fetchval(
+                    "SELECT pg_try_advisory_lock($1)",
+                    self.key,
+                    timeout=self.heartbeat_interval,
+                ):
+                    self._set_leader(True)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Сессия потеряна — замок уже не наш, даже если Postgres его ещё
+                # не отпустил; переподключаемся и пробуем заново
+                logger.error(f"Ошибка heartbeat лидерства: {e}")
+                self._set_leader(False)
+                await self._close()
+            await asyncio.sleep(self.heartbeat_interval)
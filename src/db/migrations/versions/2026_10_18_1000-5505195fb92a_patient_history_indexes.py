@@ -0,0 +1,39 @@
+"""patient_history indexes
+
+Revision ID: 5505195fb92a
+Revises: 1a687dfa6884
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "5505195fb92a"
+down_revision: Union[str, None] = "1a687dfa6884"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # История пациента по времени: проверка "заполнено сегодня", выборки за период
+    op.create_index(
+        "ix_patient_history_patient_id_created_at",
+        "patient_history",
+        ["patient_id", "created_at"],
+    )
+    # Фильтр по типу анкеты внутри JSON
+    op.create_index(
+        "ix_patient_history_questionnaire_type",
+        "patient_history",
+        [sa.text("(answers->>'questionnaire_type')")],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_patient_history_questionnaire_type", "patient_history")
+    op.drop_index("ix_patient_history_patient_id_created_at", "patient_history")
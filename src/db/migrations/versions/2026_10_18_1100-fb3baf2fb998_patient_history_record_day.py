@@ -0,0 +1,56 @@
+"""patient_history record_day
+
+Revision ID: fb3baf2fb998
+Revises: 5505195fb92a
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "fb3baf2fb998"
+down_revision: Union[str, None] = "5505195fb92a"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("patient_history", sa.Column("record_day", sa.Date(), nullable=True))
+
+    # created_at хранится в UTC, record_day — локальный день пациента
+    op.execute("""
+        UPDATE patient_history ph
+        SET record_day = (
+            ph.created_at AT TIME ZONE 'UTC' AT TIME ZONE COALESCE(p.timezone, 'UTC')
+        )::date
+        FROM patients p
+        WHERE p.id = ph.patient_id
+        AND ph.answers->>'questionnaire_type' IS NOT NULL
+    """)
+
+    # Оставляем только последнюю запись на (пациент, тип анкеты, день)
+    op.execute("""
+        DELETE FROM patient_history ph
+        USING patient_history newer
+        WHERE newer.patient_id = ph.patient_id
+        AND newer.answers->>'questionnaire_type' = ph.answers->>'questionnaire_type'
+        AND newer.record_day = ph.record_day
+        AND (newer.created_at, newer.id) > (ph.created_at, ph.id)
+    """)
+
+    op.create_index(
+        "ux_patient_history_record_day",
+        "patient_history",
+        ["patient_id", sa.text("(answers->>'questionnaire_type')"), "record_day"],
+        unique=True,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ux_patient_history_record_day", "patient_history")
+    op.drop_column("patient_history", "record_day")
@@ -0,0 +1,224 @@
+"""partition patient_history and llm_responses by month
+
+Revision ID: 034bfddd1d63
+Revises: fb3baf2fb998
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+
+from datetime import date
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "034bfddd1d63"
+down_revision: Union[str, None] = "fb3baf2fb998"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Сколько месяцев вперёд создаём партиции сразу (дальше их ведёт maintain_partitions)
+MONTHS_AHEAD = 3
+
+
+def month_range(first: date, last: date):
+    current = first.replace(day=1)
+    while current <= last:
+        following = date(current.year + current.month // 12, current.month % 12 + 1, 1)
+        yield current, following
+        current = following
+
+
+def create_partitions(table: str, first: date | None):
+    today = date.today()
+    last = date(
+        today.year + (today.month + MONTHS_AHEAD - 1) // 12,
+        (today.month + MONTHS_AHEAD - 1) % 12 + 1,
+        1,
+    )
+    for start, end in month_range(min(first or today, today), last):
+        op.execute(
+            f"CREATE TABLE IF NOT EXISTS {table}_y{start:%Y}m{start:%m} "
+            f"PARTITION OF {table} FOR VALUES FROM ('{start}') TO ('{end}')"
+        )
+    # Строки за месяц без партиции (обслуживание не запускалось) попадают сюда,
+    # а не падают с ошибкой; ensure_partitions потом переносит их в свой месяц
+    op.execute(
+        f"CREATE TABLE IF NOT EXISTS {table}_default PARTITION OF {table} DEFAULT"
+    )
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+
+    # ---------- patient_history: по record_day (локальный день пациента) ----------
+    op.execute("ALTER TABLE patient_history RENAME TO patient_history_old")
+    op.execute(
+        "ALTER TABLE patient_history_old "
+        "RENAME CONSTRAINT patient_history_pkey TO patient_history_old_pkey"
+    )
+    op.drop_index("ux_patient_history_record_day", "patient_history_old")
+    op.drop_index("ix_patient_history_questionnaire_type", "patient_history_old")
+    op.drop_index("ix_patient_history_patient_id_created_at", "patient_history_old")
+
+    op.execute("""
+        UPDATE patient_history_old ph
+        SET record_day = (
+            ph.created_at AT TIME ZONE 'UTC' AT TIME ZONE COALESCE(p.timezone, 'UTC')
+        )::date
+        FROM patients p
+        WHERE p.id = ph.patient_id AND ph.record_day IS NULL
+    """)
+    op.execute("""
+        UPDATE patient_history_old
+        SET record_day = COALESCE(created_at, now())::date
+        WHERE record_day IS NULL
+    """)
+
+    op.execute("""
+        CREATE TABLE patient_history (
+            id UUID NOT NULL DEFAULT gen_random_uuid(),
+            patient_id UUID REFERENCES patients(id),
+            answers JSON NOT NULL,
+            created_at TIMESTAMP DEFAULT now(),
+            gpt_response VARCHAR,
+            s3_files VARCHAR[],
+            summary VARCHAR,
+            record_day DATE NOT NULL,
+            PRIMARY KEY (id, record_day)
+        ) PARTITION BY RANGE (record_day)
+    """)
+    first = bind.execute(
+        sa.text("SELECT MIN(record_day) FROM patient_history_old")
+    ).scalar()
+    create_partitions("patient_history", first)
+    op.execute("""
+        INSERT INTO patient_history (
+            id, patient_id, answers, created_at, gpt_response, s3_files, summary, record_day
+        )
+        SELECT id, patient_id, answers, created_at, gpt_response, s3_files, summary, record_day
+        FROM patient_history_old
+    """)
+    op.drop_table("patient_history_old")
+
+    op.create_index(
+        "ix_patient_history_patient_id_created_at",
+        "patient_history",
+        ["patient_id", "created_at"],
+    )
+    op.create_index(
+        "ix_patient_history_questionnaire_type",
+        "patient_history",
+        [sa.text("(answers->>'questionnaire_type')")],
+    )
+    op.create_index(
+        "ux_patient_history_record_day",
+        "patient_history",
+        ["patient_id", sa.text("(answers->>'questionnaire_type')"), "record_day"],
+        unique=True,
+    )
+
+    # ---------- llm_responses: по created_at ----------
+    op.execute("ALTER TABLE llm_responses RENAME TO llm_responses_old")
+    op.execute(
+        "ALTER TABLE llm_responses_old "
+        "RENAME CONSTRAINT llm_responses_pkey TO llm_responses_old_pkey"
+    )
+    op.execute(
+        "UPDATE llm_responses_old SET created_at = now() WHERE created_at IS NULL"
+    )
+    op.execute("""
+        CREATE TABLE llm_responses (
+            id UUID NOT NULL DEFAULT gen_random_uuid(),
+            patient_id UUID REFERENCES patients(id),
+            prompt TEXT NOT NULL,
+            gpt_response TEXT NOT NULL,
+            created_at TIMESTAMP NOT NULL DEFAULT now(),
+            PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+    """)
+    first = bind.execute(
+        sa.text("SELECT MIN(created_at) FROM llm_responses_old")
+    ).scalar()
+    create_partitions("llm_responses", first.date() if first else None)
+    op.execute("""
+        INSERT INTO llm_responses (id, patient_id, prompt, gpt_response, created_at)
+        SELECT id, patient_id, prompt, gpt_response, created_at FROM llm_responses_old
+    """)
+    op.drop_table("llm_responses_old")
+    op.create_index(
+        "ix_llm_responses_patient_id_created_at",
+        "llm_responses",
+        ["patient_id", "created_at"],
+    )
+
+
+def downgrade() -> None:
+    op.execute("ALTER TABLE llm_responses RENAME TO llm_responses_part")
+    op.execute(
+        "ALTER TABLE llm_responses_part "
+        "RENAME CONSTRAINT llm_responses_pkey TO llm_responses_part_pkey"
+    )
+    op.drop_index("ix_llm_responses_patient_id_created_at", "llm_responses_part")
+    op.execute("""
+        CREATE TABLE llm_responses (
+            id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+            patient_id UUID REFERENCES patients(id),
+            prompt TEXT NOT NULL,
+            gpt_response TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT now()
+        )
+    """)
+    op.execute("""
+        INSERT INTO llm_responses (id, patient_id, prompt, gpt_response, created_at)
+        SELECT id, patient_id, prompt, gpt_response, created_at FROM llm_responses_part
+    """)
+    op.execute("DROP TABLE llm_responses_part CASCADE")
+
+    op.execute("ALTER TABLE patient_history RENAME TO patient_history_part")
+    op.execute(
+        "ALTER TABLE patient_history_part "
+        "RENAME CONSTRAINT patient_history_pkey TO patient_history_part_pkey"
+    )
+    op.drop_index("ux_patient_history_record_day", "patient_history_part")
+    op.drop_index("ix_patient_history_questionnaire_type", "patient_history_part")
+    op.drop_index("ix_patient_history_patient_id_created_at", "patient_history_part")
+    op.execute("""
+        CREATE TABLE patient_history (
+            id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+            patient_id UUID REFERENCES patients(id),
+            answers JSON NOT NULL,
+            created_at TIMESTAMP DEFAULT now(),
+            gpt_response VARCHAR,
+            s3_files VARCHAR[],
+            summary VARCHAR,
+            record_day DATE
+        )
+    """)
+    op.execute("""
+        INSERT INTO patient_history (
+            id, patient_id, answers, created_at, gpt_response, s3_files, summary, record_day
+        )
+        SELECT id, patient_id, answers, created_at, gpt_response, s3_files, summary, record_day
+        FROM patient_history_part
+    """)
+    op.execute("DROP TABLE patient_history_part CASCADE")
+
+    op.create_index(
+        "ix_patient_history_patient_id_created_at",
+        "patient_history",
+        ["patient_id", "created_at"],
+    )
+    op.create_index(
+        "ix_patient_history_questionnaire_type",
+        "patient_history",
+        [sa.text("(answers->>'questionnaire_type')")],
+    )
+    op.create_index(
+        "ux_patient_history_record_day",
+        "patient_history",
+        ["patient_id", sa.text("(answers->>'questionnaire_type')"), "record_day"],
+        unique=True,
+    )
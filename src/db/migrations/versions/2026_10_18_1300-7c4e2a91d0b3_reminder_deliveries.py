@@ -0,0 +1,36 @@
+"""reminder deliveries ledger
+
+Revision ID: 7c4e2a91d0b3
+Revises: 034bfddd1d63
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "7c4e2a91d0b3"
+down_revision: Union[str, None] = "034bfddd1d63"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Одна строка на напоминание (пациент, правило программы, день программы):
+    # планировщик занимает её INSERT ... ON CONFLICT DO NOTHING перед отправкой
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS reminder_deliveries (
+            patient_id UUID NOT NULL REFERENCES patients(id) ON DELETE CASCADE,
+            rule_key TEXT NOT NULL,
+            program_day INTEGER NOT NULL,
+            claimed_at TIMESTAMP NOT NULL DEFAULT now(),
+            PRIMARY KEY (patient_id, rule_key, program_day)
+        )
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP TABLE IF EXISTS reminder_deliveries")
@@ -0,0 +1,41 @@
+"""app settings
+
+Revision ID: b81d5f3e6a27
+Revises: 7c4e2a91d0b3
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "b81d5f3e6a27"
+down_revision: Union[str, None] = "7c4e2a91d0b3"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS app_settings (
+            key TEXT PRIMARY KEY,
+            value TEXT,
+            updated_at TIMESTAMP NOT NULL DEFAULT now()
+        )
+    """)
+    # Переносим уже выставленную дату начала тестирования
+    op.execute("""
+        INSERT INTO app_settings (key, value)
+        SELECT 'testing_start_date', MIN(testing_start_date)::text
+        FROM patients
+        WHERE testing_start_date IS NOT NULL
+        HAVING MIN(testing_start_date) IS NOT NULL
+        ON CONFLICT (key) DO NOTHING
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP TABLE IF EXISTS app_settings")
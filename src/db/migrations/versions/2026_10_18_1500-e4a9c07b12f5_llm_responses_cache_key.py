@@ -0,0 +1,33 @@
+"""llm_responses cache key
+
+Revision ID: e4a9c07b12f5
+Revises: b81d5f3e6a27
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "e4a9c07b12f5"
+down_revision: Union[str, None] = "b81d5f3e6a27"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Хэш запроса к LLM (модель, системный промпт, промпт, медиа), см. src/llm/cache.py
+    op.execute("ALTER TABLE llm_responses ADD COLUMN IF NOT EXISTS cache_key TEXT")
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS ix_llm_responses_cache_key
+        ON llm_responses (cache_key, created_at)
+        WHERE cache_key IS NOT NULL
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_llm_responses_cache_key")
+    op.execute("ALTER TABLE llm_responses DROP COLUMN IF EXISTS cache_key")
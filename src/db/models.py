@@ -2,6 +2,7 @@ from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy import (
     Column,
     String,
+    Date,
     DateTime,
     Boolean,
     UUID,
@@ -9,6 +10,9 @@ from sqlalchemy import (
     JSON,
     ARRAY,
     BigInteger,
+    Integer,
+    Index,
+    text,
 )
 import uuid
 
@@ -38,3 +42,43 @@ class PatientHistory(Base):
     gpt_response = Column(String)
     s3_files = Column(ARRAY(String))
     summary = Column(String)
+    # Локальный день пациента: ключ перезаписи анкеты и ключ помесячных партиций
+    record_day = Column(Date, primary_key=True, nullable=False)
+
+    __table_args__ = (
+        Index("ix_patient_history_patient_id_created_at", "patient_id", "created_at"),
+        Index(
+            "ix_patient_history_questionnaire_type",
+            text("(answers->>'questionnaire_type')"),
+        ),
+        Index(
+            "ux_patient_history_record_day",
+            "patient_id",
+            text("(answers->>'questionnaire_type')"),
+            "record_day",
+            unique=True,
+        ),
+    )
+
+
+class ReminderDelivery(Base):
+    """Отправленное напоминание программы (см. src/bot/program.py)"""
+
+    __tablename__ = "reminder_deliveries"
+
+    patient_id = Column(
+        UUID, ForeignKey("patients.id", ondelete="CASCADE"), primary_key=True
+    )
+    rule_key = Column(String, primary_key=True)
+    program_day = Column(Integer, primary_key=True)
+    claimed_at = Column(DateTime, server_default="now()", nullable=False)
+
+
+class AppSetting(Base):
+    """Глобальные настройки бота (ключ-значение), см. src/db/settings.py"""
+
+    __tablename__ = "app_settings"
+
+    key = Column(String, primary_key=True)
+    value = Column(String)
+    updated_at = Column(DateTime, server_default="now()", nullable=False)
@@ -0,0 +1,136 @@
+from datetime import date
+import logging
+import re
+
+from src import config
+from src.db.connection import acquire
+
+logger = logging.getLogger(__name__)
+
+# Таблицы с помесячными партициями и их ключ (см. миграцию 034bfddd1d63)
+PARTITION_KEYS = {"patient_history": "record_day", "llm_responses": "created_at"}
+PARTITIONED_TABLES = tuple(PARTITION_KEYS)
+
+
+def add_months(day: date, months: int) -> date:
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table: str, month: date) -> str:
+    return f"{table}_y{month:%Y}m{month:%m}"
+
+
+def default_partition_name(table: str) -> str:
+    return f"{table}_default"
+
+
+async def list_partitions(conn, table: str) -> dict[date, str]:
+    """Возвращает существующие помесячные партиции таблицы: {начало месяца: имя}"""
+    rows = await conn.fetch(
+        """
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = $1::regclass
+        """,
+        table,
+    )
+    pattern = re.compile(rf"^{table}_y(\d{{4}})m(\d{{2}})$")
+    partitions = {}
+    for row in rows:
+        match = pattern.match(row["relname"])
+        if match:
+            partitions[date(int(match[1]), int(match[2]), 1)] = row["relname"]
+    return partitions
+
+
+async def ensure_partitions(table: str, months_ahead: int, today: date = None):
+    """
+    Создаёт партиции с текущего месяца на months_ahead месяцев вперёд, а также
+    за месяцы, строки которых оказались в DEFAULT-партиции: они переносятся
+    в новую партицию в той же транзакции.
+    """
+    month = (today or date.today()).replace(day=1)
+    key = PARTITION_KEYS[table]
+    default = default_partition_name(table)
+    async with acquire() as conn:
+        existing = await list_partitions(conn, table)
+        has_default = await conn.fetchval("SELECT to_regclass($1)", default)
+        months = {add_months(month, offset) for offset in range(months_ahead + 1)}
+        if has_default:
+            rows = await conn.fetch(
+                f"SELECT DISTINCT date_trunc('month', {key})::date AS month "
+                f"FROM {default}"
+            )
+            months.update(row["month"] for row in rows)
+
+        for start in sorted(months - set(existing)):
+            name = partition_name(table, start)
+            bounds = f"FOR VALUES FROM ('{start}') TO ('{add_months(start, 1)}')"
+            if not has_default:
+                await conn.execute(
+                    f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table} {bounds}"
+                )
+                logger.info(f"Создана партиция {name}")
+                continue
+
+            # Пока в DEFAULT есть строки этого месяца, ATTACH не пройдёт
+            async with conn.transaction():
+                await conn.execute(
+                    f"CREATE TABLE {name} "
+                    f"(LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+                )
+                moved = await conn.execute(
+                    f"""
+                    WITH moved AS (
+                        DELETE FROM {default}
+                        WHERE {key} >= '{start}' AND {key} < '{add_months(start, 1)}'
+                        RETURNING *
+                    )
+                    INSERT INTO {name} SELECT * FROM moved
+                    """
+                )
+                await conn.execute(
+                    f"ALTER TABLE {table} ATTACH PARTITION {name} {bounds}"
+                )
+            logger.info(f"Создана партиция {name}, из {default}: {moved.split()[-1]}")
+
+
+async def detach_partitions_before(
+    table: str, before: date, drop: bool = False
+) -> list[str]:
+    """
+    Отсоединяет партиции, целиком лежащие раньше before.
+    Отсоединённая таблица остаётся в базе (для архивации), если не drop=True.
+    """
+    detached = []
+    async with acquire() as conn:
+        existing = await list_partitions(conn, table)
+        for start, name in sorted(existing.items()):
+            if add_months(start, 1) > before:
+                continue
+            await conn.execute(f"ALTER TABLE {table} DETACH PARTITION {name}")
+            if drop:
+                await conn.execute(f"DROP TABLE {name}")
+            detached.append(name)
+            logger.info(f"Партиция {name} {'удалена' if drop else 'отсоединена'}")
+    return detached
+
+
+async def maintain_partitions():
+    """Периодическое обслуживание: партиции вперёд и отсечение по сроку хранения"""
+    today = date.today()
+    for table in PARTITIONED_TABLES:
+        try:
+            await ensure_partitions(table, config.PARTITION_MONTHS_AHEAD, today)
+            if config.PARTITION_RETENTION_MONTHS > 0:
+                await detach_partitions_before(
+                    table,
+                    add_months(
+                        today.replace(day=1), -config.PARTITION_RETENTION_MONTHS
+                    ),
+                    drop=config.PARTITION_DROP_DETACHED,
+                )
+        except Exception as e:
+            logger.error(f"Ошибка обслуживания партиций {table}: {e}")
@@ -0,0 +1,57 @@
+from collections import OrderedDict
+import time
+from typing import NamedTuple
+import uuid
+
+from src import config
+
+
+class CachedPatient(NamedTuple):
+    id: uuid.UUID
+    timezone: str | None
+
+
+class PatientIdCache:
+    """
+    Ограниченный LRU-кэш telegram_id -> (patients.id, часовой пояс) с TTL.
+    id пациента не меняется (create_patient делает upsert по telegram_id),
+    часовой пояс меняется только через set_timezone, которая сбрасывает запись.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._items: OrderedDict[int, tuple[CachedPatient, float]] = OrderedDict()
+
+    def get(self, telegram_id: int) -> CachedPatient | None:
+        item = self._items.get(telegram_id)
+        if item is None or item[1] < time.monotonic():
+            if item is not None:
+                del self._items[telegram_id]
+            self.misses += 1
+            return None
+        self._items.move_to_end(telegram_id)
+        self.hits += 1
+        return item[0]
+
+    def put(self, telegram_id: int, patient_id: uuid.UUID, timezone: str | None):
+        self._items[telegram_id] = (
+            CachedPatient(patient_id, timezone),
+            time.monotonic() + self.ttl,
+        )
+        self._items.move_to_end(telegram_id)
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+    def invalidate(self, telegram_id: int):
+        self._items.pop(telegram_id, None)
+
+    def stats(self) -> dict:
+        return {"size": len(self._items), "hits": self.hits, "misses": self.misses}
+
+
+patient_id_cache = PatientIdCache(
+    maxsize=config.PATIENT_ID_CACHE_SIZE, ttl=config.PATIENT_ID_CACHE_TTL
+)
@@ -1,201 +1,760 @@
-from datetime import datetime
+from datetime import date, datetime, timedelta
 import json
+import time
+from typing import AsyncIterator, NamedTuple
+import uuid
 
 import asyncpg
+import pytz
 
+from src import config
+from src.db.connection import acquire, acquire_read, set_connection_init
+from src.db.patient_cache import CachedPatient, patient_id_cache
+from src.db.settings import ACTIVE_TIMEZONES, TESTING_START_DATE, settings
+from src.db.write_buffer import BatchWriter
 
-async def create_patient(
-    conn,
-    telegram_id: int,
-    username: str = None,
-    full_name: str = None,
-    timezone: str = None,
-):
-    # Если часовой пояс не указан, используем UTC
-    tz = timezone if timezone else "Asia/Dubai"
-
-    await conn.execute(
-        """
-        INSERT INTO patients (telegram_id, username, full_name, timezone)
-        VALUES ($1, $2, $3, $4)
-        ON CONFLICT (telegram_id) DO UPDATE SET
-            username = EXCLUDED.username,
-            full_name = EXCLUDED.full_name,
-            timezone = EXCLUDED.timezone
-        """,
-        telegram_id,
-        username,
-        full_name,
-        tz,
-    )
-
-
-async def get_recent_history(
-    username: str, conn: asyncpg.Connection, limit: int = 3
-) -> list[str]:
-    rows = await conn.fetch(
-        """
-        SELECT created_at, answers, gpt_response
-        FROM patient_history
-        WHERE username = $1
-        ORDER BY created_at DESC
-        LIMIT $2
-        """,
-        username,
-        limit,
-    )
-
-    history_blocks = []
-    for row in reversed(rows):
-        text = (
-            f"Дата: {row['created_at'].strftime('%Y-%m-%d')}\n"
-            f"Ответы: {row['answers']}\n"
-            f"Рекомендации GPT: {row['gpt_response']}\n"
+
+class SchedulerPatient(NamedTuple):
+    """Минимальный набор полей пациента для минутного тика планировщика"""
+
+    telegram_id: int
+    timezone: str | None
+    is_active: bool
+    testing_start_date: datetime | None
+
+    @classmethod
+    def from_mapping(cls, data: dict) -> "SchedulerPatient":
+        return cls(
+            telegram_id=data["telegram_id"],
+            timezone=data.get("timezone"),
+            is_active=data.get("is_active", False),
+            testing_start_date=data.get("testing_start_date"),
         )
-        history_blocks.append(text)
 
-    return history_blocks
 
+def record_day_bounds(date_from: datetime, date_to: datetime) -> tuple[date, date]:
+    """
+    Диапазон record_day, заведомо покрывающий записи с created_at (UTC) в
+    [date_from, date_to): локальный день отличается от UTC не больше чем на сутки.
+    Нужен, чтобы запрос затрагивал только партиции patient_history этого периода.
+    """
+    return date_from.date() - timedelta(days=1), date_to.date() + timedelta(days=1)
 
-async def save_patient_record(
-    conn: asyncpg.Connection,
-    telegram_id: int,
-    answers: str,
-    gpt_response: str,
-    s3_links: list[str],
-    summary: str = "",
-    is_daily: bool = False,
-):
+
+def local_today(timezone: str | None) -> date:
+    """Текущий локальный день пациента — record_day новой записи"""
     try:
-        answers_data = json.loads(answers)
-        questionnaire_type = answers_data.get("questionnaire_type")
+        tz = pytz.timezone(timezone or "UTC")
+    except pytz.UnknownTimeZoneError:
+        tz = pytz.utc
+    return datetime.now(tz).date()
 
-        if not questionnaire_type:
-            raise ValueError("questionnaire_type не указан в answers")
 
-        async with conn.transaction():
-            await conn.execute(
-                """
-                DELETE FROM patient_history
-                WHERE patient_id = (SELECT id FROM patients WHERE telegram_id = $1)
-                AND DATE(created_at) = CURRENT_DATE
-                AND answers->>'questionnaire_type' = $2
-                """,
-                telegram_id,
-                questionnaire_type,
+HISTORY_COLUMNS = {
+    "id",
+    "created_at",
+    "answers",
+    "gpt_response",
+    "s3_files",
+    "summary",
+    "record_day",
+}
+
+
+class PatientRepository:
+    """
+    Запросы к patients / patient_history / llm_responses.
+    Горячие запросы выполняются по имени (conn.fetch*_prepared) и готовятся
+    кэшем выражений asyncpg один раз на каждое соединение пула.
+    """
+
+    # Готовятся на всех соединениях, включая пул реплики
+    READ_STATEMENTS = {
+        "patient": "SELECT id, timezone FROM patients WHERE telegram_id = $1",
+        "timezone": "SELECT timezone FROM patients WHERE telegram_id = $1",
+        "all_patients": """
+            SELECT *
+            FROM patients
+
+            WHERE is_active = true
+        """,
+        "scheduler_patients_first": """
+            SELECT telegram_id, timezone, is_active, testing_start_date
+            FROM patients
+            WHERE is_active = true
+            ORDER BY telegram_id
+            LIMIT $1
+        """,
+        "scheduler_patients_next": """
+            SELECT telegram_id, timezone, is_active, testing_start_date
+            FROM patients
+            WHERE is_active = true AND telegram_id > $2
+            ORDER BY telegram_id
+            LIMIT $1
+        """,
+        "active_timezones": """
+            SELECT DISTINCT COALESCE(timezone, $1)
+            FROM patients
+            WHERE is_active = true
+        """,
+        # Пациенты только из указанных часовых поясов ($3 — пояс по умолчанию)
+        # и своего шарда планировщика (telegram_id % $4 = $5)
+        "scheduler_patients_tz_first": """
+            SELECT telegram_id, timezone, is_active, testing_start_date
+            FROM patients
+            WHERE is_active = true AND COALESCE(timezone, $3) = ANY($2::text[])
+            AND telegram_id % $4 = $5
+            ORDER BY telegram_id
+            LIMIT $1
+        """,
+        "scheduler_patients_tz_next": """
+            SELECT telegram_id, timezone, is_active, testing_start_date
+            FROM patients
+            WHERE is_active = true AND COALESCE(timezone, $3) = ANY($2::text[])
+            AND telegram_id % $4 = $5
+            AND telegram_id > $6
+            ORDER BY telegram_id
+            LIMIT $1
+        """,
+        # Anti-join по индексу (patient_id, created_at): кто из переданных
+        # пациентов ещё ничего не заполнил за локальный день
+        "daily_unfilled": """
+            SELECT p.telegram_id
+            FROM patients p
+            WHERE p.telegram_id = ANY($1::bigint[])
+            AND NOT EXISTS (
+                SELECT 1 FROM patient_history ph
+                WHERE ph.patient_id = p.id
+                AND ph.created_at >= $2 AND ph.created_at < $3
+                AND ph.record_day BETWEEN $4::date - 1 AND $4::date + 1
             )
+        """,
+        # Последний ответ LLM на тот же запрос не старше TTL кэша
+        "cached_llm_response": """
+            SELECT gpt_response FROM llm_responses
+            WHERE cache_key = $1
+            AND created_at >= now() - make_interval(secs => $2)
+            ORDER BY created_at DESC
+            LIMIT 1
+        """,
+        "records_all": """
+            SELECT answers, s3_files
+            FROM patient_history
+            WHERE patient_id = $1
+            ORDER BY created_at ASC
+        """,
+        "records_range": """
+            SELECT answers, s3_files
+            FROM patient_history
+            WHERE patient_id = $1
+            AND created_at >= $2 AND created_at < $3
+            AND record_day BETWEEN $4 AND $5
+            ORDER BY created_at ASC
+        """,
+    }
 
-            await conn.execute(
-                """
-                INSERT INTO patient_history (
-                    patient_id, answers, gpt_response, s3_files, summary
-                ) VALUES (
-                    (SELECT id FROM patients WHERE telegram_id = $1),
-                    $2, $3, $4, $5
+    # Готовятся только на соединениях primary
+    WRITE_STATEMENTS = {
+        "create_patient": """
+            INSERT INTO patients (telegram_id, username, full_name, timezone)
+            VALUES ($1, $2, $3, $4)
+            ON CONFLICT (telegram_id) DO UPDATE SET
+                username = EXCLUDED.username,
+                full_name = EXCLUDED.full_name,
+                timezone = EXCLUDED.timezone
+            RETURNING id
+        """,
+        "set_timezone": "UPDATE patients SET timezone = $1 WHERE telegram_id = $2",
+        "set_testing_start_date": "UPDATE patients SET testing_start_date = $1",
+        # Одна запись на (пациент, тип анкеты, локальный день): повторная отправка
+        # перезаписывает её одним INSERT ... ON CONFLICT вместо DELETE + INSERT.
+        # record_day считается по часовому поясу из кэша пациента (local_today)
+        "save_patient_record": """
+            INSERT INTO patient_history (
+                patient_id, answers, gpt_response, s3_files, summary, record_day
+            )
+            VALUES ($1, $2, $3, $4, $5, $6)
+            ON CONFLICT (patient_id, (answers->>'questionnaire_type'), record_day)
+            DO UPDATE SET
+                answers = EXCLUDED.answers,
+                gpt_response = EXCLUDED.gpt_response,
+                s3_files = EXCLUDED.s3_files,
+                summary = EXCLUDED.summary,
+                created_at = now()
+        """,
+        "save_patient_records": """
+            INSERT INTO patient_history (
+                patient_id, answers, gpt_response, s3_files, summary, record_day
+            )
+            SELECT r.patient_id, r.answers, r.gpt_response,
+                ARRAY(SELECT json_array_elements_text(r.s3_files)), r.summary,
+                r.record_day
+            FROM unnest(
+                $1::uuid[], $2::json[], $3::text[], $4::json[], $5::text[], $6::date[]
+            ) AS r(patient_id, answers, gpt_response, s3_files, summary, record_day)
+            ON CONFLICT (patient_id, (answers->>'questionnaire_type'), record_day)
+            DO UPDATE SET
+                answers = EXCLUDED.answers,
+                gpt_response = EXCLUDED.gpt_response,
+                s3_files = EXCLUDED.s3_files,
+                summary = EXCLUDED.summary,
+                created_at = now()
+        """,
+        "save_llm_response": """
+            INSERT INTO patient_history (
+                patient_id, answers, gpt_response, summary, created_at, record_day
+            )
+            VALUES ($1, '{}'::jsonb, $2, $3, now(), $4)
+        """,
+        "save_llm_response_separately": """
+            INSERT INTO llm_responses (patient_id, prompt, gpt_response, cache_key)
+            VALUES ($1, $2, $3, $4)
+        """,
+        # Занимает напоминание; возвращает только тех, кому оно ещё не уходило
+        "claim_reminders": """
+            WITH claimed AS (
+                INSERT INTO reminder_deliveries (patient_id, rule_key, program_day)
+                SELECT id, $2, $3 FROM patients WHERE telegram_id = ANY($1::bigint[])
+                ON CONFLICT DO NOTHING
+                RETURNING patient_id
+            )
+            SELECT p.telegram_id FROM claimed c JOIN patients p ON p.id = c.patient_id
+        """,
+        # Снимает отметку, если напоминание так и не ушло (досылается позже)
+        "release_reminder": """
+            DELETE FROM reminder_deliveries
+            WHERE patient_id = $1 AND rule_key = $2 AND program_day = $3
+        """,
+        # Дни программы считаются от даты старта: после её смены отметки неверны
+        "clear_reminder_deliveries": "DELETE FROM reminder_deliveries",
+    }
+
+    def __init__(self):
+        self.patient_record_writer = BatchWriter(
+            "patient_history",
+            self._flush_patient_records,
+            max_batch=config.WRITE_BUFFER_MAX_BATCH,
+            max_delay=config.WRITE_BUFFER_MAX_DELAY,
+        )
+        self.llm_response_writer = BatchWriter(
+            "llm_responses",
+            self._flush_llm_responses,
+            max_batch=config.WRITE_BUFFER_MAX_BATCH,
+            max_delay=config.WRITE_BUFFER_MAX_DELAY,
+        )
+        # (часовые пояса, истекает) — тик планировщика читает их каждую минуту
+        self._timezones: tuple[list[str], float] | None = None
+        self._timezones_version = 0
+        settings.on_invalidate(ACTIVE_TIMEZONES, self.invalidate_timezones)
+
+    async def prepare(self, conn: asyncpg.Connection, readonly: bool):
+        """
+        Хук init пула: передаёт соединению тексты запросов. Сами запросы
+        готовит кэш выражений asyncpg при первом использовании.
+        """
+        conn.queries = dict(self.READ_STATEMENTS)
+        if not readonly:
+            conn.queries.update(self.WRITE_STATEMENTS)
+
+    def start_write_buffers(self):
+        """Включает пачечную запись, если она разрешена в конфиге"""
+        if config.WRITE_BUFFER_ENABLED:
+            self.patient_record_writer.start()
+            self.llm_response_writer.start()
+
+    async def stop_write_buffers(self):
+        """Дописывает всё накопленное (вызывается при остановке)"""
+        await self.patient_record_writer.stop()
+        await self.llm_response_writer.stop()
+
+    async def _flush_patient_records(self, rows: list[tuple]):
+        """
+        Пачечный upsert анкет. В пределах пачки оставляем последнюю запись на
+        (пациент, тип анкеты, день): ON CONFLICT не может обновить строку дважды.
+        """
+        latest = {(row[0], row[1], row[6]): row for row in rows}
+        patient_ids, answers, gpt_responses, s3_files, summaries, days = zip(
+            *(row[:1] + row[2:] for row in latest.values())
+        )
+        async with acquire() as conn:
+            await conn.fetch_prepared(
+                "save_patient_records",
+                list(patient_ids),
+                list(answers),
+                list(gpt_responses),
+                list(s3_files),
+                list(summaries),
+                list(days),
+            )
+
+    async def _flush_llm_responses(self, rows: list[tuple]):
+        async with acquire() as conn:
+            await conn.copy_records_to_table(
+                "llm_responses",
+                records=rows,
+                columns=["patient_id", "prompt", "gpt_response", "cache_key"],
+            )
+
+    async def resolve_patient(
+        self, telegram_id: int, conn: asyncpg.Connection | None = None
+    ) -> CachedPatient | None:
+        """Возвращает (patients.id, часовой пояс) по telegram_id, сначала из кэша"""
+        patient = patient_id_cache.get(telegram_id)
+        if patient is not None:
+            return patient
+
+        if conn is None:
+            async with acquire() as conn:
+                row = await conn.fetchrow_prepared("patient", telegram_id)
+        else:
+            row = await conn.fetchrow_prepared("patient", telegram_id)
+        if row is None:
+            return None
+        patient_id_cache.put(telegram_id, row["id"], row["timezone"])
+        return CachedPatient(row["id"], row["timezone"])
+
+    async def resolve_patient_id(
+        self, telegram_id: int, conn: asyncpg.Connection | None = None
+    ) -> uuid.UUID | None:
+        """Возвращает patients.id по telegram_id, сначала из кэша"""
+        patient = await self.resolve_patient(telegram_id, conn)
+        return patient.id if patient is not None else None
+
+    async def create_patient(
+        self,
+        telegram_id: int,
+        username: str = None,
+        full_name: str = None,
+        timezone: str = None,
+    ):
+        # Если часовой пояс не указан, используем UTC
+        tz = timezone if timezone else "Asia/Dubai"
+
+        async with acquire() as conn:
+            patient_id = await conn.fetchval_prepared(
+                "create_patient", telegram_id, username, full_name, tz
+            )
+            await self._announce_timezone(conn, tz)
+        patient_id_cache.put(telegram_id, patient_id, tz)
+
+    async def get_user_timezone(self, telegram_id: int) -> str | None:
+        async with acquire_read() as conn:
+            return await conn.fetchval_prepared("timezone", telegram_id)
+
+    async def set_timezone(self, telegram_id: int, timezone: str):
+        async with acquire() as conn:
+            await conn.fetch_prepared("set_timezone", timezone, telegram_id)
+            await self._announce_timezone(conn, timezone)
+        patient_id_cache.invalidate(telegram_id)
+
+    async def get_global_testing_start_date(self) -> datetime | None:
+        """Дата начала тестирования из кэша app_settings (без агрегата по patients)"""
+        value = await settings.get(TESTING_START_DATE)
+        return datetime.fromisoformat(value) if value else None
+
+    async def set_testing_start_date(self, start_date: datetime | None):
+        """
+        Ставит дату начала тестирования всем пользователям (None — сброс).
+        Вместе с ней очищается reminder_deliveries: отметки привязаны к дню
+        программы, и после перезапуска программы напоминания должны уйти снова.
+        """
+        async with acquire() as conn:
+            async with conn.transaction():
+                await conn.fetch_prepared("set_testing_start_date", start_date)
+                await conn.fetch_prepared("clear_reminder_deliveries")
+                await settings.put(
+                    conn,
+                    TESTING_START_DATE,
+                    start_date.isoformat() if start_date else None,
                 )
+        settings.invalidate(TESTING_START_DATE)
+
+    async def get_all_patients(self) -> list[dict]:
+        """
+        Возвращает список всех активных пользователей.
+        """
+        async with acquire_read() as conn:
+            rows = await conn.fetch_prepared("all_patients")
+        return [dict(row) for row in rows]
+
+    async def get_active_timezones(self) -> list[str]:
+        """
+        Различные часовые пояса активных пациентов. Кэшируются на
+        SCHEDULER_TIMEZONES_TTL; новый пояс сбрасывает кэш во всех процессах.
+        """
+        cached = self._timezones
+        if cached is not None and cached[1] >= time.monotonic():
+            return cached[0]
+
+        version = self._timezones_version
+        async with acquire_read() as conn:
+            rows = await conn.fetch_prepared(
+                "active_timezones", config.SCHEDULER_DEFAULT_TIMEZONE
+            )
+        timezones = [row[0] for row in rows]
+        if version == self._timezones_version:
+            expires = time.monotonic() + config.SCHEDULER_TIMEZONES_TTL
+            self._timezones = (timezones, expires)
+        return timezones
+
+    def invalidate_timezones(self):
+        self._timezones_version += 1
+        self._timezones = None
+
+    async def _announce_timezone(self, conn: asyncpg.Connection, timezone: str):
+        """
+        Пояс, которого нет в кэше, должен попасть в тик сразу, а не через TTL:
+        NOTIFY сбрасывает кэш поясов у планировщиков во всех процессах.
+        Исчезнувший пояс не страшен — тик просто не найдёт в нём пациентов.
+        """
+        cached = self._timezones
+        if cached is not None and timezone in cached[0]:
+            return
+        await settings.notify(conn, ACTIVE_TIMEZONES)
+        self.invalidate_timezones()
+
+    async def iter_scheduler_patients(
+        self,
+        batch_size: int = 1000,
+        timezones: list[str] | None = None,
+        shard: tuple[int, int] = (0, 1),
+    ) -> AsyncIterator[list[SchedulerPatient]]:
+        """
+        Отдаёт активных пациентов пачками по keyset-курсору на telegram_id.
+        Соединение берётся на каждую пачку, строки не превращаются в dict.
+        timezones ограничивает выборку пациентами этих часовых поясов,
+        shard = (номер, всего шардов) — пациентами с telegram_id % всего = номер.
+        """
+        if timezones is None:
+            if shard != (0, 1):
+                raise ValueError("Шард задаётся только вместе с timezones")
+            first, following, args = (
+                "scheduler_patients_first",
+                "scheduler_patients_next",
+                (),
+            )
+        else:
+            first, following, args = (
+                "scheduler_patients_tz_first",
+                "scheduler_patients_tz_next",
+                (
+                    list(timezones),
+                    config.SCHEDULER_DEFAULT_TIMEZONE,
+                    shard[1],
+                    shard[0],
+                ),
+            )
+
+        last_id = None
+        while True:
+            async with acquire_read() as conn:
+                if last_id is None:
+                    rows = await conn.fetch_prepared(first, batch_size, *args)
+                else:
+                    rows = await conn.fetch_prepared(
+                        following, batch_size, *args, last_id
+                    )
+            if not rows:
+                return
+            yield [SchedulerPatient._make(row) for row in rows]
+            if len(rows) < batch_size:
+                return
+            last_id = rows[-1]["telegram_id"]
+
+    async def get_daily_unfilled(
+        self,
+        telegram_ids: list[int],
+        day_start: datetime,
+        day_end: datetime,
+        day: date,
+    ) -> list[int]:
+        """
+        telegram_id пациентов без записей с created_at (UTC) в [day_start, day_end).
+        Один запрос на весь часовой пояс вместо проверки каждого пациента.
+        """
+        async with acquire_read() as conn:
+            rows = await conn.fetch_prepared(
+                "daily_unfilled", telegram_ids, day_start, day_end, day
+            )
+        return [row[0] for row in rows]
+
+    async def claim_reminders(
+        self, telegram_ids: list[int], rule_key: str, program_day: int
+    ) -> list[int]:
+        """
+        Записывает напоминание в reminder_deliveries и возвращает telegram_id,
+        для которых запись появилась сейчас. Повторный тик или второй экземпляр
+        планировщика получат пустой список.
+        """
+        async with acquire() as conn:
+            rows = await conn.fetch_prepared(
+                "claim_reminders", telegram_ids, rule_key, program_day
+            )
+        return [row[0] for row in rows]
+
+    async def release_reminder(self, telegram_id: int, rule_key: str, program_day: int):
+        """Удаляет отметку claim_reminders, чтобы напоминание можно было дослать"""
+        async with acquire() as conn:
+            patient_id = await self.resolve_patient_id(telegram_id, conn)
+            if patient_id is None:
+                return
+            await conn.fetch_prepared(
+                "release_reminder", patient_id, rule_key, program_day
+            )
+
+    async def get_recent_history(self, username: str, limit: int = 3) -> list[str]:
+        async with acquire_read() as conn:
+            rows = await conn.fetch(
+                """
+                SELECT created_at, answers, gpt_response
+                FROM patient_history
+                WHERE username = $1
+                ORDER BY created_at DESC
+                LIMIT $2
                 """,
-                telegram_id,
-                answers,
-                gpt_response,
-                s3_links,
-                summary,
+                username,
+                limit,
             )
 
-    except Exception as e:
-        print(f"Ошибка сохранения: {e}")
-        raise
+        history_blocks = []
+        for row in reversed(rows):
+            text = (
+                f"Дата: {row['created_at'].strftime('%Y-%m-%d')}\n"
+                f"Ответы: {row['answers']}\n"
+                f"Рекомендации GPT: {row['gpt_response']}\n"
+            )
+            history_blocks.append(text)
 
+        return history_blocks
 
-async def get_all_patients(conn) -> list[dict]:
-    """
-    Возвращает список всех активных пользователей.
-    """
-    rows = await conn.fetch(
+    async def save_patient_record(
+        self,
+        telegram_id: int,
+        answers: str,
+        gpt_response: str,
+        s3_links: list[str],
+        summary: str = "",
+        is_daily: bool = False,
+    ):
+        try:
+            answers_data = json.loads(answers)
+            questionnaire_type = answers_data.get("questionnaire_type")
+
+            if not questionnaire_type:
+                raise ValueError("questionnaire_type не указан в answers")
+
+            if self.patient_record_writer.running:
+                patient = await self.resolve_patient(telegram_id)
+                if patient is None:
+                    raise ValueError(f"Пациент {telegram_id} не зарегистрирован")
+                await self.patient_record_writer.submit(
+                    (
+                        patient.id,
+                        questionnaire_type,
+                        answers,
+                        gpt_response,
+                        json.dumps(s3_links or []),
+                        summary,
+                        local_today(patient.timezone),
+                    )
+                )
+                return
+
+            async with acquire() as conn:
+                patient = await self.resolve_patient(telegram_id, conn)
+                if patient is None:
+                    raise ValueError(f"Пациент {telegram_id} не зарегистрирован")
+
+                await conn.fetch_prepared(
+                    "save_patient_record",
+                    patient.id,
+                    answers,
+                    gpt_response,
+                    s3_links,
+                    summary,
+                    local_today(patient.timezone),
+                )
+
+        except Exception as e:
+            print(f"Ошибка сохранения: {e}")
+            raise
+
+    async def get_all_records_by_user(
+        self,
+        telegram_id: int,
+        date_from: datetime | None = None,
+        date_to: datetime | None = None,
+    ) -> list[dict]:
+        """
+        Возвращает все записи пользователя за указанный день (или диапазон).
         """
-        SELECT *
-        FROM patients
+        async with acquire_read() as conn:
+            patient_id = await self.resolve_patient_id(telegram_id, conn)
+            if patient_id is None:
+                return []
 
-        WHERE is_active = true
+            if not date_from or not date_to:
+                rows = await conn.fetch_prepared("records_all", patient_id)
+            else:
+                rows = await conn.fetch_prepared(
+                    "records_range",
+                    patient_id,
+                    date_from,
+                    date_to,
+                    *record_day_bounds(date_from, date_to),
+                )
+        result = []
+        for row in rows:
+            record = dict(row)
+            record["answers"] = (
+                json.loads(record["answers"]) if record.get("answers") else {}
+            )
+            result.append(record)
+        return result
+
+    async def iter_records_by_user(
+        self,
+        telegram_id: int,
+        columns: tuple[str, ...] = ("answers", "s3_files"),
+        questionnaire_types: list[str] | None = None,
+        date_from: datetime | None = None,
+        date_to: datetime | None = None,
+        batch_size: int = 200,
+    ) -> AsyncIterator[dict]:
         """
-    )
-    return [dict(row) for row in rows]
+        Потоково отдаёт записи пользователя в порядке (created_at, id).
+        Читает страницами по keyset-курсору, соединение берётся из пула на каждую
+        страницу, answers декодируется только у отдаваемой записи.
+        Текст запроса зависит от фильтров, поэтому он идёт через кэш asyncpg.
+        """
+        unknown = set(columns) - HISTORY_COLUMNS
+        if unknown:
+            raise ValueError(f"Неизвестные колонки patient_history: {sorted(unknown)}")
 
+        async with acquire_read() as conn:
+            patient_id = await self.resolve_patient_id(telegram_id, conn)
+        if patient_id is None:
+            return
 
-async def get_all_records_by_user(
-    telegram_id: int,
-    conn,
-    date_from: datetime | None = None,
-    date_to: datetime | None = None,
-) -> list[dict]:
-    """
-    Возвращает все записи пользователя за указанный день (или диапазон).
-    """
-    if not date_from or not date_to:
-        rows = await conn.fetch(
-            """
-            SELECT answers, s3_files
-            FROM patient_history ph
-            JOIN patients p ON p.id = ph.patient_id
-            WHERE p.telegram_id = $1
-            ORDER BY ph.created_at ASC
-            """,
-            telegram_id,
-        )
-    else:
-        rows = await conn.fetch(
-            """
-            SELECT answers, s3_files
-            FROM patient_history ph
-            JOIN patients p ON p.id = ph.patient_id
-            WHERE p.telegram_id = $1
-            AND ph.created_at >= $2 AND ph.created_at < $3
-            ORDER BY ph.created_at ASC
-            """,
-            telegram_id,
-            date_from,
-            date_to,
-        )
-    result = []
-    for row in rows:
-        record = dict(row)
-        record["answers"] = (
-            json.loads(record["answers"]) if record.get("answers") else {}
-        )
-        result.append(record)
-    return result
+        select = ", ".join(dict.fromkeys(("created_at", "id", *columns)))
+        filters = ["patient_id = $1"]
+        args = [patient_id]
+        if questionnaire_types:
+            args.append(questionnaire_types)
+            filters.append(
+                f"answers->>'questionnaire_type' = ANY(${len(args)}::text[])"
+            )
+        if date_from:
+            args.append(date_from)
+            filters.append(f"created_at >= ${len(args)}")
+        if date_to:
+            args.append(date_to)
+            filters.append(f"created_at < ${len(args)}")
+        if date_from and date_to:
+            args.extend(record_day_bounds(date_from, date_to))
+            filters.append(f"record_day BETWEEN ${len(args) - 1} AND ${len(args)}")
 
+        first_page = f"""
+            SELECT {select} FROM patient_history
+            WHERE {" AND ".join(filters)}
+            ORDER BY created_at, id
+            LIMIT {int(batch_size)}
+        """
+        next_page = f"""
+            SELECT {select} FROM patient_history
+            WHERE {" AND ".join(filters)}
+            AND (created_at, id) > (${len(args) + 1}, ${len(args) + 2})
+            ORDER BY created_at, id
+            LIMIT {int(batch_size)}
+        """
 
-async def save_llm_response(
-    conn, telegram_id: int, response_text: str, summary: str = None
-):
-    """
-    Сохраняет ответ от LLM в patient_history в виде новой записи.
-    """
-    await conn.execute(
+        cursor = None
+        while True:
+            async with acquire_read() as conn:
+                if cursor is None:
+                    rows = await conn.fetch(first_page, *args)
+                else:
+                    rows = await conn.fetch(next_page, *args, *cursor)
+
+            for row in rows:
+                record = {column: row[column] for column in columns}
+                if "answers" in record:
+                    record["answers"] = (
+                        json.loads(record["answers"]) if record["answers"] else {}
+                    )
+                yield record
+
+            if len(rows) < batch_size:
+                return
+            cursor = (rows[-1]["created_at"], rows[-1]["id"])
+
+    async def save_llm_response(
+        self, telegram_id: int, response_text: str, summary: str = None
+    ):
         """
-        INSERT INTO patient_history (patient_id, answers, gpt_response, summary, created_at)
-        SELECT id, '{}'::jsonb, $2, $3, now()
-        FROM patients
-        WHERE telegram_id = $1
-        """,
-        telegram_id,
-        response_text,
-        summary or "",
-    )
+        Сохраняет ответ от LLM в patient_history в виде новой записи.
+        """
+        async with acquire() as conn:
+            patient = await self.resolve_patient(telegram_id, conn)
+            if patient is None:
+                return
 
+            await conn.fetch_prepared(
+                "save_llm_response",
+                patient.id,
+                response_text,
+                summary or "",
+                local_today(patient.timezone),
+            )
 
-async def save_llm_response_separately(
-    conn, telegram_id: int, prompt: str, response: str
-):
-    """
-    Сохраняет промпт и ответ GPT в отдельную таблицу llm_responses.
-    """
-    await conn.execute(
+    async def save_llm_response_separately(
+        self, telegram_id: int, prompt: str, response: str, cache_key: str = None
+    ):
         """
-        INSERT INTO llm_responses (patient_id, prompt, gpt_response)
-        SELECT id, $2, $3 FROM patients WHERE telegram_id = $1
-        """,
-        telegram_id,
-        prompt,
-        response,
-    )
+        Сохраняет промпт и ответ GPT в отдельную таблицу llm_responses.
+        cache_key — ключ кэша ответов LLM (None — ответ не переиспользуется).
+        """
+        if self.llm_response_writer.running:
+            patient_id = await self.resolve_patient_id(telegram_id)
+            if patient_id is not None:
+                await self.llm_response_writer.submit(
+                    (patient_id, prompt, response, cache_key)
+                )
+            return
+
+        async with acquire() as conn:
+            patient_id = await self.resolve_patient_id(telegram_id, conn)
+            if patient_id is None:
+                return
+
+            await conn.fetch_prepared(
+                "save_llm_response_separately", patient_id, prompt, response, cache_key
+            )
+
+    async def get_cached_llm_response(
+        self, cache_key: str, max_age: float
+    ) -> str | None:
+        """Ответ LLM из llm_responses по ключу кэша не старше max_age секунд"""
+        async with acquire_read() as conn:
+            return await conn.fetchval_prepared(
+                "cached_llm_response", cache_key, max_age
+            )
+
+
+repository = PatientRepository()
+set_connection_init(repository.prepare)
+
+# Прежние функции модуля — обработчики импортируют их напрямую
+resolve_patient_id = repository.resolve_patient_id
+create_patient = repository.create_patient
+get_recent_history = repository.get_recent_history
+save_patient_record = repository.save_patient_record
+get_all_patients = repository.get_all_patients
+iter_scheduler_patients = repository.iter_scheduler_patients
+get_all_records_by_user = repository.get_all_records_by_user
+iter_records_by_user = repository.iter_records_by_user
+save_llm_response = repository.save_llm_response
+save_llm_response_separately = repository.save_llm_response_separately
+get_cached_llm_response = repository.get_cached_llm_response
+start_write_buffers = repository.start_write_buffers
+stop_write_buffers = repository.stop_write_buffers
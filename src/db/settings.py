@@ -0,0 +1,150 @@
+import asyncio
+import logging
+import time
+from typing import Callable
+
+import asyncpg
+
+from src import config
+from src.db.connection import acquire
+
+logger = logging.getLogger(__name__)
+
+# Дата начала тестирования для всех пациентов (ISO, пусто — не начато)
+TESTING_START_DATE = "testing_start_date"
+# Не строка app_settings: NOTIFY по этому ключу сбрасывает кэш часовых поясов
+# активных пациентов (PatientRepository.get_active_timezones)
+ACTIVE_TIMEZONES = "active_timezones"
+
+_MISSING = object()
+
+
+class SettingsCache:
+    """
+    Кэш таблицы app_settings в памяти процесса.
+    Значение читается из базы один раз и дальше отдаётся из памяти. При записи
+    put() шлёт NOTIFY в том же запросе: слушатель каждого экземпляра сбрасывает
+    ключ, и следующее чтение берёт свежее значение. TTL — страховка на случай,
+    если слушатель отключён или переподключается.
+    """
+
+    def __init__(self, channel: str, ttl: float):
+        self.channel = channel
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._items: dict[str, tuple[str | None, float]] = {}
+        # Растёт при каждом сбросе: значение, прочитанное до сброса, не кэшируем
+        self._version = 0
+        self._callbacks: dict[str, list[Callable[[], None]]] = {}
+        self._conn: asyncpg.Connection | None = None
+        self._task: asyncio.Task | None = None
+
+    async def get(self, key: str) -> str | None:
+        item = self._items.get(key, _MISSING)
+        if item is not _MISSING and item[1] >= time.monotonic():
+            self.hits += 1
+            return item[0]
+
+        self.misses += 1
+        version = self._version
+        # С primary: после NOTIFY реплика может ещё не догнать запись
+        async with acquire() as conn:
+            value = await conn.fetchval(
+                "SELECT value FROM app_settings WHERE key = $1", key
+            )
+        if version == self._version:
+            self._items[key] = (value, time.monotonic() + self.ttl)
+        return value
+
+    async def put(self, conn: asyncpg.Connection, key: str, value: str | None):
+        """
+        Записывает настройку на переданном соединении (можно внутри транзакции:
+        NOTIFY уходит при коммите). Локальный кэш сбрасывайте через
+        invalidate() после коммита.
+        """
+        await conn.execute(
+            """
+            WITH saved AS (
+                INSERT INTO app_settings (key, value, updated_at)
+                VALUES ($1, $2, now())
+                ON CONFLICT (key) DO UPDATE SET
+                    value = EXCLUDED.value,
+                    updated_at = EXCLUDED.updated_at
+                RETURNING key
+            )
+            SELECT pg_notify($3, key) FROM saved
+            """,
+            key,
+            value,
+            self.channel,
+        )
+
+    async def notify(self, conn: asyncpg.Connection, key: str):
+        """NOTIFY по ключу без записи в app_settings — для кэшей вне таблицы"""
+        await conn.execute("SELECT pg_notify($1, $2)", self.channel, key)
+
+    def on_invalidate(self, key: str, callback: Callable[[], None]):
+        """callback() вызывается при каждом сбросе ключа, в том числе по NOTIFY"""
+        self._callbacks.setdefault(key, []).append(callback)
+
+    def invalidate(self, key: str | None = None):
+        """Сбрасывает один ключ или (key=None) весь кэш"""
+        self._version += 1
+        if key is None:
+            self._items.clear()
+            callbacks = [cb for cbs in self._callbacks.values() for cb in cbs]
+        else:
+            self._items.pop(key, None)
+            callbacks = self._callbacks.get(key, [])
+        for callback in callbacks:
+            callback()
+
+    def stats(self) -> dict:
+        return {"size": len(self._items), "hits": self.hits, "misses": self.misses}
+
+    def start_listener(self):
+        """Слушает NOTIFY об изменении настроек от других экземпляров"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._listen(), name="settings-listener")
+
+    async def stop_listener(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._conn is not None:
+            self._conn.terminate()
+            self._conn = None
+
+    def _on_notify(self, conn, pid, channel, key):
+        logger.info(f"Настройка {key} изменена, кэш сброшен")
+        self.invalidate(key)
+
+    async def _listen(self):
+        while True:
+            try:
+                if self._conn is None or self._conn.is_closed():
+                    self._conn = await asyncpg.connect(
+                        dsn=config.POSTGRES_DSN,
+                        timeout=config.POSTGRES_CONNECT_TIMEOUT,
+                    )
+                    await self._conn.add_listener(self.channel, self._on_notify)
+                    # Пока слушателя не было, уведомления могли потеряться
+                    self.invalidate()
+                await self._conn.fetchval(
+                    "SELECT 1", timeout=config.SETTINGS_LISTEN_HEARTBEAT
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка слушателя настроек: {e}")
+                if self._conn is not None:
+                    self._conn.terminate()
+                    self._conn = None
+            await asyncio.sleep(config.SETTINGS_LISTEN_HEARTBEAT)
+
+
+settings = SettingsCache(
+    channel=config.SETTINGS_NOTIFY_CHANNEL, ttl=config.SETTINGS_CACHE_TTL
+)
@@ -0,0 +1,106 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class BatchWriter:
+    """
+    Write-behind буфер: копит записи в очереди и сбрасывает их в базу пачкой,
+    когда набралось max_batch записей или прошло max_delay секунд с первой.
+    submit() возвращается только после того, как пачка записана (или падает
+    с ошибкой записи), так что обработчик получает подтверждение сохранения.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        flush: Callable[[list[Any]], Awaitable[None]],
+        max_batch: int,
+        max_delay: float,
+    ):
+        self.name = name
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.flushed_batches = 0
+        self.flushed_items = 0
+        self._flush = flush
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._task: asyncio.Task | None = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        if not self.running:
+            self._task = asyncio.create_task(self._run(), name=f"{self.name}-writer")
+
+    async def stop(self):
+        """Сбрасывает всё, что осталось в очереди, и останавливает воркер"""
+        if self.running:
+            await self._queue.put((_STOP, None))
+            await self._task
+        self._task = None
+
+    async def submit(self, item: Any):
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, future))
+        await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await self._queue.get()
+            if item[0] is _STOP:
+                await self._drain()
+                return
+            batch = [item]
+            stopping = False
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item[0] is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            await self._flush_batch(batch)
+            if stopping:
+                await self._drain()
+                return
+
+    async def _drain(self):
+        """Сбрасывает пачками то, что встало в очередь после _STOP"""
+        while not self._queue.empty():
+            rest = [self._queue.get_nowait()]
+            while not self._queue.empty() and len(rest) < self.max_batch:
+                rest.append(self._queue.get_nowait())
+            await self._flush_batch([i for i in rest if i[0] is not _STOP])
+
+    async def _flush_batch(self, batch: list[tuple[Any, asyncio.Future]]):
+        if not batch:
+            return
+        try:
+            await self._flush([item for item, _ in batch])
+        except Exception as e:
+            logger.error(f"Ошибка записи пачки {self.name} ({len(batch)} шт.): {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.flushed_batches += 1
+        self.flushed_items += len(batch)
+        for _, future in batch:
+            if not future.done():
+                future.set_result(None)
@@ -0,0 +1,100 @@
+import asyncio
+import logging
+import time
+from typing import Any, AsyncIterable, Awaitable, Callable, Iterable
+
+logger = logging.getLogger(__name__)
+
+
+class FanoutStats:
+    """Счётчики одного прогона fan_out: результат, пропускная способность, задержки"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.done = 0
+        self.failed = 0
+        self.timed_out = 0
+        self.latencies: list[float] = []
+        self.started = time.monotonic()
+        self.finished: float | None = None
+
+    @property
+    def total(self) -> int:
+        return self.done + self.failed + self.timed_out
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished or time.monotonic()) - self.started
+
+    @property
+    def throughput(self) -> float:
+        return self.total / self.elapsed if self.elapsed > 0 else 0.0
+
+    def percentile(self, q: float) -> float:
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+    def summary(self) -> str:
+        return (
+            f"{self.name}: {self.done} ok, {self.failed} errors, "
+            f"{self.timed_out} timeouts in {self.elapsed:.2f}s "
+            f"({self.throughput:.1f}/s), p50={self.percentile(50):.3f}s, "
+            f"p95={self.percentile(95):.3f}s, p99={self.percentile(99):.3f}s"
+        )
+
+
+async def fan_out(
+    func: Callable[[Any], Awaitable[Any]],
+    items: Iterable | AsyncIterable,
+    concurrency: int,
+    timeout: float | None = None,
+    name: str = "fan_out",
+) -> FanoutStats:
+    """
+    Выполняет func для каждого элемента, не больше concurrency одновременно.
+    Элементы (в том числе из асинхронного итератора) берутся по мере
+    освобождения воркеров, поэтому весь список в память не разворачивается.
+    Ошибка или таймаут одного элемента логируется и не останавливает остальные.
+    """
+    stats = FanoutStats(name)
+    lock = asyncio.Lock()
+    if hasattr(items, "__aiter__"):
+        iterator = items.__aiter__()
+
+        async def next_item():
+            async with lock:
+                return await iterator.__anext__()
+
+    else:
+        iterator = iter(items)
+
+        async def next_item():
+            try:
+                return next(iterator)
+            except StopIteration:
+                raise StopAsyncIteration
+
+    async def worker():
+        while True:
+            try:
+                item = await next_item()
+            except StopAsyncIteration:
+                return
+            started = time.monotonic()
+            try:
+                await asyncio.wait_for(func(item), timeout)
+            except asyncio.TimeoutError:
+                stats.timed_out += 1
+                logger.error(f"{name}: таймаут {timeout} с")
+            except Exception as e:
+                stats.failed += 1
+                logger.exception(f"{name}: ошибка обработки: {e}")
+            else:
+                stats.done += 1
+            stats.latencies.append(time.monotonic() - started)
+
+    await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    stats.finished = time.monotonic()
+    return stats
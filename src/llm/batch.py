@@ -0,0 +1,359 @@
+"""
+Пакетная обработка ночного дайджеста: промпты пишутся в JSONL, отправляются
+одним пакетом (OpenAI Batch API — дешевле за токен и не занимает
+интерактивную квоту), результаты забираются опросом и расходятся
+в llm_responses и очередь отправки сообщений.
+
+Состояние пакета (id и соответствие custom_id -> пациент) лежит в манифесте
+рядом с файлом пакета, поэтому после рестарта опрос продолжается
+(resume_batches). Доставленные custom_id дописываются в журнал рядом
+с манифестом, и при повторной обработке пакета они пропускаются —
+пациент не получает дайджест дважды.
+"""
+
+from abc import ABC, abstractmethod
+import asyncio
+from datetime import datetime
+import json
+import logging
+import os
+from pathlib import Path
+
+import openai
+
+from src import config
+from src.bot.sender import PRIORITY_DIGEST, message_dispatcher
+from src.db.patient_repository import save_llm_response_separately
+from src.fanout import fan_out
+from src.llm.cache import llm_cache
+from src.llm.service import (
+    LLM_PARAMS,
+    ask_llm,
+    build_message_chain,
+    markdown_to_html,
+    response_cache_key,
+    to_openai_messages,
+)
+
+logger = logging.getLogger(__name__)
+
+# Статусы Batch API, после которых пакет больше не изменится
+FINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+
+class BatchBackend(ABC):
+    """Куда отправляется JSONL-файл пакета и откуда забираются результаты"""
+
+    name = ""
+
+    @abstractmethod
+    async def submit(self, path: Path) -> str:
+        """Отправляет файл пакета, возвращает id пакета"""
+
+    @abstractmethod
+    async def status(self, batch_id: str) -> str:
+        """Статус пакета в терминах Batch API (см. FINAL_STATUSES)"""
+
+    @abstractmethod
+    async def results(self, batch_id: str) -> list[dict]:
+        """Строки результатов в формате Batch API (custom_id, response, error)"""
+
+
+class OpenAIBatchBackend(BatchBackend):
+    name = "openai"
+
+    def __init__(self):
+        self._client = openai.AsyncOpenAI(api_key=config.OPENAI_API_KEY)
+
+    async def submit(self, path: Path) -> str:
+        data = await asyncio.to_thread(path.read_bytes)
+        uploaded = await self._client.files.create(
+            file=(path.name, data), purpose="batch"
+        )
+        batch = await self._client.batches.create(
+            input_file_id=uploaded.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h",
+        )
+        return batch.id
+
+    async def status(self, batch_id: str) -> str:
+        return (await self._client.batches.retrieve(batch_id)).status
+
+    async def results(self, batch_id: str) -> list[dict]:
+        batch = await self._client.batches.retrieve(batch_id)
+        lines = []
+        # В истёкшем пакете часть ответов всё равно есть
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if file_id:
+                content = await self._client.files.content(file_id)
+                lines.extend(
+                    json.loads(line) for line in content.text.splitlines() if line
+                )
+        return lines
+
+
+class LocalBatchBackend(BatchBackend):
+    """
+    Файловая заглушка для разработки и проверок: сразу пишет рядом с пакетом
+    файл результатов с фиксированными ответами, без запросов к OpenAI.
+    """
+
+    name = "local"
+
+    async def submit(self, path: Path) -> str:
+        output = path.with_suffix(".output.jsonl")
+        with (
+            path.open(encoding="utf-8") as src,
+            output.open("w", encoding="utf-8") as dst,
+        ):
+            for line in src:
+                request = json.loads(line)
+                text = f"[local batch] {request['custom_id']}"
+                dst.write(
+                    json.dumps(
+                        {
+                            "custom_id": request["custom_id"],
+                            "response": {
+                                "status_code": 200,
+                                "body": {"choices": [{"message": {"content": text}}]},
+                            },
+                            "error": None,
+                        },
+                        ensure_ascii=False,
+                    )
+                    + "\n"
+                )
+        return str(output)
+
+    async def status(self, batch_id: str) -> str:
+        return "completed" if os.path.exists(batch_id) else "failed"
+
+    async def results(self, batch_id: str) -> list[dict]:
+        with open(batch_id, encoding="utf-8") as file:
+            return [json.loads(line) for line in file if line.strip()]
+
+
+BACKENDS = {
+    backend.name: backend for backend in (OpenAIBatchBackend, LocalBatchBackend)
+}
+
+_backends: dict[str, BatchBackend] = {}
+# Ссылки на задачи опроса, чтобы их не собрал сборщик мусора
+_poll_tasks: set[asyncio.Task] = set()
+
+
+def get_backend(name: str = None) -> BatchBackend:
+    name = name or config.LLM_BATCH_BACKEND
+    if name not in _backends:
+        _backends[name] = BACKENDS[name]()
+    return _backends[name]
+
+
+def _result_text(line: dict) -> str | None:
+    response = line.get("response") or {}
+    if line.get("error") or response.get("status_code") != 200:
+        return None
+    try:
+        return response["body"]["choices"][0]["message"]["content"].strip() or None
+    except (KeyError, IndexError, AttributeError):
+        return None
+
+
+async def deliver(item: dict, text: str, cache_key: str | None = None):
+    """Сохраняет ответ, кладёт его в кэш и ставит сообщение пациенту в очередь"""
+    await save_llm_response_separately(
+        item["telegram_id"], item["prompt"], text, cache_key
+    )
+    if cache_key is not None:
+        llm_cache.put(cache_key, text)
+    message_dispatcher.submit(
+        item["telegram_id"], markdown_to_html(text), PRIORITY_DIGEST
+    )
+
+
+class DigestBatch:
+    """
+    Один пакет дайджеста: add() для каждой записи, затем submit().
+    Ответы, которые уже есть в кэше, отправляются сразу и в пакет не попадают.
+    """
+
+    def __init__(self, backend: BatchBackend = None, directory: str = None):
+        self.backend = backend or get_backend()
+        directory = Path(directory or config.LLM_BATCH_DIR)
+        directory.mkdir(parents=True, exist_ok=True)
+        name = f"digest-{datetime.now():%Y%m%d-%H%M%S-%f}"
+        self.path = directory / f"{name}.jsonl"
+        self.manifest_path = directory / f"{name}.manifest.json"
+        self.items: dict[str, dict] = {}
+        self.cached = 0
+        self._file = self.path.open("w", encoding="utf-8")
+
+    async def add(self, telegram_id: int, prompt: str, media_keys: list[str]):
+        chain = await build_message_chain([], prompt, media_keys)
+        messages = chain.messages
+        cache_key = response_cache_key(chain)
+        if cache_key is not None:
+            cached = await llm_cache.get(cache_key)
+            if cached is not None:
+                self.cached += 1
+                message_dispatcher.submit(
+                    telegram_id, markdown_to_html(cached), PRIORITY_DIGEST
+                )
+                return
+
+        custom_id = f"{telegram_id}-{len(self.items)}"
+        self.items[custom_id] = {
+            "telegram_id": telegram_id,
+            "prompt": prompt,
+            "media_keys": media_keys,
+            "cache_key": cache_key,
+        }
+        self._file.write(
+            json.dumps(
+                {
+                    "custom_id": custom_id,
+                    "method": "POST",
+                    "url": "/v1/chat/completions",
+                    "body": {**LLM_PARAMS, "messages": to_openai_messages(messages)},
+                },
+                ensure_ascii=False,
+            )
+            + "\n"
+        )
+
+    async def submit(self) -> str | None:
+        """Отправляет пакет и запускает опрос в фоне; None — отправлять нечего"""
+        self._file.close()
+        if not self.items:
+            self.path.unlink(missing_ok=True)
+            return None
+
+        batch_id = await self.backend.submit(self.path)
+        manifest = {
+            "backend": self.backend.name,
+            "batch_id": batch_id,
+            "path": str(self.path),
+            "items": self.items,
+        }
+        self.manifest_path.write_text(json.dumps(manifest, ensure_ascii=False))
+        logger.info(
+            f"Batch {batch_id}: {len(self.items)} requests submitted, "
+            f"{self.cached} served from cache"
+        )
+        _start_polling(self.manifest_path)
+        return batch_id
+
+
+def _start_polling(manifest_path: Path):
+    task = asyncio.create_task(_poll(manifest_path), name=f"batch-{manifest_path.stem}")
+    _poll_tasks.add(task)
+    task.add_done_callback(_poll_tasks.discard)
+
+
+async def _poll(manifest_path: Path):
+    manifest = json.loads(manifest_path.read_text())
+    backend = get_backend(manifest["backend"])
+    batch_id = manifest["batch_id"]
+    while True:
+        try:
+            status = await backend.status(batch_id)
+            if status in FINAL_STATUSES:
+                break
+        except Exception as e:
+            logger.error(f"Batch {batch_id}: ошибка проверки статуса: {e}")
+        await asyncio.sleep(config.LLM_BATCH_POLL_INTERVAL)
+
+    try:
+        results = await backend.results(batch_id) if status != "failed" else []
+        undelivered = await _complete(manifest_path, manifest, status, results)
+    except Exception as e:
+        # Манифест остаётся: после рестарта resume_batches попробует снова
+        logger.exception(f"Batch {batch_id}: ошибка обработки результатов: {e}")
+        return
+    if undelivered:
+        # Журнал доставленных тоже остаётся: resume_batches повторит только их
+        logger.error(
+            f"Batch {batch_id}: не доставлено {undelivered}, "
+            "манифест оставлен для resume_batches"
+        )
+        return
+
+    manifest_path.unlink(missing_ok=True)
+    _delivered_path(manifest_path).unlink(missing_ok=True)
+    Path(manifest["path"]).unlink(missing_ok=True)
+    Path(manifest["path"]).with_suffix(".output.jsonl").unlink(missing_ok=True)
+
+
+def _delivered_path(manifest_path: Path) -> Path:
+    """Журнал доставленных custom_id пакета, по одному в строке"""
+    return manifest_path.with_suffix(".delivered")
+
+
+async def _complete(
+    manifest_path: Path, manifest: dict, status: str, results: list[dict]
+) -> int:
+    """Доставляет ответы пакета, остальное спрашивает заново; -> сколько не доставлено"""
+    items = manifest["items"]
+    log_path = _delivered_path(manifest_path)
+    delivered = set(log_path.read_text().split()) if log_path.exists() else set()
+    resumed = len(delivered)
+
+    with log_path.open("a") as log:
+
+        def mark_delivered(custom_id: str):
+            delivered.add(custom_id)
+            log.write(f"{custom_id}\n")
+            log.flush()
+
+        for line in results:
+            custom_id = line.get("custom_id")
+            item = items.get(custom_id) if custom_id not in delivered else None
+            text = _result_text(line) if item else None
+            if text is None:
+                continue
+            try:
+                await deliver(item, text, item["cache_key"])
+                mark_delivered(custom_id)
+            except Exception as e:
+                logger.error(f"Batch {manifest['batch_id']}: ошибка доставки: {e}")
+
+        async def retry(custom_id: str):
+            # Не вернулось из пакета — спрашиваем через обычную очередь LLM
+            item = items[custom_id]
+            answer = await ask_llm(
+                item["prompt"], item["media_keys"], [], priority=PRIORITY_DIGEST
+            )
+            if answer.cached:
+                message_dispatcher.submit(
+                    item["telegram_id"], markdown_to_html(answer.text), PRIORITY_DIGEST
+                )
+            else:
+                await deliver(item, answer.text, answer.cache_key)
+            mark_delivered(custom_id)
+
+        missing = [custom_id for custom_id in items if custom_id not in delivered]
+        stats = await fan_out(
+            retry,
+            missing,
+            concurrency=config.DIGEST_CONCURRENCY,
+            timeout=config.DIGEST_ITEM_TIMEOUT,
+            name=f"batch {manifest['batch_id']} fallback",
+        )
+    logger.info(
+        f"Batch {manifest['batch_id']} {status}: "
+        f"{len(delivered) - resumed - stats.done} delivered, "
+        f"{resumed} already delivered before restart, "
+        f"{len(missing)} retried ({stats.summary()})"
+    )
+    return len(items) - len(delivered)
+
+
+def resume_batches(directory: str = None):
+    """Продолжает опрос пакетов, отправленных до рестарта"""
+    directory = Path(directory or config.LLM_BATCH_DIR)
+    if not directory.exists():
+        return
+    for manifest_path in sorted(directory.glob("*.manifest.json")):
+        logger.info(f"Resuming batch {manifest_path.name}")
+        _start_polling(manifest_path)
@@ -0,0 +1,92 @@
+from collections import OrderedDict
+import hashlib
+import json
+import logging
+import time
+
+from langchain_core.messages import BaseMessage
+
+from src import config
+from src.db.patient_repository import get_cached_llm_response
+
+logger = logging.getLogger(__name__)
+
+
+class LLMResponseCache:
+    """
+    Кэш ответов LLM по хэшу запроса: параметры модели, системный промпт,
+    промпт и содержимое картинок (хэш самих данных, а не ключа S3).
+    Сначала ограниченный LRU в памяти, затем llm_responses, куда ответы
+    сохраняются вместе с cache_key. Ответ старше ttl не переиспользуется.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.db_hits = 0
+        self.misses = 0
+        self.llm_calls = 0
+        self.llm_seconds = 0.0
+        self._items: OrderedDict[str, tuple[str, float]] = OrderedDict()
+
+    @staticmethod
+    def make_key(model_params: dict, messages: list[BaseMessage]) -> str:
+        digest = hashlib.sha256(json.dumps(model_params, sort_keys=True).encode())
+        for message in messages:
+            digest.update(f"\0{message.type}".encode())
+            content = message.content
+            if isinstance(content, str):
+                content = [{"type": "text", "text": content}]
+            for part in content:
+                if part.get("type") == "image_url":
+                    image = part["image_url"]["url"].encode()
+                    digest.update(b"\1image:" + hashlib.sha256(image).digest())
+                else:
+                    digest.update(b"\1text:" + part.get("text", "").encode())
+        return digest.hexdigest()
+
+    async def get(self, key: str) -> str | None:
+        item = self._items.get(key)
+        if item is not None and item[1] >= time.monotonic():
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+        try:
+            value = await get_cached_llm_response(key, self.ttl)
+        except Exception as e:
+            logger.error(f"Ошибка чтения кэша ответов LLM: {e}")
+            value = None
+        if value is None:
+            self.misses += 1
+            return None
+        self.db_hits += 1
+        self.put(key, value)
+        return value
+
+    def put(self, key: str, value: str):
+        self._items[key] = (value, time.monotonic() + self.ttl)
+        self._items.move_to_end(key)
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+    def record_call(self, seconds: float):
+        """Учитывает реальный вызов LLM — по нему оценивается сэкономленное время"""
+        self.llm_calls += 1
+        self.llm_seconds += seconds
+
+    def stats(self) -> dict:
+        average = self.llm_seconds / self.llm_calls if self.llm_calls else 0.0
+        return {
+            "size": len(self._items),
+            "hits": self.hits,
+            "db_hits": self.db_hits,
+            "misses": self.misses,
+            "llm_calls": self.llm_calls,
+            "avg_llm_s": round(average, 2),
+            "saved_s": round((self.hits + self.db_hits) * average, 1),
+        }
+
+
+llm_cache = LLMResponseCache(maxsize=config.LLM_CACHE_SIZE, ttl=config.LLM_CACHE_TTL)
@@ -0,0 +1,266 @@
+import asyncio
+import itertools
+import logging
+import re
+from typing import Any, AsyncIterator, NamedTuple
+
+from langchain_core.messages import BaseMessage
+import openai
+
+from src import config
+from src.bot.sender import PRIORITY_INTERACTIVE
+from src.rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+
+class LLMRequest(NamedTuple):
+    messages: list[BaseMessage]
+    tokens: int
+    future: asyncio.Future
+    attempt: int = 0
+
+
+def estimate_tokens(messages: list[BaseMessage], max_tokens: int) -> int:
+    """
+    Грубая оценка токенов запроса для лимита TPM: OpenAI сразу засчитывает
+    max_tokens ответа, текст — примерно 3 символа на токен, картинка —
+    LLM_IMAGE_TOKENS.
+    """
+    tokens = max_tokens
+    for message in messages:
+        content = message.content
+        if isinstance(content, str):
+            content = [{"type": "text", "text": content}]
+        tokens += 4
+        for part in content:
+            if part.get("type") == "image_url":
+                tokens += config.LLM_IMAGE_TOKENS
+            else:
+                tokens += len(part.get("text", "")) // 3 + 1
+    return tokens
+
+
+def parse_reset(value: str | None) -> float:
+    """Длительность из x-ratelimit-reset-*: "1s", "6m0s", "20ms", "1h2m3.5s" """
+    if not value:
+        return 0.0
+    seconds = 0.0
+    for amount, unit in re.findall(r"([\d.]+)(ms|h|m|s)", value):
+        seconds += float(amount) * {"ms": 0.001, "s": 1, "m": 60, "h": 3600}[unit]
+    return seconds
+
+
+class LLMDispatcher:
+    """
+    Очередь запросов к LLM с ограниченным пулом воркеров.
+    Два token bucket держат лимиты OpenAI: запросы в минуту и токены в минуту
+    (по оценке estimate_tokens). Лимиты подстраиваются по заголовкам
+    x-ratelimit-* каждого ответа; 429 приостанавливает оба bucket до сброса
+    квоты, и запрос уходит повторно, а не возвращается ошибкой.
+    """
+
+    def __init__(self, rpm: float, tpm: float, workers: int, max_retries: int):
+        self.workers = workers
+        self.max_retries = max_retries
+        self.done = 0
+        self.retried = 0
+        self.rate_limited = 0
+        self.failed = 0
+        self.tokens_used = 0
+        self._requests = self._make_bucket(rpm)
+        self._tokens = self._make_bucket(tpm)
+        self._llm = None
+        self._queue: asyncio.PriorityQueue | None = None
+        self._seq = itertools.count()
+        self._tasks: list[asyncio.Task] = []
+
+    @staticmethod
+    def _make_bucket(per_minute: float) -> TokenBucket:
+        # Квота OpenAI восполняется непрерывно в пределах минутного лимита
+        limit = per_minute * config.LLM_RATE_HEADROOM
+        return TokenBucket(limit / 60, capacity=limit)
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    def start(self, llm):
+        if self.running:
+            return
+        self._llm = llm
+        self._queue = asyncio.PriorityQueue()
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"llm-worker-{i}")
+            for i in range(self.workers)
+        ]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def invoke(
+        self,
+        messages: list[BaseMessage],
+        priority: int = PRIORITY_INTERACTIVE,
+        max_tokens: int = 0,
+    ) -> Any:
+        """Ставит запрос в очередь и ждёт ответ модели (AIMessage)"""
+        if not self.running:
+            raise RuntimeError("Очередь LLM не запущена: вызовите start()")
+        future = asyncio.get_running_loop().create_future()
+        request = LLMRequest(messages, estimate_tokens(messages, max_tokens), future)
+        self._queue.put_nowait((priority, next(self._seq), request))
+        return await future
+
+    async def stream(
+        self, messages: list[BaseMessage], max_tokens: int = 0
+    ) -> AsyncIterator[Any]:
+        """
+        Потоковый ответ модели (чанки AIMessageChunk) в обход очереди воркеров,
+        но в пределах тех же лимитов. 429 и сетевые ошибки до первого чанка
+        повторяются; после первого чанка ошибка пробрасывается.
+        """
+        tokens = estimate_tokens(messages, max_tokens)
+        for attempt in range(self.max_retries + 1):
+            await self._requests.acquire()
+            await self._tokens.acquire(tokens)
+            started = False
+            try:
+                async for chunk in self._llm.astream(messages):
+                    if not started:
+                        started = True
+                        self._adapt(chunk.response_metadata.get("headers") or {})
+                    yield chunk
+            except openai.RateLimitError as e:
+                if started or attempt == self.max_retries:
+                    self.failed += 1
+                    raise
+                self.rate_limited += 1
+                delay = self._retry_delay(e.response.headers, attempt)
+                self._requests.pause(delay)
+                self._tokens.pause(delay)
+            except (
+                openai.APIConnectionError,
+                openai.APITimeoutError,
+                openai.InternalServerError,
+            ):
+                if started or attempt == self.max_retries:
+                    self.failed += 1
+                    raise
+                self.retried += 1
+                await asyncio.sleep(2**attempt)
+            else:
+                self.done += 1
+                return
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize() if self._queue else 0,
+            "done": self.done,
+            "retried": self.retried,
+            "rate_limited": self.rate_limited,
+            "failed": self.failed,
+            "tokens_used": self.tokens_used,
+            "rpm": round(self._requests.rate * 60),
+            "tpm": round(self._tokens.rate * 60),
+        }
+
+    async def _worker(self):
+        while True:
+            priority, seq, request = await self._queue.get()
+            if request.future.done():
+                # Вызвавший уже не ждёт (таймаут дайджеста)
+                continue
+
+            await self._requests.acquire()
+            await self._tokens.acquire(request.tokens)
+            try:
+                response = await self._llm.ainvoke(request.messages)
+            except openai.RateLimitError as e:
+                if getattr(e, "code", None) == "insufficient_quota":
+                    self._fail(request, e)
+                    continue
+                self.rate_limited += 1
+                delay = self._retry_delay(e.response.headers, request.attempt)
+                self._requests.pause(delay)
+                self._tokens.pause(delay)
+                self._retry(priority, seq, request, e, delay)
+            except (
+                openai.APIConnectionError,
+                openai.APITimeoutError,
+                openai.InternalServerError,
+            ) as e:
+                self._retry(priority, seq, request, e, 2**request.attempt)
+            except Exception as e:
+                self._fail(request, e)
+            else:
+                self.done += 1
+                usage = getattr(response, "usage_metadata", None) or {}
+                self.tokens_used += usage.get("total_tokens", 0)
+                self._adapt(response.response_metadata.get("headers") or {})
+                if not request.future.done():
+                    request.future.set_result(response)
+
+    def _retry_delay(self, headers, attempt: int) -> float:
+        retry_after = headers.get("retry-after")
+        if retry_after:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+        reset = max(
+            parse_reset(headers.get("x-ratelimit-reset-requests")),
+            parse_reset(headers.get("x-ratelimit-reset-tokens")),
+        )
+        return reset or 2**attempt
+
+    def _adapt(self, headers: dict):
+        """Подстраивает bucket под фактическую квоту из заголовков ответа"""
+        for bucket, kind in ((self._requests, "requests"), (self._tokens, "tokens")):
+            limit = headers.get(f"x-ratelimit-limit-{kind}")
+            if limit:
+                per_minute = float(limit) * config.LLM_RATE_HEADROOM
+                if abs(bucket.rate * 60 - per_minute) > 1:
+                    logger.info(f"Лимит LLM по {kind}: {per_minute:.0f}/мин")
+                    bucket.set_rate(per_minute / 60, capacity=per_minute)
+            remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+            if remaining is not None and float(remaining) <= bucket.capacity * (
+                1 - config.LLM_RATE_HEADROOM
+            ):
+                # Квота почти выбрана (другие процессы, тот же ключ) — ждём сброса
+                bucket.pause(parse_reset(headers.get(f"x-ratelimit-reset-{kind}")))
+
+    def _retry(
+        self,
+        priority: int,
+        seq: int,
+        request: LLMRequest,
+        error: Exception,
+        delay: float,
+    ):
+        if request.attempt >= self.max_retries:
+            self._fail(request, error)
+            return
+        self.retried += 1
+        logger.warning(f"Повтор запроса к LLM через {delay:.1f} с: {error}")
+        request = request._replace(attempt=request.attempt + 1)
+        asyncio.get_running_loop().call_later(
+            delay, self._queue.put_nowait, (priority, seq, request)
+        )
+
+    def _fail(self, request: LLMRequest, error: Exception):
+        self.failed += 1
+        logger.error(f"Запрос к LLM не выполнен: {error}")
+        if not request.future.done():
+            request.future.set_exception(error)
+
+
+llm_dispatcher = LLMDispatcher(
+    rpm=config.LLM_RPM,
+    tpm=config.LLM_TPM,
+    workers=config.LLM_WORKERS,
+    max_retries=config.LLM_MAX_RETRIES,
+)
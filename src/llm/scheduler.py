@@ -1,4 +1,3 @@
-import asyncio
 from aiogram import Bot
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
@@ -6,61 +5,131 @@ from datetime import datetime, timedelta
 import logging
 import pytz
 
+from src import config
 from src.bot.handlers.testing import get_global_testing_start_date
-from src.db.connection import get_db_connection
-from src.db.patient_repository import get_all_patients, get_all_records_by_user
-from src.llm.service import dispatch_weekly_to_llm, dispatch_to_llm
+from src.bot.sender import PRIORITY_DIGEST, message_dispatcher
+from src.db.patient_repository import get_all_patients, iter_records_by_user
+from src.fanout import fan_out
+from src.llm.batch import DigestBatch, resume_batches
+from src.llm.cache import llm_cache
+from src.llm.dispatcher import llm_dispatcher
+from src.llm.service import (
+    dispatch_weekly_to_llm,
+    dispatch_to_llm,
+    render_record_prompt,
+)
+from src.media.image_prep import prepared_images
 
 logger = logging.getLogger(__name__)
 scheduler = AsyncIOScheduler()
 
 
+def daily_digest_window(patient: dict) -> tuple[datetime, datetime] | None:
+    """Окно записей для дневного дайджеста, если у пациента сейчас 23 часа"""
+    tz = pytz.timezone(patient.get("timezone", "Europe/Moscow"))
+    now = datetime.now(tz)
+
+    if now.hour != 23:
+        return None
+
+    utc_now = datetime.utcnow()
+    today_start = datetime(utc_now.year, utc_now.month, utc_now.day)
+    return today_start, today_start + timedelta(days=1)
+
+
 async def run_daily_digest(bot: Bot):
     logger.info("Starting daily digest task...")
-    conn = await get_db_connection()
-    patients = await get_all_patients(conn)
+    patients = await get_all_patients()
 
     async def handle_patient(patient):
         try:
-            tz = pytz.timezone(patient.get("timezone", "Europe/Moscow"))
-            now = datetime.now(tz)
-
-            if now.hour != 23:
+            window = daily_digest_window(patient)
+            if window is None:
                 return
 
             telegram_id = patient["telegram_id"]
             username = patient["username"]
+            today_start, today_end = window
+
+            has_records = False
+            async for record in iter_records_by_user(
+                telegram_id, date_from=today_start, date_to=today_end
+            ):
+                has_records = True
+                try:
+                    message = await dispatch_to_llm(
+                        username=username,
+                        telegram_id=telegram_id,
+                        current_record=record,
+                        media_urls=record.get("s3_files", []),
+                        priority=PRIORITY_DIGEST,
+                        raise_errors=True,
+                    )
+                except Exception as e:
+                    # Текст ошибки пользователю не отправляем
+                    logger.error(f"LLM failed for {telegram_id}: {e}")
+                    continue
+                message_dispatcher.submit(telegram_id, message, PRIORITY_DIGEST)
+
+            if not has_records:
+                logger.info(f"No records for {telegram_id}")
 
-            utc_now = datetime.utcnow()
-            today_start = datetime(utc_now.year, utc_now.month, utc_now.day)
-            today_end = today_start + timedelta(days=1)
+        except Exception as e:
+            logger.exception(f"Failed for {patient['telegram_id']}: {e}")
 
-            records = await get_all_records_by_user(
-                telegram_id, conn, today_start, today_end
-            )
-            if not records:
-                logger.info(f"No records for {telegram_id}")
+    stats = await fan_out(
+        handle_patient,
+        patients,
+        concurrency=config.DIGEST_CONCURRENCY,
+        timeout=config.DIGEST_ITEM_TIMEOUT,
+        name="daily digest",
+    )
+    logger.info(stats.summary())
+    logger.info(f"LLM cache: {llm_cache.stats()}")
+    logger.info(f"LLM queue: {llm_dispatcher.stats()}")
+    logger.info(f"LLM images: {prepared_images.stats()}")
+
+
+async def run_daily_digest_batch(bot: Bot):
+    """
+    То же, что run_daily_digest, но запросы к LLM уходят одним пакетом
+    (см. src/llm/batch.py); ответы рассылаются по мере готовности пакета.
+    """
+    logger.info("Starting daily digest batch...")
+    patients = await get_all_patients()
+    batch = DigestBatch()
+
+    async def handle_patient(patient):
+        try:
+            window = daily_digest_window(patient)
+            if window is None:
                 return
 
-            for record in records:
-                message = await dispatch_to_llm(
-                    username=username,
-                    telegram_id=telegram_id,
-                    current_record=record,
-                    media_urls=record.get("s3_files", []),
+            async for record in iter_records_by_user(
+                patient["telegram_id"], date_from=window[0], date_to=window[1]
+            ):
+                await batch.add(
+                    patient["telegram_id"],
+                    render_record_prompt(patient["username"], record),
+                    record.get("s3_files", []),
                 )
-                await bot.send_message(chat_id=telegram_id, text=message)
-
         except Exception as e:
             logger.exception(f"Failed for {patient['telegram_id']}: {e}")
 
-    await asyncio.gather(*(handle_patient(p) for p in patients))
+    stats = await fan_out(
+        handle_patient,
+        patients,
+        concurrency=config.DIGEST_CONCURRENCY,
+        timeout=config.DIGEST_ITEM_TIMEOUT,
+        name="daily digest batch",
+    )
+    logger.info(stats.summary())
+    await batch.submit()
 
 
 async def run_weekly_digest(bot: Bot):
     logger.info("Starting weekly digest task...")
-    conn = await get_db_connection()
-    patients = await get_all_patients(conn)
+    patients = await get_all_patients()
 
     start_date = await get_global_testing_start_date()
     if not start_date:
@@ -88,13 +157,27 @@ async def run_weekly_digest(bot: Bot):
                     telegram_id=patient["telegram_id"],
                     week_number=current_week,
                     media_urls=[],
+                    priority=PRIORITY_DIGEST,
+                    raise_errors=True,
+                )
+                message_dispatcher.submit(
+                    patient["telegram_id"], message, PRIORITY_DIGEST
                 )
-                await bot.send_message(chat_id=patient["telegram_id"], text=message)
 
         except Exception as e:
             logger.error(f"Weekly dispatch failed for {patient['telegram_id']}: {e}")
 
-    await asyncio.gather(*(handle_patient(p) for p in patients))
+    stats = await fan_out(
+        handle_patient,
+        patients,
+        concurrency=config.DIGEST_CONCURRENCY,
+        timeout=config.DIGEST_ITEM_TIMEOUT,
+        name="weekly digest",
+    )
+    logger.info(stats.summary())
+    logger.info(f"LLM cache: {llm_cache.stats()}")
+    logger.info(f"LLM queue: {llm_dispatcher.stats()}")
+    logger.info(f"LLM images: {prepared_images.stats()}")
 
 
 def setup_llm_scheduler(bot: Bot):
@@ -102,7 +185,15 @@ def setup_llm_scheduler(bot: Bot):
     # scheduler.add_job(
     #     run_daily_digest, CronTrigger(minute="0", hour="*"), kwargs={"bot": bot}
     # )
+    if config.DIGEST_BATCH_ENABLED:
+        scheduler.add_job(
+            run_daily_digest_batch,
+            CronTrigger(minute="0", hour="*"),
+            kwargs={"bot": bot},
+        )
+        resume_batches()
     scheduler.add_job(
         run_weekly_digest, CronTrigger(minute="0", hour="*"), kwargs={"bot": bot}
     )
-    scheduler.start()
+    # При выборе лидера задачи включаются, только пока экземпляр ведущий
+    scheduler.start(paused=config.SCHEDULER_LEADER_ELECTION)
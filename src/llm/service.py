@@ -2,29 +2,59 @@ import html
 import json
 import re
 import mimetypes
+import time
+from typing import AsyncIterator, NamedTuple
 
-from langchain.chat_models import ChatOpenAI
-from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+from langchain_openai import ChatOpenAI
 
-from src.db.connection import get_db_connection
 from src.db.patient_repository import (
-    get_all_records_by_user,
+    iter_records_by_user,
     save_llm_response_separately,
 )
+from src.bot.sender import PRIORITY_INTERACTIVE
+from src.llm.cache import llm_cache
+from src.llm.dispatcher import llm_dispatcher
 from src.media.s3_client import S3Client
 from src import config
 
 
 s3_client = S3Client()
 
+# Входят в ключ кэша ответов: другая модель или параметры — другой ответ
+LLM_PARAMS = {"model": "gpt-4o", "temperature": 0.2, "max_tokens": 2048}
+
+# Повторы и лимиты — в llm_dispatcher, заголовки x-ratelimit-* нужны ему же
 llm = ChatOpenAI(
-    model="gpt-4o",
     openai_api_key=config.OPENAI_API_KEY,
-    temperature=0.2,
-    max_tokens=2048,
+    max_retries=0,
+    timeout=config.LLM_REQUEST_TIMEOUT,
+    include_response_headers=True,
+    **LLM_PARAMS,
 )
 
 
+class LLMAnswer(NamedTuple):
+    text: str
+    # Ключ кэша ответов; None — ответ не кэшируется (ошибка или кэш выключен)
+    cache_key: str | None = None
+    cached: bool = False
+
+
+class MessageChain(NamedTuple):
+    messages: list[BaseMessage]
+    # Не загрузилась хотя бы одна картинка: ответ на такой запрос не кэшируется,
+    # иначе повтор после временной ошибки S3 получит ответ без картинки
+    media_failed: bool = False
+
+
+def response_cache_key(chain: MessageChain, use_cache: bool = True) -> str | None:
+    """Ключ кэша ответов для цепочки; None — ответ не кэшировать"""
+    if not use_cache or not config.LLM_CACHE_ENABLED or chain.media_failed:
+        return None
+    return llm_cache.make_key(LLM_PARAMS, chain.messages)
+
+
 def convert_json_to_readable_text(record: dict) -> str:
     q_type = record.get("questionnaire_type")
     if not q_type or q_type not in config.QUESTION_TEXT_MAP:
@@ -45,14 +75,15 @@ def convert_json_to_readable_text(record: dict) -> str:
 
 
 async def build_history_blocks(telegram_id: int) -> list[str]:
-    conn = await get_db_connection()
-    records = await get_all_records_by_user(telegram_id, conn)
-    return [convert_json_to_readable_text(r.get("answers", {})) for r in records]
+    return [
+        convert_json_to_readable_text(r["answers"])
+        async for r in iter_records_by_user(telegram_id, columns=("answers",))
+    ]
 
 
 async def build_message_chain(
     history_blocks: list[str], prompt: str, media_keys: list[str]
-) -> list[HumanMessage]:
+) -> MessageChain:
     messages = [
         SystemMessage(
             content=(
@@ -69,6 +100,7 @@ async def build_message_chain(
         messages.append(HumanMessage(content=[{"type": "text", "text": block}]))
 
     final_content = [{"type": "text", "text": prompt}]
+    media_failed = False
     for key in media_keys or []:
         try:
             mime_type, _ = mimetypes.guess_type(key)
@@ -85,6 +117,7 @@ async def build_message_chain(
                     }
                 )
         except Exception as e:
+            media_failed = True
             final_content.append(
                 {
                     "type": "text",
@@ -93,16 +126,50 @@ async def build_message_chain(
             )
 
     messages.append(HumanMessage(content=final_content))
-    return messages
+    return MessageChain(messages, media_failed)
+
+
+async def ask_llm(
+    prompt: str,
+    media_keys: list[str],
+    history_blocks: list[str],
+    use_cache: bool = True,
+    priority: int = PRIORITY_INTERACTIVE,
+) -> LLMAnswer:
+    """
+    Запрос к LLM через кэш ответов: тот же промпт с теми же картинками
+    (повтор задания, повтор дайджеста) не уходит в OpenAI повторно.
+    use_cache=False — всегда спрашивать модель заново. Сам запрос идёт через
+    очередь llm_dispatcher с лимитами OpenAI; ошибки пробрасываются.
+    """
+    chain = await build_message_chain(history_blocks, prompt, media_keys)
+    messages = chain.messages
+    cache_key = response_cache_key(chain, use_cache)
+    if cache_key is not None:
+        cached = await llm_cache.get(cache_key)
+        if cached is not None:
+            return LLMAnswer(cached, cache_key, cached=True)
+
+    started = time.monotonic()
+    response = await llm_dispatcher.invoke(
+        messages, priority, max_tokens=LLM_PARAMS["max_tokens"]
+    )
+    llm_cache.record_call(time.monotonic() - started)
+    text = response.content.strip()
+    if cache_key is not None and text:
+        llm_cache.put(cache_key, text)
+    return LLMAnswer(text, cache_key if text else None)
 
 
 async def analyze_patient(
-    prompt: str, media_keys: list[str], history_blocks: list[str]
+    prompt: str,
+    media_keys: list[str],
+    history_blocks: list[str],
+    use_cache: bool = True,
 ) -> str:
     try:
-        messages = await build_message_chain(history_blocks, prompt, media_keys)
-        response = await llm.ainvoke(messages)
-        return response.content.strip()
+        answer = await ask_llm(prompt, media_keys, history_blocks, use_cache)
+        return answer.text
     except Exception as e:
         return f"[❌ Ошибка анализа]: {str(e)}"
 
@@ -117,9 +184,7 @@ def markdown_to_html(text: str) -> str:
     return text
 
 
-async def dispatch_to_llm(
-    username: str, telegram_id: int, current_record: dict, media_urls: list[str]
-) -> str:
+def render_record_prompt(username: str, current_record: dict) -> str:
     p_type = current_record.get("prompt_type")
     if isinstance(p_type, list):
         p_type = p_type[0]
@@ -128,9 +193,7 @@ async def dispatch_to_llm(
     )
 
     readable_text = convert_json_to_readable_text(current_record)
-    history_blocks = []  # await build_history_blocks(telegram_id)
-
-    prompt = (
+    return (
         (
             f"{prompt_template}\n\n"
             f"Пациент: {username}\n\n"
@@ -140,20 +203,106 @@ async def dispatch_to_llm(
         .decode("utf-8")
     )
 
-    resp = await analyze_patient(
-        prompt=prompt, media_keys=media_urls, history_blocks=history_blocks
-    )
 
-    if resp:
-        conn = await get_db_connection()
-        await save_llm_response_separately(conn, telegram_id, prompt, resp)
-        return markdown_to_html(resp)
+def to_openai_messages(messages: list[BaseMessage]) -> list[dict]:
+    """Цепочка сообщений LangChain в формате Chat Completions (для Batch API)"""
+    roles = {"system": "system", "human": "user", "ai": "assistant"}
+    return [
+        {"role": roles[message.type], "content": message.content}
+        for message in messages
+    ]
+
+
+async def dispatch_to_llm(
+    username: str,
+    telegram_id: int,
+    current_record: dict,
+    media_urls: list[str],
+    use_cache: bool = True,
+    priority: int = PRIORITY_INTERACTIVE,
+    raise_errors: bool = False,
+) -> str:
+    """
+    raise_errors=True — ошибку LLM пробросить (дайджесты не шлют её текст
+    пользователю), иначе вернуть её текст как ответ.
+    """
+    prompt = render_record_prompt(username, current_record)
+    history_blocks = []  # await build_history_blocks(telegram_id)
+
+    try:
+        answer = await ask_llm(
+            prompt=prompt,
+            media_keys=media_urls,
+            history_blocks=history_blocks,
+            use_cache=use_cache,
+            priority=priority,
+        )
+    except Exception as e:
+        if raise_errors:
+            raise
+        answer = LLMAnswer(f"[❌ Ошибка анализа]: {str(e)}")
+
+    if answer.text:
+        if not answer.cached:
+            await save_llm_response_separately(
+                telegram_id, prompt, answer.text, answer.cache_key
+            )
+        return markdown_to_html(answer.text)
     return "Не удалось получить ответ от AI."
 
 
+async def stream_to_llm(
+    username: str,
+    telegram_id: int,
+    current_record: dict,
+    media_urls: list[str],
+    use_cache: bool = True,
+) -> AsyncIterator[str]:
+    """
+    Потоковый вариант dispatch_to_llm: отдаёт накопленный текст ответа
+    (markdown) по мере генерации. Ответ из кэша приходит одним куском.
+    Готовый ответ сохраняется в llm_responses и кэш; ошибки пробрасываются.
+    """
+    prompt = render_record_prompt(username, current_record)
+    chain = await build_message_chain([], prompt, media_urls)
+    messages = chain.messages
+    cache_key = response_cache_key(chain, use_cache)
+    if cache_key is not None:
+        cached = await llm_cache.get(cache_key)
+        if cached is not None:
+            yield cached
+            return
+
+    started = time.monotonic()
+    text = ""
+    async for chunk in llm_dispatcher.stream(
+        messages, max_tokens=LLM_PARAMS["max_tokens"]
+    ):
+        if chunk.content:
+            text += chunk.content
+            yield text
+    llm_cache.record_call(time.monotonic() - started)
+
+    text = text.strip()
+    if text:
+        if cache_key is not None:
+            llm_cache.put(cache_key, text)
+        await save_llm_response_separately(telegram_id, prompt, text, cache_key)
+
+
 async def dispatch_weekly_to_llm(
-    username: str, telegram_id: int, week_number: int, media_urls: list[str]
+    username: str,
+    telegram_id: int,
+    week_number: int,
+    media_urls: list[str],
+    use_cache: bool = True,
+    priority: int = PRIORITY_INTERACTIVE,
+    raise_errors: bool = False,
 ) -> str:
+    """
+    raise_errors=True — ошибку LLM пробросить (дайджесты не шлют её текст
+    пользователю), иначе вернуть её текст как ответ.
+    """
     prompt_template = config.WEEKLY_PROMPTS.get(
         str(week_number), "Проанализируй прогресс участника за неделю."
     )
@@ -170,12 +319,23 @@ async def dispatch_weekly_to_llm(
         .decode("utf-8")
     )
 
-    resp = await analyze_patient(
-        prompt=prompt, media_keys=media_urls, history_blocks=[]
-    )
+    try:
+        answer = await ask_llm(
+            prompt=prompt,
+            media_keys=media_urls,
+            history_blocks=[],
+            use_cache=use_cache,
+            priority=priority,
+        )
+    except Exception as e:
+        if raise_errors:
+            raise
+        answer = LLMAnswer(f"[❌ Ошибка анализа]: {str(e)}")
 
-    if resp:
-        conn = await get_db_connection()
-        await save_llm_response_separately(conn, telegram_id, prompt, resp)
-        return markdown_to_html(resp)
+    if answer.text:
+        if not answer.cached:
+            await save_llm_response_separately(
+                telegram_id, prompt, answer.text, answer.cache_key
+            )
+        return markdown_to_html(answer.text)
     return "Не удалось получить недельный ответ от AI."
@@ -4,7 +4,11 @@ from aiogram import Dispatcher
 
 from aiogram.types import BotCommand
 
-from src.bot.scheduler import setup_scheduler
+from src.bot.scheduler import (
+    scheduler as questionnaire_scheduler,
+    setup_scheduler,
+    wait_for_releases,
+)
 from src.bot.handlers.greeting_quiz import router as greeting_router
 from src.bot.handlers.daily_quiz import router as daily_router
 from src.bot.handlers.nutrition_quiz import router as nutrition_router
@@ -49,7 +53,16 @@ from src.bot.handlers.extra_tasks.reaction import router as reaction_router
 from src.bot.handlers.extra_tasks.feedback import router as feedback_router
 
 from src.bot_instance import bot
-from src.llm.scheduler import setup_llm_scheduler
+from src.bot.sender import message_dispatcher, split_rate_limit
+from src import config
+from src.db.connection import init_db_pool, close_db_pool
+from src.db.leader import LeaderElection
+from src.db.partitions import maintain_partitions
+from src.db.patient_repository import start_write_buffers, stop_write_buffers
+from src.db.settings import settings
+from src.llm.dispatcher import llm_dispatcher
+from src.llm.scheduler import scheduler as llm_scheduler, setup_llm_scheduler
+from src.llm.service import llm
 import logging
 
 logging.basicConfig(
@@ -58,6 +71,17 @@ logging.basicConfig(
 )
 
 
+def set_schedulers_active(active: bool):
+    """Включает периодические задачи на ведущем экземпляре и ставит на паузу на остальных"""
+    for job_scheduler in (questionnaire_scheduler, llm_scheduler):
+        if not job_scheduler.running:
+            continue
+        if active:
+            job_scheduler.resume()
+        else:
+            job_scheduler.pause()
+
+
 async def main():
     commands = [
         BotCommand(command="start", description="Начать общение с ботом (Регистрация)"),
@@ -114,10 +138,25 @@ async def main():
         BotCommand(command="feedback", description="Оставить обратную связь"),
     ]
     await bot.set_my_commands(commands)
+    await init_db_pool()
+    await maintain_partitions()
+    start_write_buffers()
+    settings.start_listener()
+    # Часть лимита Telegram отдана процессам тика (scheduler_worker)
+    message_dispatcher.set_rate(split_rate_limit(config.SCHEDULER_SHARDS)[0])
+    message_dispatcher.start(bot)
+    llm_dispatcher.start(llm)
 
     dp = Dispatcher()
     setup_scheduler(bot)
     setup_llm_scheduler(bot)
+    leader = LeaderElection(
+        config.SCHEDULER_LOCK_KEY,
+        config.SCHEDULER_LEADER_HEARTBEAT,
+        on_change=set_schedulers_active,
+    )
+    if config.SCHEDULER_LEADER_ELECTION:
+        leader.start()
 
     dp.include_router(greeting_router)
     dp.include_router(daily_router)
@@ -155,7 +194,16 @@ async def main():
     dp.include_router(feedback_router)
 
     print("🤖 Бот запущен...")
-    await dp.start_polling(bot)
+    try:
+        await dp.start_polling(bot)
+    finally:
+        await leader.stop()
+        await llm_dispatcher.stop()
+        await message_dispatcher.stop()
+        await wait_for_releases()
+        await settings.stop_listener()
+        await stop_write_buffers()
+        await close_db_pool()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,138 @@
+import asyncio
+from collections import OrderedDict
+import logging
+import os
+import time
+
+import cv2
+import numpy as np
+
+from src import config
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {
+    "jpeg": (".jpg", "image/jpeg", cv2.IMWRITE_JPEG_QUALITY),
+    "webp": (".webp", "image/webp", cv2.IMWRITE_WEBP_QUALITY),
+}
+
+
+def image_task(s3_key: str) -> str:
+    """
+    Тип задания по ключу S3 (имена файлов задают обработчики заданий):
+    .../face_front.jpg -> face, ..._contact_sheet.jpg -> contact_sheet.
+    """
+    if "/checkup/" in s3_key:
+        return "checkup"
+    name = os.path.basename(s3_key).lower()
+    if "contact_sheet" in name:
+        return "contact_sheet"
+    return name.split("_", 1)[0].split(".", 1)[0]
+
+
+def prepare_image(
+    data: bytes, max_edge: int, image_format: str, quality: int
+) -> tuple[bytes, str] | None:
+    """
+    Уменьшает картинку до max_edge по длинной стороне и перекодирует.
+    Возвращает (данные, mime) или None, если картинку не удалось прочитать
+    или результат не меньше исходника. Блокирующая — вызывать в потоке.
+    """
+    image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        return None
+    height, width = image.shape[:2]
+    scale = max_edge / max(height, width)
+    if scale < 1:
+        image = cv2.resize(
+            image,
+            (max(1, round(width * scale)), max(1, round(height * scale))),
+            interpolation=cv2.INTER_AREA,
+        )
+    extension, mime_type, quality_flag = FORMATS[image_format]
+    ok, encoded = cv2.imencode(extension, image, [quality_flag, quality])
+    if not ok or (scale >= 1 and len(encoded) >= len(data)):
+        return None
+    return encoded.tobytes(), mime_type
+
+
+class PreparedImageCache:
+    """
+    LRU готовых картинок по ключу S3, ограниченный суммарным размером.
+    Хранит ETag исходника: S3Client повторно скачивает объект, только если
+    он изменился (тот же ключ перезаписывается при повторной отправке задания).
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.images = 0
+        self.hits = 0
+        self.bytes_before = 0
+        self.bytes_after = 0
+        self.prepare_seconds = 0.0
+        self._size = 0
+        self._items: OrderedDict[str, tuple[str, str]] = OrderedDict()
+
+    def get(self, s3_key: str) -> tuple[str, str] | None:
+        """(etag, data url) последней подготовленной версии"""
+        item = self._items.get(s3_key)
+        if item is not None:
+            self._items.move_to_end(s3_key)
+        return item
+
+    def hit(self, item: tuple[str, str]) -> str:
+        """Отдаёт закэшированную версию (объект в S3 не менялся)"""
+        self.hits += 1
+        return item[1]
+
+    def put(self, s3_key: str, etag: str, data_url: str):
+        self._drop(s3_key)
+        self._items[s3_key] = (etag, data_url)
+        self._size += len(data_url)
+        while self._size > self.max_bytes and len(self._items) > 1:
+            self._drop(next(iter(self._items)))
+
+    def _drop(self, s3_key: str):
+        item = self._items.pop(s3_key, None)
+        if item is not None:
+            self._size -= len(item[1])
+
+    async def prepare(self, s3_key: str, data: bytes) -> tuple[bytes, str | None]:
+        """
+        Готовит картинку в потоке, вне event loop.
+        Возвращает (данные, mime); mime None — оставлен исходник.
+        """
+        max_edge = config.IMAGE_MAX_EDGE_BY_TASK.get(
+            image_task(s3_key), config.IMAGE_MAX_EDGE
+        )
+        started = time.monotonic()
+        try:
+            prepared = await asyncio.to_thread(
+                prepare_image,
+                data,
+                max_edge,
+                config.IMAGE_FORMAT,
+                config.IMAGE_QUALITY,
+            )
+        except Exception as e:
+            logger.error(f"Ошибка подготовки картинки {s3_key}: {e}")
+            prepared = None
+        self.prepare_seconds += time.monotonic() - started
+        self.images += 1
+        self.bytes_before += len(data)
+        result = prepared or (data, None)
+        self.bytes_after += len(result[0])
+        return result
+
+    def stats(self) -> dict:
+        return {
+            "images": self.images,
+            "cache_hits": self.hits,
+            "cache_mb": round(self._size / 1024 / 1024, 1),
+            "mb_before": round(self.bytes_before / 1024 / 1024, 1),
+            "mb_after": round(self.bytes_after / 1024 / 1024, 1),
+            "prepare_s": round(self.prepare_seconds, 2),
+        }
+
+
+prepared_images = PreparedImageCache(max_bytes=config.IMAGE_CACHE_MAX_BYTES)
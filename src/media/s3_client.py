@@ -5,9 +5,11 @@ import datetime
 from typing import Union
 from aiofiles import open as aio_open
 from aiobotocore.session import get_session
+from botocore.exceptions import ClientError
 
 from aiogram.types import BufferedInputFile
 from src import config
+from src.media.image_prep import prepared_images
 
 
 class S3Client:
@@ -99,14 +101,36 @@ class S3Client:
             return url
 
     async def get_base64_image(self, s3_key: str) -> str:
+        """
+        Картинка для LLM в виде data URL: уменьшенная и перекодированная
+        (src/media/image_prep.py). Готовый вариант кэшируется; объект заново
+        скачивается, только если его ETag изменился.
+        """
+        cached = prepared_images.get(s3_key)
+        params = {"Bucket": self.bucket_name, "Key": s3_key}
+        if cached is not None:
+            params["IfNoneMatch"] = cached[0]
         async with self.session.create_client(
             "s3",
             endpoint_url=self.endpoint_url,
             aws_access_key_id=self.access_key,
             aws_secret_access_key=self.secret_key,
         ) as client:
-            response = await client.get_object(Bucket=self.bucket_name, Key=s3_key)
+            try:
+                response = await client.get_object(**params)
+            except ClientError as e:
+                if cached is not None and e.response["Error"]["Code"] in (
+                    "304",
+                    "NotModified",
+                ):
+                    return prepared_images.hit(cached)
+                raise
             data = await response["Body"].read()
+
+        data, mime_type = await prepared_images.prepare(s3_key, data)
+        if mime_type is None:
             mime_type, _ = mimetypes.guess_type(s3_key)
-            base64_data = base64.b64encode(data).decode("utf-8")
-            return f"data:{mime_type};base64,{base64_data}"
+        base64_data = base64.b64encode(data).decode("utf-8")
+        data_url = f"data:{mime_type};base64,{base64_data}"
+        prepared_images.put(s3_key, response.get("ETag", ""), data_url)
+        return data_url
@@ -0,0 +1,35 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("asyncpg")
+
+from src import config  # noqa: E402
+from src.db import connection  # noqa: E402
+
+pytestmark = pytest.mark.skipif(
+    not config.POSTGRES_DSN, reason="нужна база: задайте POSTGRES_DSN"
+)
+
+
+def test_named_query_after_pool_release(monkeypatch):
+    """Именованный запрос работает и после возврата соединения в пул"""
+    monkeypatch.setattr(config, "POSTGRES_POOL_MIN_SIZE", 1)
+    monkeypatch.setattr(config, "POSTGRES_POOL_MAX_SIZE", 1)
+    monkeypatch.setattr(config, "POSTGRES_REPLICA_DSN", None)
+
+    async def prepare(conn, readonly):
+        conn.queries = {"next": "SELECT $1::int + 1"}
+
+    monkeypatch.setattr(connection, "_connection_init", prepare)
+
+    async def run():
+        await connection.init_db_pool()
+        try:
+            for value in (1, 2):
+                async with connection.acquire() as conn:
+                    assert await conn.fetchval_prepared("next", value) == value + 1
+        finally:
+            await connection.close_db_pool()
+
+    asyncio.run(run())